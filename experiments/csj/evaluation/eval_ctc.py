@@ -8,6 +8,7 @@ from __future__ import division
 from __future__ import print_function
 
 import os
+from os.path import isfile
 import sys
 import tensorflow as tf
 import yaml
@@ -18,10 +19,11 @@ sys.path.append('../../../')
 from data.read_dataset_ctc import DataSet
 from models.ctc.load_model import load
 from metric.ctc import do_eval_per, do_eval_cer
+from utils.cmvn import CMVN_FILE_NAME, load_cmvn
 
 
 def do_eval(network, label_type, num_stack, num_skip, train_data_size,
-            epoch=None):
+            epoch=None, eval_batch_size=1):
     """Evaluate the model.
     Args:
         network: model to restore
@@ -30,23 +32,31 @@ def do_eval(network, label_type, num_stack, num_skip, train_data_size,
         num_skip: int, the number of frames to skip
         train_data_size: string, default or large
         epoch: int, the epoch to restore
+        eval_batch_size: int, the size of mini-batch. Utterances are sorted
+            by frame num and batched with the least padding, which gives the
+            same results as eval_batch_size=1.
     """
+    # Load the statistics for normalization saved in training
+    cmvn = None
+    if isfile(os.path.join(network.model_dir, CMVN_FILE_NAME)):
+        cmvn = load_cmvn(network.model_dir)
+
     # Load dataset
     eval1_data = DataSet(data_type='eval1', label_type=label_type,
-                         batch_size=1,
+                         batch_size=eval_batch_size,
                          train_data_size=train_data_size,
                          num_stack=num_stack, num_skip=num_skip,
-                         is_sorted=False, is_progressbar=True)
+                         is_sorted=True, is_progressbar=True, cmvn=cmvn)
     eval2_data = DataSet(data_type='eval2', label_type=label_type,
-                         batch_size=1,
+                         batch_size=eval_batch_size,
                          train_data_size=train_data_size,
                          num_stack=num_stack, num_skip=num_skip,
-                         is_sorted=False, is_progressbar=True)
+                         is_sorted=True, is_progressbar=True, cmvn=cmvn)
     eval3_data = DataSet(data_type='eval3', label_type=label_type,
-                         batch_size=1,
+                         batch_size=eval_batch_size,
                          train_data_size=train_data_size,
                          num_stack=num_stack, num_skip=num_skip,
-                         is_sorted=False, is_progressbar=True)
+                         is_sorted=True, is_progressbar=True, cmvn=cmvn)
 
     # Define placeholders
     network.inputs = tf.placeholder(
@@ -104,7 +114,7 @@ def do_eval(network, label_type, num_stack, num_skip, train_data_size,
                 dataset=eval1_data,
                 label_type=label_type,
                 is_test=True,
-                eval_batch_size=1,
+                eval_batch_size=eval_batch_size,
                 is_progressbar=True)
             print('  CER: %f %%' % (cer_eval1 * 100))
 
@@ -116,7 +126,7 @@ def do_eval(network, label_type, num_stack, num_skip, train_data_size,
                 dataset=eval2_data,
                 label_type=label_type,
                 is_test=True,
-                eval_batch_size=1,
+                eval_batch_size=eval_batch_size,
                 is_progressbar=True)
             print('  CER: %f %%' % (cer_eval2 * 100))
 
@@ -128,7 +138,7 @@ def do_eval(network, label_type, num_stack, num_skip, train_data_size,
                 dataset=eval3_data,
                 label_type=label_type,
                 is_test=True,
-                eval_batch_size=1,
+                eval_batch_size=eval_batch_size,
                 is_progressbar=True)
             print('  CER: %f %%' % (cer_eval3 * 100))
 
@@ -139,7 +149,7 @@ def do_eval(network, label_type, num_stack, num_skip, train_data_size,
                 per_op=per_op,
                 network=network,
                 dataset=eval1_data,
-                eval_batch_size=1,
+                eval_batch_size=eval_batch_size,
                 is_progressbar=True)
             print('  PER: %f %%' % (per_eval1 * 100))
 
@@ -149,7 +159,7 @@ def do_eval(network, label_type, num_stack, num_skip, train_data_size,
                 per_op=per_op,
                 network=network,
                 dataset=eval2_data,
-                eval_batch_size=1,
+                eval_batch_size=eval_batch_size,
                 is_progressbar=True)
             print('  PER: %f %%' % (per_eval2 * 100))
 
@@ -159,7 +169,7 @@ def do_eval(network, label_type, num_stack, num_skip, train_data_size,
                 per_op=per_op,
                 network=network,
                 dataset=eval3_data,
-                eval_batch_size=1,
+                eval_batch_size=eval_batch_size,
                 is_progressbar=True)
             print('  PER: %f %%' % (per_eval3 * 100))
 
@@ -207,7 +217,8 @@ def main(model_path):
             num_stack=feature['num_stack'],
             num_skip=feature['num_skip'],
             train_data_size=corpus['train_data_size'],
-            epoch=epoch)
+            epoch=epoch,
+            eval_batch_size=param['batch_size'])
 
 
 if __name__ == '__main__':
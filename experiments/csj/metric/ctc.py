@@ -7,11 +7,10 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
-import re
-import Levenshtein
-
 from utils.labels.character import num2char
 from utils.sparsetensor import sparsetensor2list
+from utils.ctc_decoder import run_decoder
+from utils.scorer import Scorer, score_strings
 from utils.exception_func import exception
 from utils.progressbar import wrap_iterator
 
@@ -70,10 +69,30 @@ def do_eval_per(session, per_op, network, dataset,
     return per_global
 
 
+def _score_cer(labels_true, labels_pred, map_file_path, is_raw_true):
+    """Convert labels to strings & compute error counts (in a worker).
+    Args:
+        labels_true: list of label sequences of ground truth
+        labels_pred: list of label sequences of prediction
+        map_file_path: path to the mapping file
+        is_raw_true: if True, labels_true are lists of characters
+    Returns:
+        The same as utils.scorer.score_labels()
+    """
+    if is_raw_true:
+        # NOTE* 漢字の場合はテストデータのラベルはそのまま保存してある
+        str_true_list = [''.join(x) for x in labels_true]
+    else:
+        str_true_list = [num2char(x, map_file_path) for x in labels_true]
+    return score_strings(str_true_list,
+                         [num2char(x, map_file_path) for x in labels_pred])
+
+
 # @exception
 def do_eval_cer(session, decode_op, network, dataset, label_type, is_test=None,
                 eval_batch_size=None, is_progressbar=False,
-                is_multitask=False, is_main=False):
+                is_multitask=False, is_main=False, num_worker=2,
+                decoder=None, logits_op=None):
     """Evaluate trained model by Character Error Rate.
     Args:
         session: session of training model
@@ -86,6 +105,13 @@ def do_eval_cer(session, decode_op, network, dataset, label_type, is_test=None,
         is_progressbar: if True, visualize progressbar
         is_multitask: if True, evaluate the multitask model
         is_main: if True, evaluate the main task
+        num_worker: int, the number of processes to score decoded
+            mini-batches while decoding the next ones (0 for no workers)
+        decoder: A numpy decoder (e.g. utils.ctc_decoder.BeamSearchDecoder).
+            If set, outputs of logits_op are decoded by decoder instead of
+            decode_op.
+        logits_op: list of operations of logits & the length of logits,
+            used only when decoder is set
     Return:
         cer_mean: An average of CER
     """
@@ -98,7 +124,6 @@ def do_eval_cer(session, decode_op, network, dataset, label_type, is_test=None,
     iteration = int(num_examples / batch_size)
     if (num_examples / batch_size) != int(num_examples / batch_size):
         iteration += 1
-    cer_sum = 0
 
     # Make data generator
     mini_batch = dataset.next_batch(batch_size=batch_size)
@@ -107,48 +132,40 @@ def do_eval_cer(session, decode_op, network, dataset, label_type, is_test=None,
         map_file_path = '../metric/mapping_files/ctc/char2num.txt'
     elif label_type == 'kanji':
         map_file_path = '../metric/mapping_files/ctc/kanji2num.txt'
-    for step in wrap_iterator(range(iteration), is_progressbar):
-        # Create feed dictionary for next mini batch
-        if not is_multitask:
-            inputs, labels_true_st, inputs_seq_len, _ = mini_batch.__next__()
-        else:
-            if is_main:
-                inputs, labels_true_st, _, inputs_seq_len, _ = mini_batch.__next__()
+    # TODO: change in case of character
+    is_raw_true = label_type == 'kanji' and bool(is_test)
+    scorer = Scorer(_score_cer, num_worker=num_worker)
+    try:
+        for step in wrap_iterator(range(iteration), is_progressbar):
+            # Create feed dictionary for next mini batch
+            if not is_multitask:
+                inputs, labels_true_st, inputs_seq_len, _ = mini_batch.__next__()
             else:
-                inputs, _, labels_true_st, inputs_seq_len, _ = mini_batch.__next__()
-
-        feed_dict = {
-            network.inputs: inputs,
-            network.inputs_seq_len: inputs_seq_len,
-            network.keep_prob_input: 1.0,
-            network.keep_prob_hidden: 1.0
-        }
-
-        batch_size_each = len(inputs_seq_len)
-
-        labels_pred_st = session.run(decode_op, feed_dict=feed_dict)
-        labels_true = sparsetensor2list(labels_true_st, batch_size_each)
-        labels_pred = sparsetensor2list(labels_pred_st, batch_size_each)
-        for i_batch in range(batch_size_each):
-            # Convert from list to string
-            str_pred = num2char(labels_pred[i_batch], map_file_path)
-            # TODO: change in case of character
-            if label_type == 'kanji' and is_test:
-                str_true = ''.join(labels_true[i_batch])
-                # NOTE* 漢字の場合はテストデータのラベルはそのまま保存してある
-            else:
-                str_true = num2char(labels_true[i_batch], map_file_path)
-
-            # Remove silence(_) labels
-            str_true = re.sub(r'[_]+', "", str_true)
-            str_pred = re.sub(r'[_]+', "", str_pred)
-
-            # Compute edit distance
-            cer_each = Levenshtein.distance(
-                str_pred, str_true) / len(list(str_true))
-
-            cer_sum += cer_each
-
+                if is_main:
+                    inputs, labels_true_st, _, inputs_seq_len, _ = mini_batch.__next__()
+                else:
+                    inputs, _, labels_true_st, inputs_seq_len, _ = mini_batch.__next__()
+
+            feed_dict = {
+                network.inputs: inputs,
+                network.inputs_seq_len: inputs_seq_len,
+                network.keep_prob_input: 1.0,
+                network.keep_prob_hidden: 1.0
+            }
+
+            batch_size_each = len(inputs_seq_len)
+
+            labels_pred = run_decoder(session, decode_op, feed_dict,
+                                      batch_size_each, decoder, logits_op)
+
+            # Scored in the background
+            scorer.submit(sparsetensor2list(labels_true_st, batch_size_each),
+                          labels_pred, map_file_path, is_raw_true)
+
+        cer_sum = scorer.result()[0]
+    finally:
+        # Stop workers even when decoding fails
+        scorer.close()
     cer_mean = cer_sum / dataset.data_num
 
     return cer_mean
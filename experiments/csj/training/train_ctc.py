@@ -24,10 +24,14 @@ from metric.ctc import do_eval_per, do_eval_cer
 from utils.directory import mkdir, mkdir_join
 from utils.parameter import count_total_parameters
 from utils.csv import save_loss, save_ler
+from utils.prefetch import Prefetcher
+from utils.cmvn import compute_cmvn
 
 
 def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
-             label_type, num_stack, num_skip, train_data_size):
+             label_type, num_stack, num_skip, train_data_size,
+             frame_budget=None, use_cmvn=False, cache_mb=None,
+             use_stack_cache=False):
     """Run training.
     Args:
         network: network to train
@@ -40,18 +44,38 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
         num_stack: int, the number of frames to stack
         num_skip: int, the number of frames to skip
         train_data_size: string, default or large
+        frame_budget: int, if set, mini-batches for training are made by
+            utils/sampler.py (BucketSampler) within this number of padded
+            frames instead of batch_size
+        use_cmvn: if True, compute the global mean & std of the training set,
+            save them in the model directory and normalize inputs by them
+        cache_mb: float, if set, utterances are loaded when used and kept
+            in utils/cache.py (LRUCache) within this memory budget in MB
+            instead of loaded in advance
+        use_stack_cache: if True, read the frame-stacked datasets cached
+            on disk by utils/stack_cache.py, which are made by the first
+            run with the same num_stack & num_skip
     """
     # Load dataset
     train_data = DataSet(data_type='train', label_type=label_type,
                          train_data_size=train_data_size,
                          batch_size=batch_size,
                          num_stack=num_stack, num_skip=num_skip,
-                         is_sorted=True)
+                         is_sorted=True, frame_budget=frame_budget,
+                         cache_mb=cache_mb, use_stack_cache=use_stack_cache)
+    cmvn = None
+    if use_cmvn:
+        print('=> Computing CMVN statistics...')
+        cmvn = compute_cmvn(train_data.input_paths, num_worker=4)
+        cmvn.save(network.model_dir)
+        print(cmvn)
+        train_data.cmvn = cmvn
     dev_data = DataSet(data_type='dev', label_type=label_type,
                        train_data_size=train_data_size,
                        batch_size=batch_size,
                        num_stack=num_stack, num_skip=num_skip,
-                       is_sorted=False)
+                       is_sorted=False, cmvn=cmvn, cache_mb=cache_mb,
+                       use_stack_cache=use_stack_cache)
     # eval1_data = DataSet(data_type='eval1', label_type=label_type,
     #                      train_data_size=train_data_size,
     #                      batch_size=batch_size,
@@ -137,7 +161,11 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
             sess.run(init_op)
 
             # Make mini-batch generator
-            mini_batch_train = train_data.next_batch()
+            # NOTE: mini-batches for training are prepared in the background.
+            # dev_data is not wrapped because it is shared with do_eval_*().
+            mini_batch_train = Prefetcher(train_data.next_batch(),
+                                          queue_size=2,
+                                          pool=train_data.pool)
             mini_batch_dev = dev_data.next_batch()
 
             # Train model
@@ -145,6 +173,10 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
             train_step = train_data.data_num / batch_size
             if (train_step) != int(train_step):
                 iter_per_epoch += 1
+            if frame_budget is not None:
+                # The number of mini-batches made by BucketSampler in an
+                # epoch is fixed and does not depend on batch_size
+                iter_per_epoch = len(train_data.sampler)
             max_steps = iter_per_epoch * epoch_num
             start_time_train = time.time()
             start_time_epoch = time.time()
@@ -215,6 +247,9 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
                     epoch = (step + 1) // iter_per_epoch
                     print('-----EPOCH:%d (%.3f min)-----' %
                           (epoch, duration_epoch / 60))
+                    if train_data.cache is not None:
+                        print('Cache: ' + str(train_data.cache))
+                    print('Buffer pool: ' + str(train_data.pool))
 
                     # Save model (check point)
                     checkpoint_file = join(network.model_dir, 'model.ckpt')
@@ -232,7 +267,8 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
                                 network=network,
                                 dataset=dev_data,
                                 label_type=label_type,
-                                eval_batch_size=batch_size)
+                                eval_batch_size=batch_size,
+                                num_worker=0)
                             print('  CER: %f %%' % (cer_dev_epoch * 100))
 
                             if cer_dev_epoch < error_best:
@@ -422,7 +458,11 @@ def main(config_path):
              label_type=corpus['label_type'],
              num_stack=feature['num_stack'],
              num_skip=feature['num_skip'],
-             train_data_size=corpus['train_data_size'])
+             train_data_size=corpus['train_data_size'],
+             frame_budget=param.get('frame_budget'),
+             use_cmvn=feature.get('cmvn', False),
+             cache_mb=param.get('cache_mb'),
+             use_stack_cache=corpus.get('use_stack_cache', False))
     sys.stdout = sys.__stdout__
 
 
@@ -11,26 +11,51 @@ from __future__ import print_function
 
 from os.path import join, basename
 import pickle
-import random
 import numpy as np
-import tensorflow as tf
 
 from utils.progressbar import wrap_iterator
+from utils.multi_gpu import split_batch
+from utils.packed_corpus import PackedCorpus
+from utils.shared_store import open_store
+from utils.sampler import SortedSampler, RandomSampler, BucketSampler
+from utils.sampler import SequentialSampler
+from utils.cache import LRUCache
+from utils.buffer_pool import BufferPool
 
 
 class DataSet(object):
     """Read dataset."""
 
     def __init__(self, data_type, label_type, batch_size, eos_index,
-                 is_sorted=True, is_progressbar=False, num_gpu=1):
+                 is_sorted=True, is_progressbar=False, num_gpu=1,
+                 use_packed=False, frame_budget=None, cache_mb=None,
+                 use_shared=False, cmvn=None):
         """
         Args:
             data_type: string, train or dev or test
             label_type: string, phone39 or phone48 or phone61 or character
             eos_index: int , the index of <EOS> class
-            is_sorted: if True, sort dataset by frame num
+            is_sorted: if True, sort dataset by frame num. Mini-batches of
+                the data except for train are made in this order without
+                shuffling (for batched evaluation with the least padding)
             is_progressbar: if True, visualize progressbar
             num_gpu: int, if more than 1, divide batch_size by num_gpu
+            use_packed: if True, read the packed dataset made by
+                utils/packed_corpus.py instead of .npy files
+            frame_budget: int, if set, make mini-batches by
+                utils/sampler.py (BucketSampler) so that the number of padded
+                frames in each mini-batch does not exceed this. batch_size
+                and is_sorted are ignored.
+            cache_mb: float, if set, utterances are not loaded in advance.
+                Utterances are loaded when used and kept in utils/cache.py
+                (LRUCache) within this memory budget in MB. Views of
+                memory-mapped files are not cached.
+            use_shared: if True, attach the dataset in shared
+                memory made by utils/shared_store.py, which is published by
+                the first process. Concurrent jobs share one copy of it.
+            cmvn: An instance of CMVN (utils/cmvn.py). If set, inputs are
+                normalized by the global mean & std when mini-batches are
+                made, so that the dataset can be stored without normalization
         """
         if data_type not in ['train', 'dev', 'test']:
             raise ValueError('data_type is "train" or "dev" or "test".')
@@ -42,6 +67,14 @@ class DataSet(object):
         self.is_sorted = is_sorted
         self.is_progressbar = is_progressbar
         self.num_gpu = num_gpu
+        self.use_packed = use_packed
+        self.frame_budget = frame_budget
+        self.cache_mb = cache_mb
+        self.cmvn = cmvn
+        self.use_shared = use_shared
+        # NOTE: utterances read from memory-mapped files are views, which use
+        # no memory. They are not cached.
+        self.is_memmap = use_packed or use_shared
 
         self.input_size = 123
         self.dataset_path = join(
@@ -67,22 +100,96 @@ class DataSet(object):
         self.label_paths = np.array(label_paths)
         self.data_num = len(self.input_paths)
 
-        # Load all dataset in advance
-        print('=> Loading ' + data_type + ' dataset (' + label_type + ')...')
-        input_list, label_list = [], []
-        for i in wrap_iterator(range(self.data_num), self.is_progressbar):
-            input_list.append(np.load(self.input_paths[i]))
-            label_list.append(np.load(self.label_paths[i]))
-        self.input_list = np.array(input_list)
-        self.label_list = np.array(label_list)
+        if cache_mb is not None:
+            # NOTE: Not load dataset yet
+            self.cache = LRUCache(cache_mb)
+            if use_packed or use_shared:
+                self.corpus = self._open_corpus(self.dataset_path)
+        else:
+            self.cache = None
+            # Load all dataset in advance
+            print('=> Loading ' + data_type +
+                  ' dataset (' + label_type + ')...')
+            input_list, label_list = [], []
+            if use_packed or use_shared:
+                # Views of memory-mapped blobs (not loaded until used)
+                corpus = self._open_corpus(self.dataset_path)
+                for input_name, _ in wrap_iterator(
+                        self.frame_num_tuple_sorted, self.is_progressbar):
+                    i_packed = corpus.index(input_name)
+                    input_list.append(corpus.input(i_packed))
+                    label_list.append(corpus.label(i_packed))
+            else:
+                for i in wrap_iterator(range(self.data_num),
+                                       self.is_progressbar):
+                    input_list.append(np.load(self.input_paths[i]))
+                    label_list.append(np.load(self.label_paths[i]))
+            self.input_list = np.array(input_list)
+            self.label_list = np.array(label_list)
+
+        self.pool = BufferPool()
+
+        # Make the sampler of mini-batches
+        if frame_budget is not None:
+            # Bucketing by frame num
+            self.sampler = BucketSampler(
+                frame_nums=[frame_num for _, frame_num
+                            in self.frame_num_tuple_sorted],
+                frame_budget=frame_budget)
+        elif is_sorted and data_type != 'train':
+            # Evaluation in the order of frame num without shuffling
+            self.sampler = SequentialSampler(self.data_num, self.batch_size)
+        elif is_sorted:
+            self.sampler = SortedSampler(self.data_num, self.batch_size)
+        else:
+            self.sampler = RandomSampler(self.data_num, self.batch_size)
+
+    def _open_corpus(self, dataset_path):
+        """Open the packed dataset.
+        Args:
+            dataset_path: path to the dataset
+        Returns:
+            An instance of PackedCorpus
+        """
+        if self.use_shared:
+            return open_store(dataset_path,
+                              is_progressbar=self.is_progressbar)
+        return PackedCorpus(join(dataset_path, 'packed'))
 
-        self.rest = set([i for i in range(self.data_num)])
+    def _load(self, i):
+        """Load an utterance.
+        Args:
+            i: int, the index of the utterance
+        Returns:
+            input_i: A numpy array of size `[frame_num, input_size]`
+            label_i: A numpy array of size `[label_len]`
+        """
+        if self.cache is None:
+            return self.input_list[i], self.label_list[i]
+
+        if not self.is_memmap:
+            cached = self.cache.get(i)
+            if cached is not None:
+                return cached
+
+        if self.use_packed or self.use_shared:
+            i_packed = self.corpus.index(
+                basename(self.input_paths[i]).split('.')[0])
+            input_i = self.corpus.input(i_packed)
+            label_i = self.corpus.label(i_packed)
+        else:
+            input_i = np.load(self.input_paths[i])
+            label_i = np.load(self.label_paths[i])
+
+        if not self.is_memmap:
+            self.cache.put(i, (input_i, label_i))
+        return input_i, label_i
 
     def next_batch(self, batch_size=None, session=None):
         """Make mini-batch.
         Args:
             batch_size: int, the size of mini-batch
-            session:
+            session: not used (for compatibility)
         Returns:
             inputs: list of input data, size `[batch_size]`
             labels: list of tuple `(indices, values, shape)` of size
@@ -92,130 +199,30 @@ class DataSet(object):
                 `[batch_size]`
             input_names: list of file name of input data of size `[batch_size]`
         """
-        if session is None and self.num_gpu != 1:
-            raise ValueError('Set session when using multiple GPUs.')
-
         if batch_size is None:
             batch_size = self.batch_size
 
-        next_epoch_flag = False
-
         while True:
-            #########################
-            # sorted dataset
-            #########################
-            if self.is_sorted:
-                if len(self.rest) > batch_size:
-                    sorted_indices = list(self.rest)[:batch_size]
-                    self.rest -= set(sorted_indices)
-                else:
-                    sorted_indices = list(self.rest)
-                    self.rest = set([i for i in range(self.data_num)])
-                    next_epoch_flag = True
-                    if self.data_type == 'train':
-                        print('---Next epoch---')
-
-                # Compute max frame num in mini-batch
-                max_frame_num = self.input_list[sorted_indices[-1]].shape[0]
-
-                # Compute max target label length in mini-batch
-                max_seq_len = max(map(len, self.label_list[sorted_indices]))
-
-                # Shuffle selected mini-batch
-                random.shuffle(sorted_indices)
-
-                # Initialization
-                inputs = np.zeros(
-                    (len(sorted_indices), max_frame_num, self.input_size))
-                # Padding with -1
-                labels = np.array([[-1] * max_seq_len]
-                                  * len(sorted_indices), dtype=int)
-                inputs_seq_len = np.zeros((len(sorted_indices),), dtype=int)
-                labels_seq_len = np.zeros((len(sorted_indices),), dtype=int)
-                input_names = [None] * len(sorted_indices)
-
-                # Set values of each data in mini-batch
-                for i_batch, x in enumerate(sorted_indices):
-                    data_i = self.input_list[x]
-                    frame_num = data_i.shape[0]
-                    inputs[i_batch, :frame_num, :] = data_i
-                    labels[i_batch, :len(self.label_list[x])
-                           ] = self.label_list[x]
-                    inputs_seq_len[i_batch] = frame_num
-                    labels_seq_len[i_batch] = len(self.label_list[x])
-                    input_names[i_batch] = basename(
-                        self.input_paths[x]).split('.')[0]
-
-            #########################
-            # not sorted dataset
-            #########################
-            else:
-                if len(self.rest) > batch_size:
-                    # Randomly sample mini-batch
-                    random_indices = random.sample(list(self.rest), batch_size)
-                    self.rest -= set(random_indices)
-                else:
-                    random_indices = list(self.rest)
-                    self.rest = set([i for i in range(self.data_num)])
-                    next_epoch_flag = True
-                    if self.data_type == 'train':
-                        print('---Next epoch---')
-
-                    # Shuffle selected mini-batch
-                    random.shuffle(random_indices)
-
-                # Compute max frame num in mini-batch
-                frame_num_list = []
-                for data_i in self.input_list[random_indices]:
-                    frame_num_list.append(data_i.shape[0])
-                max_frame_num = max(frame_num_list)
-
-                # Compute max target label length in mini-batch
-                max_seq_len = max(map(len, self.label_list[random_indices]))
-
-                # Initialization
-                inputs = np.zeros(
-                    (len(random_indices), max_frame_num, self.input_size))
-                # Padding with -1
-                labels = np.array([[-1] * max_seq_len]
-                                  * len(random_indices), dtype=int)
-                inputs_seq_len = np.zeros((len(random_indices),), dtype=int)
-                labels_seq_len = np.zeros((len(random_indices),), dtype=int)
-                input_names = [None] * len(random_indices)
-
-                # Set values of each data in mini-batch
-                for i_batch, x in enumerate(random_indices):
-                    data_i = self.input_list[x]
-                    frame_num = data_i.shape[0]
-                    inputs[i_batch, :frame_num, :] = data_i
-                    labels[i_batch, :len(self.label_list[x])
-                           ] = self.label_list[x]
-                    inputs_seq_len[i_batch] = frame_num
-                    labels_seq_len[i_batch] = len(self.label_list[x])
-                    input_names[i_batch] = basename(
-                        self.input_paths[x]).split('.')[0]
+            indices, next_epoch_flag = self.sampler.sample(batch_size)
+            if next_epoch_flag and self.data_type == 'train':
+                print('---Next epoch---')
 
-            if self.num_gpu > 1:
-                divide_num = self.num_gpu
-                if next_epoch_flag:
-                    for i in range(self.num_gpu, 0, -1):
-                        if len(self.rest) % i == 0:
-                            divide_num = i
-                            break
-                    next_epoch_flag = False
+            # Load dataset in mini-batch
+            input_list, label_list = zip(*[self._load(x) for x in indices])
+
+            # Padding (labels are padded with -1)
+            inputs, inputs_seq_len = self.pool.pad_inputs(
+                input_list, self.input_size, cmvn=self.cmvn)
+            labels, labels_seq_len = self.pool.pad_labels(
+                label_list, padded_value=-1)
+            input_names = [basename(self.input_paths[x]).split('.')[0]
+                           for x in indices]
 
+            if self.num_gpu > 1:
                 # Now we split the mini-batch data by num_gpu
-                inputs = tf.split(inputs, divide_num, axis=0)
-                labels = tf.split(labels, divide_num, axis=0)
-                inputs_seq_len = tf.split(inputs_seq_len, divide_num, axis=0)
-                labels_seq_len = tf.split(labels_seq_len, divide_num, axis=0)
-                input_names = tf.split(input_names, divide_num, axis=0)
-
-                # Convert from SparseTensor to numpy.ndarray
-                inputs = list(map(session.run, inputs))
-                labels = list(map(session.run, labels))
-                inputs_seq_len = list(map(session.run, inputs_seq_len))
-                labels_seq_len = list(map(session.run, labels_seq_len))
-                input_names = list(map(session.run, input_names))
+                (inputs, inputs_seq_len, labels, labels_seq_len,
+                 input_names) = split_batch(
+                    self.num_gpu, inputs, inputs_seq_len,
+                    labels, labels_seq_len, input_names)
 
             yield inputs, labels, inputs_seq_len, labels_seq_len, input_names
@@ -12,13 +12,31 @@ from __future__ import print_function
 
 from os.path import join, basename
 import pickle
-import random
 import numpy as np
-import tensorflow as tf
 
 from utils.frame_stack import stack_frame
 from utils.sparsetensor import list2sparsetensor
+from utils.multi_gpu import split_batch
 from utils.progressbar import wrap_iterator
+from utils.packed_corpus import PackedCorpus
+from utils.shared_store import open_store
+from utils.stack_cache import open_stack_cache
+from utils.sampler import SortedSampler, RandomSampler, BucketSampler
+from utils.sampler import SequentialSampler
+from utils.cache import LRUCache
+from utils.buffer_pool import BufferPool
+
+
+def dataset_path(data_type, label_type):
+    """Return the path to the dataset without loading it.
+    Args:
+        data_type: string, train or dev or test
+        label_type: string, phone39 or phone48 or phone61 or character
+    Returns:
+        path to the dataset
+    """
+    return join('/n/sd8/inaguma/corpus/timit/dataset/ctc/', label_type,
+                data_type)
 
 
 class DataSet(object):
@@ -26,7 +44,9 @@ class DataSet(object):
 
     def __init__(self, data_type, label_type, batch_size,
                  num_stack=None, num_skip=None,
-                 is_sorted=True, is_progressbar=False, num_gpu=1):
+                 is_sorted=True, is_progressbar=False, num_gpu=1,
+                 use_packed=False, frame_budget=None, cache_mb=None,
+                 use_shared=False, use_stack_cache=False, cmvn=None):
         """
         Args:
             data_type: string, train or dev or test
@@ -34,9 +54,31 @@ class DataSet(object):
             batch_size: int, the size of mini-batch
             num_stack: int, the number of frames to stack
             num_skip: int, the number of frames to skip
-            is_sorted: if True, sort dataset by frame num
+            is_sorted: if True, sort dataset by frame num. Mini-batches of
+                the data except for train are made in this order without
+                shuffling (for batched evaluation with the least padding)
             is_progressbar: if True, visualize progressbar
             num_gpu: int, if more than 1, divide batch_size by num_gpu
+            use_packed: if True, read the packed dataset made by
+                utils/packed_corpus.py instead of .npy files
+            frame_budget: int, if set, make mini-batches by
+                utils/sampler.py (BucketSampler) so that the number of padded
+                frames in each mini-batch does not exceed this. batch_size
+                and is_sorted are ignored.
+            cache_mb: float, if set, utterances are not loaded in advance.
+                Frame-stacked utterances are loaded when used and kept in
+                utils/cache.py (LRUCache) within this memory budget in MB.
+                Views of memory-mapped files are not cached unless frames
+                are stacked here.
+            use_shared: if True, attach the frame-stacked dataset in shared
+                memory made by utils/shared_store.py, which is published by
+                the first process. Concurrent jobs share one copy of it.
+            use_stack_cache: if True, read the frame-stacked dataset cached
+                on disk by utils/stack_cache.py, which is made by the first
+                run with the same num_stack & num_skip.
+            cmvn: An instance of CMVN (utils/cmvn.py). If set, inputs are
+                normalized by the global mean & std when mini-batches are
+                made, so that the dataset can be stored without normalization
         """
         if data_type not in ['train', 'dev', 'test']:
             raise ValueError('data_type is "train" or "dev" or "test".')
@@ -49,10 +91,23 @@ class DataSet(object):
         self.is_sorted = is_sorted
         self.is_progressbar = is_progressbar
         self.num_gpu = num_gpu
+        self.use_packed = use_packed
+        self.frame_budget = frame_budget
+        self.cache_mb = cache_mb
+        self.cmvn = cmvn
+        self.use_shared = use_shared
+        self.use_stack_cache = use_stack_cache
+        if use_stack_cache and (num_stack is None or num_skip is None):
+            raise ValueError('Set num_stack & num_skip to use stack cache.')
+        # NOTE: the dataset in shared memory or stack cache is already stacked
+        self.is_prestacked = use_shared or use_stack_cache
+        # NOTE: utterances read from memory-mapped files are views, which use
+        # no memory unless frames are stacked here. They are not cached.
+        self.is_memmap = self.is_prestacked or (
+            use_packed and (num_stack is None or num_skip is None))
 
         self.input_size = 123
-        self.dataset_path = join(
-            '/n/sd8/inaguma/corpus/timit/dataset/ctc/', label_type, data_type)
+        self.dataset_path = dataset_path(data_type, label_type)
 
         # Load the frame number dictionary
         self.frame_num_dict_path = join(self.dataset_path, 'frame_num.pickle')
@@ -72,34 +127,131 @@ class DataSet(object):
         self.label_paths = np.array(label_paths)
         self.data_num = len(self.input_paths)
 
-        # Load all dataset in advance
-        print('=> Loading ' + data_type + ' dataset (' + label_type + ')...')
-        input_list, label_list = [], []
-        for i in wrap_iterator(range(self.data_num), self.is_progressbar):
-            input_list.append(np.load(self.input_paths[i]))
-            label_list.append(np.load(self.label_paths[i]))
-        self.input_list = np.array(input_list)
-        self.label_list = np.array(label_list)
+        if cache_mb is not None:
+            # NOTE: Not load dataset yet
+            self.cache = LRUCache(cache_mb)
+            if use_packed or self.is_prestacked:
+                self.corpus = self._open_corpus(self.dataset_path)
+            if (num_stack is not None) and (num_skip is not None):
+                self.input_size = self.input_size * num_stack
+        else:
+            self.cache = None
+            # Load all dataset in advance
+            print('=> Loading ' + data_type +
+                  ' dataset (' + label_type + ')...')
+            input_list, label_list = [], []
+            if use_packed or self.is_prestacked:
+                # Views of memory-mapped blobs (not loaded until used)
+                corpus = self._open_corpus(self.dataset_path)
+                for input_name, _ in wrap_iterator(
+                        self.frame_num_tuple_sorted, self.is_progressbar):
+                    i_packed = corpus.index(input_name)
+                    input_list.append(corpus.input(i_packed))
+                    label_list.append(corpus.label(i_packed))
+            else:
+                for i in wrap_iterator(range(self.data_num),
+                                       self.is_progressbar):
+                    input_list.append(np.load(self.input_paths[i]))
+                    label_list.append(np.load(self.label_paths[i]))
+            self.input_list = np.array(input_list)
+            self.label_list = np.array(label_list)
+
+            # Frame stacking
+            if (num_stack is not None) and (num_skip is not None):
+                if not self.is_prestacked:
+                    print('=> Stacking frames...')
+                    stacked_input_list = stack_frame(self.input_list,
+                                                     self.input_paths,
+                                                     self.frame_num_dict,
+                                                     num_stack,
+                                                     num_skip,
+                                                     is_progressbar)
+                    self.input_list = np.array(stacked_input_list)
+                self.input_size = self.input_size * num_stack
+
+        self.pool = BufferPool()
+
+        # Make the sampler of mini-batches
+        if frame_budget is not None:
+            # Bucketing by frame num (after frame stacking)
+            if cache_mb is None:
+                frame_nums = [data_i.shape[0] for data_i in self.input_list]
+            else:
+                frame_nums = np.array([frame_num for _, frame_num
+                                       in self.frame_num_tuple_sorted])
+                if (num_stack is not None) and (num_skip is not None):
+                    frame_nums = (frame_nums + num_skip - 1) // num_skip
+            self.sampler = BucketSampler(frame_nums=frame_nums,
+                                         frame_budget=frame_budget)
+        elif is_sorted and data_type != 'train':
+            # Evaluation in the order of frame num without shuffling
+            self.sampler = SequentialSampler(self.data_num, self.batch_size)
+        elif is_sorted:
+            self.sampler = SortedSampler(self.data_num, self.batch_size)
+        else:
+            self.sampler = RandomSampler(self.data_num, self.batch_size)
+
+    def _open_corpus(self, dataset_path):
+        """Open the packed dataset.
+        Args:
+            dataset_path: path to the dataset
+        Returns:
+            An instance of PackedCorpus
+        """
+        if self.use_shared:
+            return open_store(dataset_path, self.num_stack, self.num_skip,
+                              is_progressbar=self.is_progressbar)
+        if self.use_stack_cache:
+            return open_stack_cache(dataset_path,
+                                    self.num_stack, self.num_skip,
+                                    is_progressbar=self.is_progressbar)
+        return PackedCorpus(join(dataset_path, 'packed'))
+
+    def _load(self, i):
+        """Load a frame-stacked utterance.
+        Args:
+            i: int, the index of the utterance
+        Returns:
+            input_i: A numpy array of size `[frame_num, input_size]`
+            label_i: A numpy array of size `[label_len]`
+        """
+        if self.cache is None:
+            return self.input_list[i], self.label_list[i]
+
+        if not self.is_memmap:
+            cached = self.cache.get(i)
+            if cached is not None:
+                return cached
+
+        if self.use_packed or self.is_prestacked:
+            i_packed = self.corpus.index(
+                basename(self.input_paths[i]).split('.')[0])
+            input_i = self.corpus.input(i_packed)
+            label_i = self.corpus.label(i_packed)
+        else:
+            input_i = np.load(self.input_paths[i])
+            label_i = np.load(self.label_paths[i])
 
         # Frame stacking
-        if (num_stack is not None) and (num_skip is not None):
-            print('=> Stacking frames...')
-            stacked_input_list = stack_frame(self.input_list,
-                                             self.input_paths,
-                                             self.frame_num_dict,
-                                             num_stack,
-                                             num_skip,
-                                             is_progressbar)
-            self.input_list = np.array(stacked_input_list)
-            self.input_size = self.input_size * num_stack
-
-        self.rest = set([i for i in range(self.data_num)])
+        if ((self.num_stack is not None) and (self.num_skip is not None) and
+                not self.is_prestacked):
+            input_i = stack_frame([input_i],
+                                  self.input_paths[i:i + 1],
+                                  self.frame_num_dict,
+                                  self.num_stack,
+                                  self.num_skip)[0]
+
+        if not self.is_memmap:
+            # Labels in the packed dataset are views as well
+            label_i = np.array(label_i)
+            self.cache.put(i, (input_i, label_i))
+        return input_i, label_i
 
     def next_batch(self, batch_size=None, session=None):
         """Make mini-batch.
         Args:
             batch_size: int, the size of mini-batch
-            session:
+            session: not used (for compatibility)
         Returns:
             inputs: list of input data, size `[batch_size]`
             labels_st: list of SparseTensor of labels
@@ -107,125 +259,33 @@ class DataSet(object):
             inputs_seq_len: list of length of inputs of size `[batch_size]`
             input_names: list of file name of input data of size `[batch_size]`
         """
-        if session is None and self.num_gpu != 1:
-            raise ValueError('Set session when using multiple GPUs.')
-
         if batch_size is None:
             batch_size = self.batch_size
 
-        next_epoch_flag = False
-
         while True:
-            #########################
-            # sorted dataset
-            #########################
-            if self.is_sorted:
-                if len(self.rest) > batch_size:
-                    sorted_indices = list(self.rest)[:batch_size]
-                    self.rest -= set(sorted_indices)
-                else:
-                    sorted_indices = list(self.rest)
-                    self.rest = set([i for i in range(self.data_num)])
-                    next_epoch_flag = True
-                    if self.data_type == 'train':
-                        print('---Next epoch---')
-
-                # Compute max frame num in mini-batch
-                max_frame_num = self.input_list[sorted_indices[-1]].shape[0]
-
-                # Compute max target label length in mini-batch
-                max_seq_len = max(map(len, self.label_list[sorted_indices]))
-
-                # Shuffle selected mini-batch
-                random.shuffle(sorted_indices)
-
-                # Initialization
-                inputs = np.zeros(
-                    (len(sorted_indices), max_frame_num, self.input_size))
-                # Padding with -1
-                labels = np.array([[-1] * max_seq_len]
-                                  * len(sorted_indices), dtype=int)
-                inputs_seq_len = np.empty((len(sorted_indices),), dtype=int)
-                input_names = [None] * len(sorted_indices)
-
-                # Set values of each data in mini-batch
-                for i_batch, x in enumerate(sorted_indices):
-                    data_i = self.input_list[x]
-                    frame_num = data_i.shape[0]
-                    inputs[i_batch, :frame_num, :] = data_i
-                    labels[i_batch, :len(self.label_list[x])
-                           ] = self.label_list[x]
-                    inputs_seq_len[i_batch] = frame_num
-                    input_names[i_batch] = basename(
-                        self.input_paths[x]).split('.')[0]
-
-            #########################
-            # not sorted dataset
-            #########################
-            else:
-                if len(self.rest) > batch_size:
-                    # Randomly sample mini-batch
-                    random_indices = random.sample(
-                        list(self.rest), batch_size)
-                    self.rest -= set(random_indices)
-                else:
-                    random_indices = list(self.rest)
-                    self.rest = set([i for i in range(self.data_num)])
-                    next_epoch_flag = True
-                    if self.data_type == 'train':
-                        print('---Next epoch---')
-
-                    # Shuffle selected mini-batch
-                    random.shuffle(random_indices)
-
-                # Compute max frame num in mini-batch
-                max_frame_num = max(
-                    map(lambda x: x.shape[0], self.input_list[random_indices]))
-
-                # Compute max target label length in mini-batch
-                max_seq_len = max(map(len, self.label_list[random_indices]))
-
-                # Initialization
-                inputs = np.zeros(
-                    (len(random_indices), max_frame_num, self.input_size))
-                # Padding with -1
-                labels = np.array([[-1] * max_seq_len]
-                                  * len(random_indices), dtype=int)
-                inputs_seq_len = np.empty((len(random_indices),), dtype=int)
-                input_names = [None] * len(random_indices)
-
-                # Set values of each data in mini-batch
-                for i_batch, x in enumerate(random_indices):
-                    data_i = self.input_list[x]
-                    frame_num = data_i.shape[0]
-                    inputs[i_batch, :frame_num, :] = data_i
-                    labels[i_batch, :len(self.label_list[x])
-                           ] = self.label_list[x]
-                    inputs_seq_len[i_batch] = frame_num
-                    input_names[i_batch] = basename(
-                        self.input_paths[x]).split('.')[0]
+            indices, next_epoch_flag = self.sampler.sample(batch_size)
+            if next_epoch_flag and self.data_type == 'train':
+                print('---Next epoch---')
+
+            # Load dataset in mini-batch
+            input_list, label_list = zip(*[self._load(x) for x in indices])
+
+            # Padding (labels are padded with -1). The sub-frames padded by
+            # frame stacking are kept 0 after normalization.
+            inputs, inputs_seq_len = self.pool.pad_inputs(
+                input_list, self.input_size, cmvn=self.cmvn,
+                frame_nums=[self.frame_num_tuple_sorted[x][1]
+                            for x in indices],
+                num_skip=self.num_skip)
+            labels, _ = self.pool.pad_labels(label_list, padded_value=-1)
+            input_names = [basename(self.input_paths[x]).split('.')[0]
+                           for x in indices]
 
             if self.num_gpu > 1:
-                divide_num = self.num_gpu
-                if next_epoch_flag:
-                    for i in range(self.num_gpu, 0, -1):
-                        if len(self.rest) % i == 0:
-                            divide_num = i
-                            break
-                    next_epoch_flag = False
-
                 # Now we split the mini-batch data by num_gpu
-                inputs = tf.split(inputs, divide_num, axis=0)
-                labels = tf.split(labels, divide_num, axis=0)
-                inputs_seq_len = tf.split(inputs_seq_len, divide_num, axis=0)
-                input_names = tf.split(input_names, divide_num, axis=0)
-
-                # Convert from SparseTensor to numpy.ndarray
-                inputs = list(map(session.run, inputs))
-                labels = list(map(session.run, labels))
+                inputs, inputs_seq_len, labels, input_names = split_batch(
+                    self.num_gpu, inputs, inputs_seq_len, labels, input_names)
                 labels_st = list(map(list2sparsetensor, labels))
-                inputs_seq_len = list(map(session.run, inputs_seq_len))
-                input_names = list(map(session.run, input_names))
             else:
                 labels_st = list2sparsetensor(labels)
 
@@ -8,6 +8,7 @@ from __future__ import division
 from __future__ import print_function
 
 import os
+from os.path import isfile
 import sys
 import tensorflow as tf
 import yaml
@@ -19,6 +20,7 @@ from data.read_dataset_attention import DataSet
 # from models.attention.load_model import load
 from models.attention import blstm_attention_seq2seq
 from metric.attention import do_eval_per, do_eval_cer
+from utils.cmvn import CMVN_FILE_NAME, load_cmvn
 
 
 def do_eval(network, label_type, eos_index, epoch=None):
@@ -29,17 +31,22 @@ def do_eval(network, label_type, eos_index, epoch=None):
         epoch: epoch to restore
         eos_index: int, the index of <EOS> class. This is used for padding.
     """
+    # Load the statistics for normalization saved in training
+    cmvn = None
+    if isfile(os.path.join(network.model_dir, CMVN_FILE_NAME)):
+        cmvn = load_cmvn(network.model_dir)
+
     # Load dataset
     if label_type == 'character':
         test_data = DataSet(data_type='test', label_type='character',
                             batch_size=1,
                             eos_index=eos_index,
-                            is_sorted=False, is_progressbar=True)
+                            is_sorted=False, is_progressbar=True, cmvn=cmvn)
     else:
         test_data = DataSet(data_type='test', label_type='phone39',
                             batch_size=1,
                             eos_index=eos_index,
-                            is_sorted=False, is_progressbar=True)
+                            is_sorted=False, is_progressbar=True, cmvn=cmvn)
 
     # Define placeholders
     network.inputs = tf.placeholder(tf.float32,
@@ -83,8 +90,8 @@ def do_eval(network, label_type, eos_index, epoch=None):
     _, decode_op_infer = network.decoder(
         decoder_outputs_train,
         decoder_outputs_infer,
-        decode_type='greedy',
-        beam_width=20)
+        decode_type='beam_search' if network.beam_width > 0 else 'greedy',
+        beam_width=network.beam_width)
     per_op = network.compute_ler(network.labels_st_true,
                                  network.labels_st_pred)
 
@@ -130,6 +137,8 @@ def do_eval(network, label_type, eos_index, epoch=None):
 def main(model_path):
 
     epoch = None  # if None, restore the final epoch
+    beam_width = 0  # if 0, use greedy decoding
+    length_penalty_weight = 0.0  # the weight of the length penalty
 
     # Load config file
     with open(os.path.join(model_path, 'config.yml'), "r") as f:
@@ -170,7 +179,11 @@ def main(model_path):
         clip_activation_decoder=param['clip_activation_decoder'],
         dropout_ratio_input=param['dropout_input'],
         dropout_ratio_hidden=param['dropout_hidden'],
-        weight_decay=param['weight_decay'])
+        weight_decay=param['weight_decay'],
+        attention_window_size=param.get('attention_window_size'),
+        attention_window_type=param.get('attention_window_type', 'centered'),
+        beam_width=beam_width,
+        length_penalty_weight=length_penalty_weight)
 
     network.model_dir = model_path
     print(network.model_dir)
@@ -8,19 +8,46 @@ from __future__ import division
 from __future__ import print_function
 
 import os
+from os.path import isfile
 import sys
+import pickle
 import tensorflow as tf
 import yaml
 
 sys.path.append('../')
 sys.path.append('../../')
 sys.path.append('../../../')
-from data.read_dataset_ctc import DataSet
+from data.read_dataset_ctc import DataSet, dataset_path
 from models.ctc.load_model import load
+from models.frame_stacking import stacked_seq_len
 from metric.ctc import do_eval_per, do_eval_cer
+from utils.tfrecord import tfrecord_dir, read_tfrecord
+from utils.cmvn import CMVN_FILE_NAME, load_cmvn
+from utils.ctc_decoder import BeamSearchDecoder
+from utils.ngram_lm import load_ngram_lm
 
 
-def do_eval(network, label_type, num_stack, num_skip, epoch=None):
+class TFRecordTestSet(object):
+    """The test set read from TFRecord files in the graph. do_eval_per() and
+       do_eval_cer() use only the size & label type of the dataset, so the
+       utterances are not loaded.
+    Args:
+        label_type: string, phone39 or character
+        batch_size: int, the size of mini-batch
+    """
+
+    def __init__(self, label_type, batch_size):
+        self.label_type = label_type
+        self.batch_size = batch_size
+        self.dataset_path = dataset_path(data_type='test',
+                                         label_type=label_type)
+        with open(os.path.join(self.dataset_path, 'frame_num.pickle'),
+                  'rb') as f:
+            self.data_num = len(pickle.load(f))
+
+
+def do_eval(network, label_type, num_stack, num_skip, epoch=None,
+            use_tfrecord=False, eval_batch_size=1, lm_path=None):
     """Evaluate the model.
     Args:
         network: model to restore
@@ -28,32 +55,55 @@ def do_eval(network, label_type, num_stack, num_skip, epoch=None):
         num_stack: int, the number of frames to stack
         num_skip: int, the number of frames to skip
         epoch: int, the epoch to restore
+        use_tfrecord: if True, test data is read from TFRecord files made by
+            utils/tfrecord.py in the graph instead of feed_dict
+        eval_batch_size: int, the size of mini-batch. Utterances are sorted
+            by frame num and batched with the least padding, which gives the
+            same results as eval_batch_size=1.
+        lm_path: path to the n-gram LM made by utils/ngram_lm.py. If set,
+            outputs are decoded by the prefix beam search with the LM
+            (utils/ctc_decoder.py) instead of the graph.
     """
+    # Load the statistics for normalization saved in training
+    cmvn = None
+    if isfile(os.path.join(network.model_dir, CMVN_FILE_NAME)):
+        cmvn = load_cmvn(network.model_dir)
+
     # Load dataset
-    if label_type == 'character':
-        test_data = DataSet(data_type='test', label_type='character',
-                            batch_size=1,
-                            num_stack=num_stack, num_skip=num_skip,
-                            is_sorted=False, is_progressbar=True)
+    test_label_type = 'character' if label_type == 'character' else 'phone39'
+    if use_tfrecord:
+        # NOTE: the test set is read from TFRecord files in the graph
+        test_data = TFRecordTestSet(label_type=test_label_type,
+                                    batch_size=eval_batch_size)
     else:
-        test_data = DataSet(data_type='test', label_type='phone39',
-                            batch_size=1,
+        test_data = DataSet(data_type='test', label_type=test_label_type,
+                            batch_size=eval_batch_size,
                             num_stack=num_stack, num_skip=num_skip,
-                            is_sorted=False, is_progressbar=True)
+                            is_sorted=True, is_progressbar=True, cmvn=cmvn)
     network.label_type = label_type
 
     # Define placeholders
-    network.inputs = tf.placeholder(
-        tf.float32,
-        shape=[None, None, network.input_size],
-        name='input')
-    indices_pl = tf.placeholder(tf.int64, name='indices')
-    values_pl = tf.placeholder(tf.int32, name='values')
-    shape_pl = tf.placeholder(tf.int64, name='shape')
-    network.labels = tf.SparseTensor(indices_pl, values_pl, shape_pl)
-    network.inputs_seq_len = tf.placeholder(tf.int64,
-                                            shape=[None],
-                                            name='inputs_seq_len')
+    if use_tfrecord:
+        network.inputs, network.labels, network.inputs_seq_len, _ = \
+            read_tfrecord(tfrecord_dir(test_data.dataset_path,
+                                       num_stack, num_skip),
+                          input_size=network.input_size,
+                          batch_size=eval_batch_size,
+                          is_training=False,
+                          cmvn=cmvn,
+                          num_skip=num_skip)
+    else:
+        network.inputs = tf.placeholder(
+            tf.float32,
+            shape=[None, None, network.input_size],
+            name='input')
+        indices_pl = tf.placeholder(tf.int64, name='indices')
+        values_pl = tf.placeholder(tf.int32, name='values')
+        shape_pl = tf.placeholder(tf.int64, name='shape')
+        network.labels = tf.SparseTensor(indices_pl, values_pl, shape_pl)
+        network.inputs_seq_len = tf.placeholder(tf.int64,
+                                                shape=[None],
+                                                name='inputs_seq_len')
     network.keep_prob_input = tf.placeholder(tf.float32,
                                              name='keep_prob_input')
     network.keep_prob_hidden = tf.placeholder(tf.float32,
@@ -69,50 +119,70 @@ def do_eval(network, label_type, num_stack, num_skip, epoch=None):
                                 network.inputs_seq_len,
                                 decode_type='beam_search',
                                 beam_width=20)
+    decoder, logits_op = None, None
+    if lm_path is not None:
+        decoder = BeamSearchDecoder(beam_width=20,
+                                    blank_index=network.num_classes - 1,
+                                    lm=load_ngram_lm(lm_path))
+        logits_op = [logits, stacked_seq_len(network.inputs_seq_len,
+                                             network.num_skip)]
     per_op = network.compute_ler(decode_op, network.labels)
 
     # Create a saver for writing training checkpoints
     saver = tf.train.Saver()
 
-    with tf.Session() as sess:
-        ckpt = tf.train.get_checkpoint_state(network.model_dir)
-
-        # If check point exists
-        if ckpt:
-            # Use last saved model
-            model_path = ckpt.model_checkpoint_path
-            if epoch is not None:
-                model_path = model_path.split('/')[:-1]
-                model_path = '/'.join(model_path) + '/model.ckpt-' + str(epoch)
-            saver.restore(sess, model_path)
-            print("Model restored: " + model_path)
-        else:
-            raise ValueError('There are not any checkpoints.')
-
-        print('Test Data Evaluation:')
-        if label_type == 'character':
-            cer_test = do_eval_cer(
-                session=sess,
-                decode_op=decode_op,
-                network=network,
-                dataset=test_data,
-                is_progressbar=True)
-            print('  CER: %f %%' % (cer_test * 100))
-        else:
-            per_test = do_eval_per(
-                session=sess,
-                decode_op=decode_op,
-                per_op=per_op,
-                network=network,
-                dataset=test_data,
-                train_label_type=label_type,
-                is_progressbar=True)
-            print('  PER: %f %%' % (per_test * 100))
+    try:
+        with tf.Session() as sess:
+            ckpt = tf.train.get_checkpoint_state(network.model_dir)
+
+            # If check point exists
+            if ckpt:
+                # Use last saved model
+                model_path = ckpt.model_checkpoint_path
+                if epoch is not None:
+                    model_path = model_path.split('/')[:-1]
+                    model_path = '/'.join(model_path) + \
+                        '/model.ckpt-' + str(epoch)
+                saver.restore(sess, model_path)
+                print("Model restored: " + model_path)
+            else:
+                raise ValueError('There are not any checkpoints.')
+
+            print('Test Data Evaluation:')
+            if label_type == 'character':
+                cer_test = do_eval_cer(
+                    session=sess,
+                    decode_op=decode_op,
+                    network=network,
+                    dataset=test_data,
+                    is_progressbar=True,
+                    use_tfrecord=use_tfrecord,
+                    decoder=decoder,
+                    logits_op=logits_op)
+                print('  CER: %f %%' % (cer_test * 100))
+            else:
+                per_test = do_eval_per(
+                    session=sess,
+                    decode_op=decode_op,
+                    per_op=per_op,
+                    network=network,
+                    dataset=test_data,
+                    train_label_type=label_type,
+                    is_progressbar=True,
+                    use_tfrecord=use_tfrecord,
+                    decoder=decoder,
+                    logits_op=logits_op)
+                print('  PER: %f %%' % (per_test * 100))
+    finally:
+        # Stop workers of the decoder even when evaluation fails
+        if decoder is not None:
+            decoder.close()
 
 
 def main(model_path):
 
     epoch = None  # if None, restore the final epoch
+    lm_path = None  # if set, decode with the n-gram LM
 
     # Load config file
     with open(os.path.join(model_path, 'config.yml'), "r") as f:
@@ -152,7 +222,10 @@ def main(model_path):
             label_type=corpus['label_type'],
             num_stack=feature['num_stack'],
             num_skip=feature['num_skip'],
-            epoch=epoch)
+            epoch=epoch,
+            use_tfrecord=corpus.get('use_tfrecord', False),
+            eval_batch_size=param['batch_size'],
+            lm_path=lm_path)
 
 
 if __name__ == '__main__':
@@ -8,6 +8,7 @@ from __future__ import division
 from __future__ import print_function
 
 import os
+from os.path import isfile
 import sys
 import tensorflow as tf
 import yaml
@@ -18,6 +19,7 @@ sys.path.append('../../../')
 from data.read_dataset_multitask_ctc import DataSet
 from models.ctc.load_model_multitask import load
 from metric.ctc import do_eval_per, do_eval_cer
+from utils.cmvn import CMVN_FILE_NAME, load_cmvn
 
 
 def do_eval(network, label_type_second, num_stack, num_skip, epoch=None):
@@ -29,17 +31,22 @@ def do_eval(network, label_type_second, num_stack, num_skip, epoch=None):
         num_skip: int, the number of frames to skip
         epoch: int, the epoch to restore
     """
+    # Load the statistics for normalization saved in training
+    cmvn = None
+    if isfile(os.path.join(network.model_dir, CMVN_FILE_NAME)):
+        cmvn = load_cmvn(network.model_dir)
+
     # Load dataset
     if label_type_second == 'character':
         test_data = DataSet(data_type='test', label_type_second='character',
                             batch_size=1,
                             num_stack=num_stack, num_skip=num_skip,
-                            is_sorted=False, is_progressbar=True)
+                            is_sorted=False, is_progressbar=True, cmvn=cmvn)
     else:
         test_data = DataSet(data_type='test', label_type_second='phone39',
                             batch_size=1,
                             num_stack=num_stack, num_skip=num_skip,
-                            is_sorted=False, is_progressbar=True)
+                            is_sorted=False, is_progressbar=True, cmvn=cmvn)
 
     # Define placeholders
     network.inputs = tf.placeholder(
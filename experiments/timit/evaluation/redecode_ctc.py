@@ -0,0 +1,352 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Re-decode cached logits of trained CTC network (TIMIT corpus).
+   Logits of the test set are computed once per checkpoint and saved in
+   model_dir/logit_cache (see utils/logit_cache.py). Then each decoding
+   setting is evaluated from the cache without running the acoustic model.
+
+   Usage:
+       python redecode_ctc.py path_to_saved_model [setting ...]
+   where each setting is `greedy`, `beam_search:beam_width` or
+   `prefix_beam_search:beam_width[:blank_threshold]`
+   (default: greedy beam_search:20).
+   prefix_beam_search is the numpy beam search (utils/ctc_decoder.py), which
+   uses the n-gram LM if lm_path is set in main(). If blank_threshold is set,
+   blank frames are skipped before beam search, and the frame reduction
+   ratio & the difference from the setting without skipping are reported.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+from os.path import isfile, isdir
+import sys
+import time
+import tensorflow as tf
+import yaml
+
+sys.path.append('../')
+sys.path.append('../../')
+sys.path.append('../../../')
+from data.read_dataset_ctc import DataSet, dataset_path
+from models.ctc.load_model import load
+from models.frame_stacking import stacked_seq_len
+from metric.ctc import do_eval_per_cache, do_eval_cer_cache
+from utils.cmvn import CMVN_FILE_NAME, load_cmvn
+from utils.logit_cache import logit_cache_path, save_logits, LogitCache
+from utils.ctc_decoder import greedy_decode, BeamSearchDecoder
+from utils.ngram_lm import load_ngram_lm
+from utils.sparsetensor import sparsetensor2list
+
+
+def make_logit_cache(network, label_type, num_stack, num_skip, epoch=None,
+                     eval_batch_size=1, top_k=None):
+    """Open the cache of logits of the test set. If it does not exist,
+       load the test set, restore the model and compute logits first.
+    Args:
+        network: model to restore
+        label_type: string, phone39 or phone48 or phone61 or character
+        num_stack: int, the number of frames to stack
+        num_skip: int, the number of frames to skip
+        epoch: int, the epoch to restore
+        eval_batch_size: int, the size of mini-batch
+        top_k: int, the number of classes to keep in each frame. If None,
+            all logits are saved.
+    Returns:
+        An instance of LogitCache
+    """
+    ckpt = tf.train.get_checkpoint_state(network.model_dir)
+    if not ckpt:
+        raise ValueError('There are not any checkpoints.')
+    # Use last saved model
+    model_path = ckpt.model_checkpoint_path
+    if epoch is not None:
+        model_path = model_path.split('/')[:-1]
+        model_path = '/'.join(model_path) + '/model.ckpt-' + str(epoch)
+
+    # Only the path to the dataset is needed to find the cache
+    data_label_type = 'character' if label_type == 'character' else 'phone39'
+    cache_path = logit_cache_path(network.model_dir, model_path, 'test',
+                                  dataset_path('test', data_label_type),
+                                  top_k=top_k)
+    if isdir(cache_path):
+        print('Logits loaded: ' + cache_path)
+        return LogitCache(cache_path)
+
+    # Load the statistics for normalization saved in training
+    cmvn = None
+    if isfile(os.path.join(network.model_dir, CMVN_FILE_NAME)):
+        cmvn = load_cmvn(network.model_dir)
+
+    # Load dataset
+    test_data = DataSet(data_type='test', label_type=data_label_type,
+                        batch_size=eval_batch_size,
+                        num_stack=num_stack, num_skip=num_skip,
+                        is_sorted=True, is_progressbar=True, cmvn=cmvn)
+
+    # Define placeholders
+    network.inputs = tf.placeholder(
+        tf.float32,
+        shape=[None, None, network.input_size],
+        name='input')
+    indices_pl = tf.placeholder(tf.int64, name='indices')
+    values_pl = tf.placeholder(tf.int32, name='values')
+    shape_pl = tf.placeholder(tf.int64, name='shape')
+    network.labels = tf.SparseTensor(indices_pl, values_pl, shape_pl)
+    network.inputs_seq_len = tf.placeholder(tf.int64,
+                                            shape=[None],
+                                            name='inputs_seq_len')
+    network.keep_prob_input = tf.placeholder(tf.float32,
+                                             name='keep_prob_input')
+    network.keep_prob_hidden = tf.placeholder(tf.float32,
+                                              name='keep_prob_hidden')
+
+    # Add to the graph each operation (including model definition)
+    _, logits = network.compute_loss(network.inputs,
+                                     network.labels,
+                                     network.inputs_seq_len,
+                                     network.keep_prob_input,
+                                     network.keep_prob_hidden)
+    # The length of logits when frames are stacked in the graph
+    logits_seq_len = stacked_seq_len(network.inputs_seq_len,
+                                     network.num_skip)
+
+    # Create a saver for writing training checkpoints
+    saver = tf.train.Saver()
+
+    with tf.Session() as sess:
+        saver.restore(sess, model_path)
+        print("Model restored: " + model_path)
+
+        print('=> Saving logits to %s...' % cache_path)
+        return save_logits(session=sess,
+                           logits_op=logits,
+                           seq_len_op=logits_seq_len,
+                           network=network,
+                           dataset=test_data,
+                           save_path=cache_path,
+                           eval_batch_size=eval_batch_size,
+                           top_k=top_k,
+                           meta={'label_type': data_label_type},
+                           is_progressbar=True)
+
+
+def make_decode_func(decode_type, num_classes, beam_width=None, lm=None,
+                     blank_threshold=None):
+    """
+    Args:
+        decode_type: greedy or beam_search or prefix_beam_search
+        num_classes: int, the number of classes including the blank class
+        beam_width: int, beam width for beam search
+        lm: An instance of NgramLM for prefix_beam_search, or None
+        blank_threshold: float, the threshold to skip blank frames before
+            prefix_beam_search, or None
+    Returns:
+        decode_func: A function which takes time-major logits & the length
+            of them, and returns list of label sequences
+        resource: session or decoder to close after decoding, or None
+    """
+    if decode_type == 'greedy':
+        def decode_func(logits, seq_len):
+            return greedy_decode(logits, seq_len, num_classes - 1)
+        return decode_func, None
+
+    elif decode_type == 'beam_search':
+        # Build only the decoder (no acoustic model)
+        graph = tf.Graph()
+        with graph.as_default():
+            logits_pl = tf.placeholder(tf.float32,
+                                       shape=[None, None, num_classes],
+                                       name='logits')
+            seq_len_pl = tf.placeholder(tf.int32, shape=[None],
+                                        name='seq_len')
+            decoded, _ = tf.nn.ctc_beam_search_decoder(
+                logits_pl, seq_len_pl, beam_width=beam_width)
+            decode_op = tf.to_int32(decoded[0])
+        session = tf.Session(graph=graph)
+
+        def decode_func(logits, seq_len):
+            labels_pred_st = session.run(
+                decode_op, feed_dict={logits_pl: logits, seq_len_pl: seq_len})
+            return sparsetensor2list(labels_pred_st, len(seq_len))
+        return decode_func, session
+
+    elif decode_type == 'prefix_beam_search':
+        decoder = BeamSearchDecoder(beam_width=beam_width,
+                                    blank_index=num_classes - 1, lm=lm,
+                                    blank_threshold=blank_threshold)
+        return decoder, decoder
+
+    raise ValueError(
+        'decode_type is "greedy" or "beam_search" or "prefix_beam_search".')
+
+
+def evaluate(logit_cache, label_type, decode_func, eval_batch_size=32):
+    """
+    Args:
+        logit_cache: An instance of LogitCache
+        label_type: string, phone39 or phone48 or phone61 or character
+        decode_func: A function which takes time-major logits & the length
+            of them, and returns list of label sequences
+        eval_batch_size: int, the size of mini-batch to decode
+    Returns:
+        An average of PER or CER
+    """
+    if label_type == 'character':
+        return do_eval_cer_cache(logit_cache, decode_func,
+                                 batch_size=eval_batch_size)
+    return do_eval_per_cache(logit_cache, decode_func,
+                             train_label_type=label_type,
+                             data_label_type=logit_cache.meta['label_type'],
+                             batch_size=eval_batch_size)
+
+
+def do_redecode(logit_cache, label_type, settings, eval_batch_size=32,
+                lm=None):
+    """Evaluate each decoding setting from the cache.
+    Args:
+        logit_cache: An instance of LogitCache
+        label_type: string, phone39 or phone48 or phone61 or character
+        settings: list of tuples of (decode_type, beam_width,
+            blank_threshold)
+        eval_batch_size: int, the size of mini-batch to decode
+        lm: An instance of NgramLM for prefix_beam_search, or None
+    """
+    metric_name = 'CER' if label_type == 'character' else 'PER'
+
+    # key => (error rate, elapsed time)
+    results = {}
+
+    def run(decode_type, beam_width, blank_threshold):
+        key = (decode_type, beam_width, blank_threshold)
+        if key not in results:
+            decode_func, resource = make_decode_func(
+                decode_type, logit_cache.num_classes, beam_width, lm,
+                blank_threshold)
+            try:
+                start_time = time.time()
+                error_rate = evaluate(logit_cache, label_type, decode_func,
+                                      eval_batch_size)
+                results[key] = (error_rate, time.time() - start_time)
+            finally:
+                # Stop the session or workers even when decoding fails
+                if resource is not None:
+                    resource.close()
+            if blank_threshold is not None:
+                print('  frame reduction ratio: %.3f' %
+                      decode_func.reduction_ratio)
+        return results[key]
+
+    for decode_type, beam_width, blank_threshold in settings:
+        if decode_type == 'greedy':
+            print('greedy:')
+        elif blank_threshold is None:
+            print('%s (beam_width: %d):' % (decode_type, beam_width))
+        else:
+            print('%s (beam_width: %d, blank_threshold: %s):' %
+                  (decode_type, beam_width, blank_threshold))
+        error_rate, elapsed_time = run(decode_type, beam_width,
+                                       blank_threshold)
+        print('  %s: %f %%' % (metric_name, error_rate * 100))
+        print('  (%.3f sec)' % elapsed_time)
+
+        if blank_threshold is not None:
+            # Compare with the same setting without skipping
+            error_rate_full, elapsed_time_full = run(
+                decode_type, beam_width, None)
+            print('  %s delta: %+f %% (%.2fx faster)' %
+                  (metric_name, (error_rate - error_rate_full) * 100,
+                   elapsed_time_full / max(elapsed_time, 1e-6)))
+
+
+def parse_setting(setting):
+    """
+    Args:
+        setting: string, `greedy` or `beam_search:beam_width` or
+            `prefix_beam_search:beam_width[:blank_threshold]`
+    Returns:
+        decode_type: greedy or beam_search or prefix_beam_search
+        beam_width: int or None
+        blank_threshold: float or None
+    """
+    if setting == 'greedy':
+        return 'greedy', None, None
+    fields = setting.split(':')
+    if fields[0] == 'beam_search' and len(fields) == 2:
+        return fields[0], int(fields[1]), None
+    elif fields[0] == 'prefix_beam_search' and len(fields) in [2, 3]:
+        blank_threshold = float(fields[2]) if len(fields) == 3 else None
+        return fields[0], int(fields[1]), blank_threshold
+    raise ValueError('Unknown setting: ' + setting)
+
+
+def main(model_path, settings):
+
+    epoch = None  # if None, restore the final epoch
+    top_k = None  # if set, keep only top_k logits of each frame
+    lm_path = None  # if set, prefix_beam_search uses the n-gram LM
+
+    # Load config file
+    with open(os.path.join(model_path, 'config.yml'), "r") as f:
+        config = yaml.load(f)
+        corpus = config['corpus']
+        feature = config['feature']
+        param = config['param']
+
+    if corpus['label_type'] == 'phone61':
+        output_size = 61
+    elif corpus['label_type'] == 'phone48':
+        output_size = 48
+    elif corpus['label_type'] == 'phone39':
+        output_size = 39
+    elif corpus['label_type'] == 'character':
+        output_size = 30
+
+    # Model setting
+    CTCModel = load(model_type=config['model_name'])
+    network = CTCModel(
+        batch_size=1,
+        input_size=feature['input_size'] * feature['num_stack'],
+        num_unit=param['num_unit'],
+        num_layer=param['num_layer'],
+        output_size=output_size,
+        parameter_init=param['weight_init'],
+        clip_grad=param['clip_grad'],
+        clip_activation=param['clip_activation'],
+        dropout_ratio_input=param['dropout_input'],
+        dropout_ratio_hidden=param['dropout_hidden'],
+        num_proj=param['num_proj'],
+        weight_decay=param['weight_decay'])
+
+    network.model_dir = model_path
+    print(network.model_dir)
+    logit_cache = make_logit_cache(network=network,
+                                   label_type=corpus['label_type'],
+                                   num_stack=feature['num_stack'],
+                                   num_skip=feature['num_skip'],
+                                   epoch=epoch,
+                                   eval_batch_size=param['batch_size'],
+                                   top_k=top_k)
+
+    print('Test Data Evaluation:')
+    do_redecode(logit_cache=logit_cache,
+                label_type=corpus['label_type'],
+                settings=[parse_setting(setting) for setting in settings],
+                eval_batch_size=param['batch_size'],
+                lm=load_ngram_lm(lm_path) if lm_path is not None else None)
+
+
+if __name__ == '__main__':
+
+    args = sys.argv
+    if len(args) < 2:
+        raise ValueError(
+            ("Set a path to saved model.\n"
+             "Usase: python redecode_ctc.py path_to_saved_model "
+             "[greedy] [beam_search:beam_width] "
+             "[prefix_beam_search:beam_width[:blank_threshold] ...]"))
+    settings = args[2:] if len(args) > 2 else ['greedy', 'beam_search:20']
+    main(model_path=args[1], settings=settings)
@@ -7,22 +7,74 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
-import re
-import Levenshtein
-
-from .mapping import map_to_39phone
-from .edit_distance import compute_edit_distance
+from .mapping import map_to_39phone_table
 from utils.labels.character import num2char
-from utils.labels.phone import num2phone, phone2num
-from utils.sparsetensor import list2sparsetensor, sparsetensor2list
+from utils.labels.vocab import map_batch
+from utils.sparsetensor import sparsetensor2list
+from utils.ctc_decoder import run_decoder
+from utils.scorer import Scorer, score_labels, score_strings
 from utils.exception_func import exception
 from utils.progressbar import wrap_iterator
 
 
+def _score_per(labels_true, labels_pred, map_table_true, map_table_pred):
+    """Map labels to 39 phones & compute error counts (in a worker).
+    Args:
+        labels_true: list of label sequences of ground truth
+        labels_pred: list of label sequences of prediction
+        map_table_true: lookup array to 39 phones, or None for phone39
+        map_table_pred: lookup array to 39 phones
+    Returns:
+        The same as utils.scorer.score_labels()
+    """
+    labels_pred = map_batch(map_table_pred, labels_pred)
+    if map_table_true is not None:
+        labels_true = map_batch(map_table_true, labels_true)
+    return score_labels(labels_true, labels_pred)
+
+
+def _score_cer(labels_true, labels_pred, map_file_path):
+    """Convert labels to strings & compute error counts (in a worker).
+    Args:
+        labels_true: list of label sequences of ground truth
+        labels_pred: list of label sequences of prediction
+        map_file_path: path to the mapping file
+    Returns:
+        The same as utils.scorer.score_labels()
+    """
+    return score_strings([num2char(x, map_file_path) for x in labels_true],
+                         [num2char(x, map_file_path) for x in labels_pred])
+
+
+def _map_tables(train_label_type, data_label_type):
+    """Make lookup arrays to map indices to 39 phones.
+    Args:
+        train_label_type: string, phone39 or phone48 or phone61
+        data_label_type: string, the label type of ground truth
+    Returns:
+        map_table_true: lookup array for ground truth, or None for phone39
+        map_table_pred: lookup array for prediction
+    """
+    phone2num_map_file_path = '../metric/mapping_files/ctc/phone2num_' + \
+        train_label_type[5:7] + '.txt'
+    phone2num_39_map_file_path = '../metric/mapping_files/ctc/phone2num_39.txt'
+    phone2phone_map_file_path = '../metric/mapping_files/phone2phone.txt'
+    map_table_pred = map_to_39phone_table(
+        train_label_type, phone2num_map_file_path,
+        phone2num_39_map_file_path, phone2phone_map_file_path)
+    map_table_true = None
+    if data_label_type != 'phone39':
+        map_table_true = map_to_39phone_table(
+            data_label_type, phone2num_map_file_path,
+            phone2num_39_map_file_path, phone2phone_map_file_path)
+    return map_table_true, map_table_pred
+
+
 @exception
 def do_eval_per(session, decode_op, per_op, network, dataset, train_label_type,
                 eval_batch_size=None, is_progressbar=False,
-                is_multitask=False):
+                is_multitask=False, use_tfrecord=False, num_worker=2,
+                decoder=None, logits_op=None):
     """Evaluate trained model by Phone Error Rate.
     Args:
         session: session of training model
@@ -34,6 +86,17 @@ def do_eval_per(session, decode_op, per_op, network, dataset, train_label_type,
         eval_batch_size: int, the batch size when evaluating the model
         is_progressbar: if True, visualize the progressbar
         is_multitask: if True, evaluate the multitask model
+        use_tfrecord: if True, inputs & labels are read from the input
+            pipeline (utils/tfrecord.py) built into network, and dataset is
+            used only for its size. eval_batch_size must be the same as the
+            size of mini-batch of the pipeline.
+        num_worker: int, the number of processes to score decoded
+            mini-batches while decoding the next ones (0 for no workers)
+        decoder: A numpy decoder (e.g. utils.ctc_decoder.BeamSearchDecoder).
+            If set, outputs of logits_op are decoded by decoder instead of
+            decode_op.
+        logits_op: list of operations of logits & the length of logits,
+            used only when decoder is set
     Returns:
         per_global: An average of PER
     """
@@ -48,88 +111,60 @@ def do_eval_per(session, decode_op, per_op, network, dataset, train_label_type,
     iteration = int(num_examples / batch_size)
     if (num_examples / batch_size) != int(num_examples / batch_size):
         iteration += 1
-    per_global = 0
 
     # Make data generator
-    mini_batch = dataset.next_batch(batch_size=batch_size)
-
-    phone2num_map_file_path = '../metric/mapping_files/ctc/phone2num_' + \
-        train_label_type[5:7] + '.txt'
-    phone2num_39_map_file_path = '../metric/mapping_files/ctc/phone2num_39.txt'
-    phone2phone_map_file_path = '../metric/mapping_files/phone2phone.txt'
-    for step in wrap_iterator(range(iteration), is_progressbar):
-        # Create feed dictionary for next mini batch
-        if not is_multitask:
-            inputs, labels_true_st, inputs_seq_len, _ = mini_batch.__next__()
-        else:
-            inputs, _, labels_true_st, inputs_seq_len, _ = mini_batch.__next__()
-
-        feed_dict = {
-            network.inputs: inputs,
-            network.inputs_seq_len: inputs_seq_len,
-            network.keep_prob_input: 1.0,
-            network.keep_prob_hidden: 1.0
-        }
-
-        batch_size_each = len(inputs_seq_len)
-
-        if False:
-            # Evaluate by the same phones as phones used when training
-            per_local = session.run(per_op, feed_dict=feed_dict)
-            per_global += per_local * batch_size_each
-
-        else:
-            # Evaluate by 39 phones
-            labels_pred_st = session.run(decode_op, feed_dict=feed_dict)
-            labels_true = sparsetensor2list(labels_true_st, batch_size_each)
-            labels_pred = sparsetensor2list(labels_pred_st, batch_size_each)
-            for i_batch in range(batch_size_each):
-                # Convert from num to phone (-> list of phone strings)
-                phone_pred_seq = num2phone(
-                    labels_pred[i_batch], phone2num_map_file_path)
-                phone_pred_list = phone_pred_seq.split(' ')
-
-                # Mapping to 39 phones (-> list of phone strings)
-                phone_pred_list = map_to_39phone(
-                    phone_pred_list, train_label_type,
-                    phone2phone_map_file_path)
-
-                # Convert from phone to num (-> list of phone indices)
-                phone_pred_list = phone2num(
-                    phone_pred_list, phone2num_39_map_file_path)
-                labels_pred[i_batch] = phone_pred_list
-
-                if data_label_type != 'phone39':
-                    # Convert from num to phone (-> list of phone strings)
-                    phone_true_seq = num2phone(
-                        labels_true[i_batch], phone2num_map_file_path)
-                    phone_true_list = phone_true_seq.split(' ')
-
-                    # Mapping to 39 phones (-> list of phone strings)
-                    phone_true_list = map_to_39phone(
-                        phone_true_list, data_label_type,
-                        phone2phone_map_file_path)
-
-                    # Convert from phone to num (-> list of phone indices)
-                    phone_true_list = phone2num(
-                        phone_true_list, phone2num_39_map_file_path)
-                    labels_true[i_batch] = phone_true_list
-
-            # Compute edit distance
-            labels_true_st = list2sparsetensor(labels_true)
-            labels_pred_st = list2sparsetensor(labels_pred)
-            per_local = compute_edit_distance(
-                session, labels_true_st, labels_pred_st)
-            per_global += per_local * batch_size_each
-
-    per_global /= dataset.data_num
+    if not use_tfrecord:
+        mini_batch = dataset.next_batch(batch_size=batch_size)
+
+    map_table_true, map_table_pred = _map_tables(train_label_type,
+                                                 data_label_type)
+    scorer = Scorer(_score_per, num_worker=num_worker)
+    try:
+        for step in wrap_iterator(range(iteration), is_progressbar):
+            feed_dict = {
+                network.keep_prob_input: 1.0,
+                network.keep_prob_hidden: 1.0
+            }
+            if use_tfrecord:
+                if decoder is None:
+                    outputs, labels_true_st = session.run(
+                        [decode_op, network.labels], feed_dict=feed_dict)
+                    batch_size_each = labels_true_st.dense_shape[0]
+                    labels_pred = sparsetensor2list(outputs, batch_size_each)
+                else:
+                    outputs, labels_true_st = session.run(
+                        [logits_op, network.labels], feed_dict=feed_dict)
+                    batch_size_each = labels_true_st.dense_shape[0]
+                    labels_pred = decoder(*outputs)
+            else:
+                # Create feed dictionary for next mini batch
+                if not is_multitask:
+                    inputs, labels_true_st, inputs_seq_len, _ = mini_batch.__next__()
+                else:
+                    inputs, _, labels_true_st, inputs_seq_len, _ = mini_batch.__next__()
+                feed_dict[network.inputs] = inputs
+                feed_dict[network.inputs_seq_len] = inputs_seq_len
+                batch_size_each = len(inputs_seq_len)
+                labels_pred = run_decoder(session, decode_op, feed_dict,
+                                          batch_size_each, decoder, logits_op)
+
+            # Evaluate by 39 phones (scored in the background)
+            scorer.submit(sparsetensor2list(labels_true_st, batch_size_each),
+                          labels_pred, map_table_true, map_table_pred)
+
+        per_sum = scorer.result()[0]
+    finally:
+        # Stop workers even when decoding fails
+        scorer.close()
+    per_global = per_sum / dataset.data_num
 
     return per_global
 
 
 @exception
 def do_eval_cer(session, decode_op, network, dataset, eval_batch_size=None,
-                is_progressbar=False, is_multitask=False):
+                is_progressbar=False, is_multitask=False, use_tfrecord=False,
+                num_worker=2, decoder=None, logits_op=None):
     """Evaluate trained model by Character Error Rate.
     Args:
         session: session of training model
@@ -139,6 +174,17 @@ def do_eval_cer(session, decode_op, network, dataset, eval_batch_size=None,
         eval_batch_size: int, the batch size when evaluating the model
         is_progressbar: if True, visualize the progressbar
         is_multitask: if True, evaluate the multitask model
+        use_tfrecord: if True, inputs & labels are read from the input
+            pipeline (utils/tfrecord.py) built into network, and dataset is
+            used only for its size. eval_batch_size must be the same as the
+            size of mini-batch of the pipeline.
+        num_worker: int, the number of processes to score decoded
+            mini-batches while decoding the next ones (0 for no workers)
+        decoder: A numpy decoder (e.g. utils.ctc_decoder.BeamSearchDecoder).
+            If set, outputs of logits_op are decoded by decoder instead of
+            decode_op.
+        logits_op: list of operations of logits & the length of logits,
+            used only when decoder is set
     Return:
         cer_mean: An average of CER
     """
@@ -151,46 +197,108 @@ def do_eval_cer(session, decode_op, network, dataset, eval_batch_size=None,
     iteration = int(num_examples / batch_size)
     if (num_examples / batch_size) != int(num_examples / batch_size):
         iteration += 1
-    cer_sum = 0
 
     # Make data generator
-    mini_batch = dataset.next_batch(batch_size=batch_size)
+    if not use_tfrecord:
+        mini_batch = dataset.next_batch(batch_size=batch_size)
 
     map_file_path = '../metric/mapping_files/ctc/char2num.txt'
-    for step in wrap_iterator(range(iteration), is_progressbar):
-        # Create feed dictionary for next mini batch
-        if not is_multitask:
-            inputs, labels_true_st, inputs_seq_len, _ = mini_batch.__next__()
-        else:
-            inputs, labels_true_st, _, inputs_seq_len, _ = mini_batch.__next__()
-
-        feed_dict = {
-            network.inputs: inputs,
-            network.inputs_seq_len: inputs_seq_len,
-            network.keep_prob_input: 1.0,
-            network.keep_prob_hidden: 1.0
-        }
-
-        batch_size_each = len(inputs_seq_len)
-
-        labels_pred_st = session.run(decode_op, feed_dict=feed_dict)
-        labels_true = sparsetensor2list(labels_true_st, batch_size_each)
-        labels_pred = sparsetensor2list(labels_pred_st, batch_size_each)
-        for i_batch in range(batch_size_each):
-
-            # Convert from list to string
-            str_true = num2char(labels_true[i_batch], map_file_path)
-            str_pred = num2char(labels_pred[i_batch], map_file_path)
-
-            # Remove silence(_) labels
-            str_true = re.sub(r'[_]+', "", str_true)
-            str_pred = re.sub(r'[_]+', "", str_pred)
-
-            # Compute edit distance
-            cer_each = Levenshtein.distance(
-                str_pred, str_true) / len(list(str_true))
-            cer_sum += cer_each
-
+    scorer = Scorer(_score_cer, num_worker=num_worker)
+    try:
+        for step in wrap_iterator(range(iteration), is_progressbar):
+            feed_dict = {
+                network.keep_prob_input: 1.0,
+                network.keep_prob_hidden: 1.0
+            }
+            if use_tfrecord:
+                if decoder is None:
+                    outputs, labels_true_st = session.run(
+                        [decode_op, network.labels], feed_dict=feed_dict)
+                    batch_size_each = labels_true_st.dense_shape[0]
+                    labels_pred = sparsetensor2list(outputs, batch_size_each)
+                else:
+                    outputs, labels_true_st = session.run(
+                        [logits_op, network.labels], feed_dict=feed_dict)
+                    batch_size_each = labels_true_st.dense_shape[0]
+                    labels_pred = decoder(*outputs)
+            else:
+                # Create feed dictionary for next mini batch
+                if not is_multitask:
+                    inputs, labels_true_st, inputs_seq_len, _ = mini_batch.__next__()
+                else:
+                    inputs, labels_true_st, _, inputs_seq_len, _ = mini_batch.__next__()
+                feed_dict[network.inputs] = inputs
+                feed_dict[network.inputs_seq_len] = inputs_seq_len
+                batch_size_each = len(inputs_seq_len)
+                labels_pred = run_decoder(session, decode_op, feed_dict,
+                                          batch_size_each, decoder, logits_op)
+
+            # Scored in the background
+            scorer.submit(sparsetensor2list(labels_true_st, batch_size_each),
+                          labels_pred, map_file_path)
+
+        cer_sum = scorer.result()[0]
+    finally:
+        # Stop workers even when decoding fails
+        scorer.close()
     cer_mean = cer_sum / dataset.data_num
 
     return cer_mean
+
+
+def do_eval_per_cache(logit_cache, decode_func, train_label_type,
+                      data_label_type, batch_size=32, is_progressbar=False,
+                      num_worker=2):
+    """Evaluate cached logits by Phone Error Rate.
+    Args:
+        logit_cache: An instance of utils.logit_cache.LogitCache
+        decode_func: A function which takes time-major logits & the length of
+            them, and returns list of label sequences
+        train_label_type: string, phone39 or phone48 or phone61
+        data_label_type: string, the label type of ground truth
+        batch_size: int, the size of mini-batch to decode
+        is_progressbar: if True, visualize the progressbar
+        num_worker: int, the number of processes to score decoded
+            mini-batches while decoding the next ones (0 for no workers)
+    Returns:
+        per_global: An average of PER
+    """
+    map_table_true, map_table_pred = _map_tables(train_label_type,
+                                                 data_label_type)
+    scorer = Scorer(_score_per, num_worker=num_worker)
+    try:
+        for logits, seq_len, labels_true in wrap_iterator(
+                logit_cache.batches(batch_size), is_progressbar):
+            scorer.submit(labels_true, decode_func(logits, seq_len),
+                          map_table_true, map_table_pred)
+        return scorer.result()[0] / len(logit_cache)
+    finally:
+        # Stop workers even when decoding fails
+        scorer.close()
+
+
+def do_eval_cer_cache(logit_cache, decode_func, batch_size=32,
+                      is_progressbar=False, num_worker=2):
+    """Evaluate cached logits by Character Error Rate.
+    Args:
+        logit_cache: An instance of utils.logit_cache.LogitCache
+        decode_func: A function which takes time-major logits & the length of
+            them, and returns list of label sequences
+        batch_size: int, the size of mini-batch to decode
+        is_progressbar: if True, visualize the progressbar
+        num_worker: int, the number of processes to score decoded
+            mini-batches while decoding the next ones (0 for no workers)
+    Returns:
+        cer_mean: An average of CER
+    """
+    map_file_path = '../metric/mapping_files/ctc/char2num.txt'
+    scorer = Scorer(_score_cer, num_worker=num_worker)
+    try:
+        for logits, seq_len, labels_true in wrap_iterator(
+                logit_cache.batches(batch_size), is_progressbar):
+            scorer.submit(labels_true, decode_func(logits, seq_len),
+                          map_file_path)
+        return scorer.result()[0] / len(logit_cache)
+    finally:
+        # Stop workers even when decoding fails
+        scorer.close()
@@ -7,24 +7,24 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
-import tensorflow as tf
+from utils.sparsetensor import sparsetensor2list
+from utils.edit_distance import error_rate
 
 
 def compute_edit_distance(session, labels_true_st, labels_pred_st):
-    """Compute edit distance.
+    """Compute edit distance in numpy (utils/edit_distance.py) without
+       adding operations to the graph.
     Args:
-        session:
+        session: not used (kept for compatibility)
         labels_true_st: A `SparseTensor` of ground truth
         labels_pred_st: A `SparseTensor` of prediction
     Returns:
-        edit_distance: edit distance
+        edit_distance: the average of edit distance normalized by the length
+            of ground truth
     """
-    indices, values, dense_shape = labels_true_st
-    labels_pred_pl = tf.SparseTensor(indices, values, dense_shape)
-    indices, values, dense_shape = labels_pred_st
-    labels_true_pl = tf.SparseTensor(indices, values, dense_shape)
-    edit_op = tf.reduce_mean(tf.edit_distance(
-        labels_pred_pl, labels_true_pl, normalize=True))
-    edit_distance = session.run(edit_op)
+    batch_size = int(labels_true_st[2][0])
+    labels_true = sparsetensor2list(labels_true_st, batch_size)
+    labels_pred = sparsetensor2list(labels_pred_st, batch_size)
+    edit_distance = error_rate(labels_true, labels_pred).mean()
 
     return edit_distance
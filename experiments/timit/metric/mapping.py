@@ -7,6 +7,42 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+from os.path import abspath
+
+from utils.labels.vocab import load_vocab, make_map_table
+
+# key => (path to the mapping file, label_type), value => dict
+_phone_map_cache = {}
+# key => paths to mapping files & label_type, value => lookup array
+_table_cache = {}
+
+
+def load_phone_map(label_type, map_file_path):
+    """Load the mapping from 61 or 48 phones to 39 phones. Each mapping file
+       is read only once.
+    Args:
+        label_type: phone48 or phone61
+        map_file_path: path to the mapping file
+    Returns:
+        map_dict: key => phone, value => 39 phone ('' for removed phones)
+    """
+    key = (abspath(map_file_path), label_type)
+    if key not in _phone_map_cache:
+        map_dict = {}
+        with open(map_file_path) as f:
+            for line in f:
+                line = line.strip().split()
+                if label_type == 'phone61':
+                    if line[1] != 'nan':
+                        map_dict[line[0]] = line[2]
+                    else:
+                        map_dict[line[0]] = ''
+                elif label_type == 'phone48':
+                    if line[1] != 'nan':
+                        map_dict[line[1]] = line[2]
+        _phone_map_cache[key] = map_dict
+    return _phone_map_cache[key]
+
 
 def map_to_39phone(phone_list, label_type, map_file_path):
     """Map from 61 or 48 phones to 39 phones.
@@ -20,19 +56,7 @@ def map_to_39phone(phone_list, label_type, map_file_path):
     if label_type == 'phone39':
         return phone_list
 
-    # Read a mapping file
-    map_dict = {}
-    with open(map_file_path) as f:
-        for line in f:
-            line = line.strip().split()
-            if label_type == 'phone61':
-                if line[1] != 'nan':
-                    map_dict[line[0]] = line[2]
-                else:
-                    map_dict[line[0]] = ''
-            elif label_type == 'phone48':
-                if line[1] != 'nan':
-                    map_dict[line[1]] = line[2]
+    map_dict = load_phone_map(label_type, map_file_path)
 
     # Map to 39 phones
     for i in range(len(phone_list)):
@@ -43,3 +67,29 @@ def map_to_39phone(phone_list, label_type, map_file_path):
         phone_list.remove('')
 
     return phone_list
+
+
+def map_to_39phone_table(label_type, phone2num_map_file_path,
+                         phone2num_39_map_file_path, map_file_path):
+    """Make the lookup array to map indices of 61 or 48 phones to indices of
+       39 phones, which can be applied to mini-batches by
+       utils.labels.vocab.map_batch().
+    Args:
+        label_type: phone39 or phone48 or phone61
+        phone2num_map_file_path: path to the mapping file of label_type
+        phone2num_39_map_file_path: path to the mapping file of 39 phones
+        map_file_path: path to the mapping file from phones to 39 phones
+    Returns:
+        table: An int32 numpy array. Removed phones (q) are mapped to -1.
+    """
+    key = (label_type, abspath(phone2num_map_file_path),
+           abspath(phone2num_39_map_file_path), abspath(map_file_path))
+    if key not in _table_cache:
+        vocab = load_vocab(phone2num_map_file_path)
+        vocab_39 = load_vocab(phone2num_39_map_file_path)
+        if label_type == 'phone39':
+            token_map = dict((phone, phone) for phone in vocab.token2id)
+        else:
+            token_map = load_phone_map(label_type, map_file_path)
+        _table_cache[key] = make_map_table(vocab, vocab_39, token_map)
+    return _table_cache[key]
@@ -26,10 +26,13 @@ from utils.sparsetensor import list2sparsetensor
 from utils.directory import mkdir, mkdir_join
 from utils.parameter import count_total_parameters
 from utils.csv import save_loss, save_ler
+from utils.prefetch import Prefetcher
+from utils.cmvn import compute_cmvn
 
 
 def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
-             label_type, eos_index):
+             label_type, eos_index, frame_budget=None, use_cmvn=False,
+             use_shared=False, cache_mb=None):
     """Run training. If target labels are phone, the model is evaluated by PER
     with 39 phones.
     Args:
@@ -41,22 +44,45 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
         epoch_num: epoch num to train
         label_type: phone39 or phone48 or phone61 or character
         eos_index: int, the index of <EOS> class. This is used for padding.
+        frame_budget: int, if set, mini-batches for training are made by
+            utils/sampler.py (BucketSampler) within this number of padded
+            frames instead of batch_size
+        use_cmvn: if True, compute the global mean & std of the training set,
+            save them in the model directory and normalize inputs by them
+        use_shared: if True, attach the datasets in shared memory made by
+            utils/shared_store.py, so that concurrent jobs share one copy
+            of them
+        cache_mb: float, if set, utterances are loaded when used and kept
+            in utils/cache.py (LRUCache) within this memory budget in MB
+            instead of loaded in advance
     """
     # Load dataset
     train_data = DataSet(data_type='train', label_type=label_type,
                          batch_size=batch_size,
-                         eos_index=eos_index, is_sorted=True)
+                         eos_index=eos_index, is_sorted=True,
+                         frame_budget=frame_budget, use_shared=use_shared,
+                         cache_mb=cache_mb)
+    cmvn = None
+    if use_cmvn:
+        print('=> Computing CMVN statistics...')
+        cmvn = compute_cmvn(train_data.input_paths, num_worker=4)
+        cmvn.save(network.model_dir)
+        print(cmvn)
+        train_data.cmvn = cmvn
     dev_data = DataSet(data_type='dev', label_type=label_type,
                        batch_size=batch_size,
-                       eos_index=eos_index, is_sorted=False)
+                       eos_index=eos_index, is_sorted=False, cmvn=cmvn,
+                       use_shared=use_shared, cache_mb=cache_mb)
     if label_type == 'character':
         test_data = DataSet(data_type='test', label_type='character',
                             batch_size=batch_size,
-                            eos_index=eos_index, is_sorted=False)
+                            eos_index=eos_index, is_sorted=False, cmvn=cmvn,
+                            use_shared=use_shared, cache_mb=cache_mb)
     else:
         test_data = DataSet(data_type='test', label_type='phone39',
                             batch_size=batch_size,
-                            eos_index=eos_index, is_sorted=False)
+                            eos_index=eos_index, is_sorted=False, cmvn=cmvn,
+                            use_shared=use_shared, cache_mb=cache_mb)
 
     # Tell TensorFlow that the model will be built into the default graph
     with tf.Graph().as_default():
@@ -133,7 +159,11 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
                "{:,}".format(total_parameters / 1000000)))
 
         # Make mini-batch generator
-        mini_batch_train = train_data.next_batch()
+        # NOTE: mini-batches for training are prepared in the background.
+        # dev_data is not wrapped because it is shared with do_eval_*().
+        mini_batch_train = Prefetcher(train_data.next_batch(),
+                                      queue_size=2,
+                                      pool=train_data.pool)
         mini_batch_dev = dev_data.next_batch()
 
         csv_steps, csv_loss_train, csv_loss_dev = [], [], []
@@ -153,6 +183,10 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
             train_step = train_data.data_num / batch_size
             if train_step != int(train_step):
                 iter_per_epoch += 1
+            if frame_budget is not None:
+                # The number of mini-batches made by BucketSampler in an
+                # epoch is fixed and does not depend on batch_size
+                iter_per_epoch = len(train_data.sampler)
             max_steps = iter_per_epoch * epoch_num
             start_time_train = time.time()
             start_time_epoch = time.time()
@@ -243,6 +277,9 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
                     epoch = (step + 1) // iter_per_epoch
                     print('-----EPOCH:%d (%.3f min)-----' %
                           (epoch, duration_epoch / 60))
+                    if train_data.cache is not None:
+                        print('Cache: ' + str(train_data.cache))
+                    print('Buffer pool: ' + str(train_data.pool))
 
                     # Save model (check point)
                     checkpoint_file = join(network.model_dir, 'model.ckpt')
@@ -365,7 +402,9 @@ def main(config_path):
         clip_activation_decoder=param['clip_activation_decoder'],
         dropout_ratio_input=param['dropout_input'],
         dropout_ratio_hidden=param['dropout_hidden'],
-        weight_decay=param['weight_decay'])
+        weight_decay=param['weight_decay'],
+        attention_window_size=param.get('attention_window_size'),
+        attention_window_type=param.get('attention_window_type', 'centered'))
 
     network.model_name = config['model_name'].upper()
     network.model_name += '_encoder' + str(param['encoder_num_unit'])
@@ -404,7 +443,11 @@ def main(config_path):
              batch_size=param['batch_size'],
              epoch_num=param['num_epoch'],
              label_type=corpus['label_type'],
-             eos_index=output_size - 1)
+             eos_index=output_size - 1,
+             frame_budget=param.get('frame_budget'),
+             use_cmvn=feature.get('cmvn', False),
+             use_shared=corpus.get('use_shared', False),
+             cache_mb=param.get('cache_mb'))
     sys.stdout = sys.__stdout__
 
 
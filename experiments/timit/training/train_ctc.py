@@ -10,6 +10,7 @@ from __future__ import print_function
 from os.path import join, isfile
 import sys
 import time
+import pickle
 import tensorflow as tf
 from setproctitle import setproctitle
 import yaml
@@ -18,16 +19,21 @@ import shutil
 sys.path.append('../')
 sys.path.append('../../')
 sys.path.append('../../../')
-from data.read_dataset_ctc import DataSet
+from data.read_dataset_ctc import DataSet, dataset_path
 from models.ctc.load_model import load
 from metric.ctc import do_eval_per, do_eval_cer
 from utils.directory import mkdir, mkdir_join
 from utils.parameter import count_total_parameters
 from utils.csv import save_loss, save_ler
+from utils.prefetch import Prefetcher
+from utils.tfrecord import tfrecord_dir, read_tfrecord
+from utils.cmvn import compute_cmvn
 
 
 def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
-             label_type, num_stack, num_skip):
+             label_type, num_stack, num_skip, use_tfrecord=False,
+             use_cmvn=False, frame_budget=None, use_shared=False,
+             cache_mb=None, use_stack_cache=False):
     """Run training. If target labels are phone, the model is evaluated by PER
     with 39 phones.
     Args:
@@ -40,42 +46,99 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
         label_type: string, phone39 or phone48 or phone61 or character
         num_stack: int, the number of frames to stack
         num_skip: int, the number of frames to skip
+        use_tfrecord: if True, mini-batches for training are read from
+            TFRecord files made by utils/tfrecord.py in the graph instead of
+            feed_dict. The training set is not loaded into memory.
+        use_cmvn: if True, compute the global mean & std of the training set,
+            save them in the model directory and normalize inputs by them
+        frame_budget: int, if set, mini-batches for training are made by
+            utils/sampler.py (BucketSampler) within this number of padded
+            frames instead of batch_size. Not used with use_tfrecord.
+        use_shared: if True, attach the frame-stacked datasets in shared
+            memory made by utils/shared_store.py, so that concurrent jobs
+            share one copy of them
+        cache_mb: float, if set, utterances are loaded when used and kept
+            in utils/cache.py (LRUCache) within this memory budget in MB
+            instead of loaded in advance
+        use_stack_cache: if True, read the frame-stacked datasets cached
+            on disk by utils/stack_cache.py, which are made by the first
+            run with the same num_stack & num_skip
     """
+    if use_tfrecord and frame_budget is not None:
+        raise ValueError('frame_budget cannot be used with TFRecord files.')
+
     # Load dataset
-    train_data = DataSet(data_type='train', label_type=label_type,
-                         batch_size=batch_size,
-                         num_stack=num_stack, num_skip=num_skip,
-                         is_sorted=True)
+    if use_tfrecord:
+        # NOTE: the training set is read from TFRecord files in the graph
+        train_data = None
+        train_path = dataset_path(data_type='train', label_type=label_type)
+        with open(join(train_path, 'frame_num.pickle'), 'rb') as f:
+            train_input_names = sorted(pickle.load(f).keys())
+        train_data_num = len(train_input_names)
+        train_input_paths = [join(train_path, 'input', input_name + '.npy')
+                             for input_name in train_input_names]
+    else:
+        train_data = DataSet(data_type='train', label_type=label_type,
+                             batch_size=batch_size,
+                             num_stack=num_stack, num_skip=num_skip,
+                             is_sorted=True, frame_budget=frame_budget,
+                             use_shared=use_shared, cache_mb=cache_mb,
+                             use_stack_cache=use_stack_cache)
+        train_path = train_data.dataset_path
+        train_data_num = train_data.data_num
+        train_input_paths = train_data.input_paths
+    cmvn = None
+    if use_cmvn:
+        print('=> Computing CMVN statistics...')
+        cmvn = compute_cmvn(train_input_paths, num_worker=4)
+        cmvn.save(network.model_dir)
+        print(cmvn)
+        if train_data is not None:
+            train_data.cmvn = cmvn
     dev_data = DataSet(data_type='dev', label_type=label_type,
                        batch_size=batch_size,
                        num_stack=num_stack, num_skip=num_skip,
-                       is_sorted=False)
+                       is_sorted=False, cmvn=cmvn, use_shared=use_shared,
+                       cache_mb=cache_mb, use_stack_cache=use_stack_cache)
     if label_type == 'character':
         test_data = DataSet(data_type='test', label_type='character',
-                            batch_size=1,
+                            batch_size=batch_size,
                             num_stack=num_stack, num_skip=num_skip,
-                            is_sorted=False)
+                            is_sorted=True, cmvn=cmvn, use_shared=use_shared,
+                            cache_mb=cache_mb, use_stack_cache=use_stack_cache)
     else:
         test_data = DataSet(data_type='test', label_type='phone39',
-                            batch_size=1,
+                            batch_size=batch_size,
                             num_stack=num_stack, num_skip=num_skip,
-                            is_sorted=False)
+                            is_sorted=True, cmvn=cmvn, use_shared=use_shared,
+                            cache_mb=cache_mb, use_stack_cache=use_stack_cache)
 
     # Tell TensorFlow that the model will be built into the default graph
     with tf.Graph().as_default():
 
         # Define placeholders
-        network.inputs = tf.placeholder(
-            tf.float32,
-            shape=[None, None, network.input_size],
-            name='input')
-        indices_pl = tf.placeholder(tf.int64, name='indices')
-        values_pl = tf.placeholder(tf.int32, name='values')
-        shape_pl = tf.placeholder(tf.int64, name='shape')
-        network.labels = tf.SparseTensor(indices_pl, values_pl, shape_pl)
-        network.inputs_seq_len = tf.placeholder(tf.int64,
-                                                shape=[None],
-                                                name='inputs_seq_len')
+        if use_tfrecord:
+            # NOTE: these tensors can be also fed by feed_dict like
+            # placeholders (for dev data)
+            network.inputs, network.labels, network.inputs_seq_len, _ = \
+                read_tfrecord(tfrecord_dir(train_path, num_stack, num_skip),
+                              input_size=network.input_size,
+                              batch_size=batch_size,
+                              is_training=True,
+                              cmvn=cmvn,
+                              num_skip=num_skip)
+        else:
+            network.inputs = tf.placeholder(
+                tf.float32,
+                shape=[None, None, network.input_size],
+                name='input')
+            indices_pl = tf.placeholder(tf.int64, name='indices')
+            values_pl = tf.placeholder(tf.int32, name='values')
+            shape_pl = tf.placeholder(tf.int64, name='shape')
+            network.labels = tf.SparseTensor(indices_pl, values_pl, shape_pl)
+            network.inputs_seq_len = tf.placeholder(tf.int64,
+                                                    shape=[None],
+                                                    name='inputs_seq_len')
         network.keep_prob_input = tf.placeholder(tf.float32,
                                                  name='keep_prob_input')
         network.keep_prob_hidden = tf.placeholder(tf.float32,
@@ -118,7 +181,12 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
                "{:,}".format(total_parameters / 1000000)))
 
         # Make mini-batch generator
-        mini_batch_train = train_data.next_batch()
+        # NOTE: mini-batches for training are prepared in the background.
+        # dev_data is not wrapped because it is shared with do_eval_*().
+        if not use_tfrecord:
+            mini_batch_train = Prefetcher(train_data.next_batch(),
+                                          queue_size=2,
+                                          pool=train_data.pool)
         mini_batch_dev = dev_data.next_batch()
 
         csv_steps, csv_loss_train, csv_loss_dev = [], [], []
@@ -134,27 +202,41 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
             sess.run(init_op)
 
             # Train model
-            iter_per_epoch = int(train_data.data_num / batch_size)
-            train_step = train_data.data_num / batch_size
+            iter_per_epoch = int(train_data_num / batch_size)
+            train_step = train_data_num / batch_size
             if train_step != int(train_step):
                 iter_per_epoch += 1
+            if frame_budget is not None:
+                # The number of mini-batches made by BucketSampler in an
+                # epoch is fixed and does not depend on batch_size
+                iter_per_epoch = len(train_data.sampler)
             max_steps = iter_per_epoch * epoch_num
             start_time_train = time.time()
             start_time_epoch = time.time()
             start_time_step = time.time()
             error_best = 1
             for step in range(max_steps):
+                is_logging = (step + 1) % 10 == 0
 
                 # Create feed dictionary for next mini batch (train)
-                inputs, labels_st, inputs_seq_len, _ = mini_batch_train.__next__()
                 feed_dict_train = {
-                    network.inputs: inputs,
-                    network.labels: labels_st,
-                    network.inputs_seq_len: inputs_seq_len,
                     network.keep_prob_input: network.dropout_ratio_input,
                     network.keep_prob_hidden: network.dropout_ratio_hidden,
                     network.lr: learning_rate
                 }
+                if not use_tfrecord:
+                    inputs, labels_st, inputs_seq_len, _ = mini_batch_train.__next__()
+                elif is_logging:
+                    # NOTE: the mini-batch is pulled out of the pipeline and
+                    # fed back, so that loss & ler are computed by the
+                    # mini-batch used for the update
+                    inputs, labels_st, inputs_seq_len = sess.run(
+                        [network.inputs, network.labels,
+                         network.inputs_seq_len])
+                if not use_tfrecord or is_logging:
+                    feed_dict_train[network.inputs] = inputs
+                    feed_dict_train[network.labels] = labels_st
+                    feed_dict_train[network.inputs_seq_len] = inputs_seq_len
 
                 # Create feed dictionary for next mini batch (dev)
                 inputs, labels_st, inputs_seq_len, _ = mini_batch_dev.__next__()
@@ -167,12 +249,12 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
                 }
 
                 # Update parameters
-                sess.run(train_op, feed_dict=feed_dict_train)
-
-                if (step + 1) % 10 == 0:
-
+                if not is_logging:
+                    sess.run(train_op, feed_dict=feed_dict_train)
+                else:
                     # Compute loss
-                    loss_train = sess.run(loss_op, feed_dict=feed_dict_train)
+                    _, loss_train = sess.run([train_op, loss_op],
+                                             feed_dict=feed_dict_train)
                     loss_dev = sess.run(loss_op, feed_dict=feed_dict_dev)
                     csv_steps.append(step)
                     csv_loss_train.append(loss_train)
@@ -208,6 +290,10 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
                     epoch = (step + 1) // iter_per_epoch
                     print('-----EPOCH:%d (%.3f min)-----' %
                           (epoch, duration_epoch / 60))
+                    if train_data is not None:
+                        if train_data.cache is not None:
+                            print('Cache: ' + str(train_data.cache))
+                        print('Buffer pool: ' + str(train_data.pool))
 
                     # Save model (check point)
                     checkpoint_file = join(network.model_dir, 'model.ckpt')
@@ -224,7 +310,8 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
                                 session=sess,
                                 decode_op=decode_op,
                                 network=network,
-                                dataset=dev_data)
+                                dataset=dev_data,
+                                num_worker=0)
                             print('  CER: %f %%' % (cer_dev_epoch * 100))
 
                             if cer_dev_epoch < error_best:
@@ -237,7 +324,8 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
                                     decode_op=decode_op,
                                     network=network,
                                     dataset=test_data,
-                                    eval_batch_size=1)
+                                    eval_batch_size=batch_size,
+                                    num_worker=0)
                                 print('  CER: %f %%' % (cer_test * 100))
 
                         else:
@@ -248,7 +336,8 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
                                 per_op=ler_op,
                                 network=network,
                                 dataset=dev_data,
-                                train_label_type=label_type)
+                                train_label_type=label_type,
+                                num_worker=0)
                             print('  PER: %f %%' % (per_dev_epoch * 100))
 
                             if per_dev_epoch < error_best:
@@ -263,7 +352,8 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
                                     network=network,
                                     dataset=test_data,
                                     train_label_type=label_type,
-                                    eval_batch_size=1)
+                                    eval_batch_size=batch_size,
+                                    num_worker=0)
                                 print('  PER: %f %%' % (per_test * 100))
 
                         duration_eval = time.time() - start_time_eval
@@ -360,7 +450,13 @@ def main(config_path):
              epoch_num=param['num_epoch'],
              label_type=corpus['label_type'],
              num_stack=feature['num_stack'],
-             num_skip=feature['num_skip'])
+             num_skip=feature['num_skip'],
+             use_tfrecord=corpus.get('use_tfrecord', False),
+             use_cmvn=feature.get('cmvn', False),
+             frame_budget=param.get('frame_budget'),
+             use_shared=corpus.get('use_shared', False),
+             cache_mb=param.get('cache_mb'),
+             use_stack_cache=corpus.get('use_stack_cache', False))
     sys.stdout = sys.__stdout__
 
 
@@ -26,6 +26,7 @@ from utils.directory import mkdir, mkdir_join
 from utils.parameter import count_total_parameters
 from utils.csv import save_loss, save_ler
 from utils.multi_gpu import average_gradients
+from utils.cmvn import compute_cmvn
 
 
 def tower_loss(scope, images, labels):
@@ -50,7 +51,7 @@ def tower_loss(scope, images, labels):
 
 
 def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
-             label_type, num_stack, num_skip, gpu_indices):
+             label_type, num_stack, num_skip, gpu_indices, use_cmvn=False):
     """Run training. If target labels are phone, the model is evaluated by PER
     with 39 phones.
     Args:
@@ -64,28 +65,37 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
         num_stack: int, the number of frames to stack
         num_skip: int, the number of frames to skip
         gpu_indices: list of integer
+        use_cmvn: if True, compute the global mean & std of the training set,
+            save them in the model directory and normalize inputs by them
     """
     # Load dataset
     train_data = DataSet(data_type='train', label_type=label_type,
                          batch_size=batch_size,
                          num_stack=num_stack, num_skip=num_skip,
                          is_sorted=True, num_gpu=len(gpu_indices))
+    cmvn = None
+    if use_cmvn:
+        print('=> Computing CMVN statistics...')
+        cmvn = compute_cmvn(train_data.input_paths, num_worker=4)
+        cmvn.save(network.model_dir)
+        print(cmvn)
+        train_data.cmvn = cmvn
     dev_data = DataSet(data_type='dev', label_type=label_type,
                        batch_size=batch_size,
                        num_stack=num_stack, num_skip=num_skip,
-                       is_sorted=False, num_gpu=len(gpu_indices))
+                       is_sorted=False, num_gpu=len(gpu_indices), cmvn=cmvn)
     if label_type == 'character':
         # TODO: evaluationのときはどうする？
         test_data = DataSet(data_type='test', label_type='character',
                             batch_size=batch_size,
                             num_stack=num_stack, num_skip=num_skip,
-                            is_sorted=False, num_gpu=1)
+                            is_sorted=False, num_gpu=1, cmvn=cmvn)
     else:
 
         test_data = DataSet(data_type='test', label_type='phone39',
                             batch_size=batch_size,
                             num_stack=num_stack, num_skip=num_skip,
-                            is_sorted=False, num_gpu=1)
+                            is_sorted=False, num_gpu=1, cmvn=cmvn)
 
     # Tell TensorFlow that the model will be built into the default graph
     with tf.Graph().as_default(), tf.device('/cpu:0'):
@@ -259,8 +269,8 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
             sess.run(init_op)
 
             # Make generator
-            mini_batch_train = train_data.next_batch(session=sess)
-            mini_batch_dev = dev_data.next_batch(session=sess)
+            mini_batch_train = train_data.next_batch()
+            mini_batch_dev = dev_data.next_batch()
 
             # Train model
             iter_per_epoch = int(train_data.data_num /
@@ -344,6 +354,9 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
                     epoch = (step + 1) // iter_per_epoch
                     print('-----EPOCH:%d (%.3f min)-----' %
                           (epoch, duration_epoch / 60))
+                    if train_data.cache is not None:
+                        print('Cache: ' + str(train_data.cache))
+                    print('Buffer pool: ' + str(train_data.pool))
 
                     # Save model (check point)
                     checkpoint_file = join(network.model_dir, 'model.ckpt')
@@ -496,7 +509,8 @@ def main(config_path, gpu_indices):
              label_type=corpus['label_type'],
              num_stack=feature['num_stack'],
              num_skip=feature['num_skip'],
-             gpu_indices=gpu_indices)
+             gpu_indices=gpu_indices,
+             use_cmvn=feature.get('cmvn', False))
     sys.stdout = sys.__stdout__
 
 
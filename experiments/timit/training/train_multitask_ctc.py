@@ -25,10 +25,14 @@ from utils.sparsetensor import list2sparsetensor
 from utils.directory import mkdir, mkdir_join
 from utils.parameter import count_total_parameters
 from utils.csv import save_loss, save_ler
+from utils.prefetch import Prefetcher
+from utils.cmvn import compute_cmvn
 
 
 def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
-             label_type_second, num_stack, num_skip):
+             label_type_second, num_stack, num_skip, frame_budget=None,
+             use_cmvn=False, use_shared=False, cache_mb=None,
+             use_stack_cache=False):
     """Run multi-task training. The target labels in the main task is
     characters and those in the second task is 61 phones. The model is
     evaluated by CER and PER with 39 phones.
@@ -42,21 +46,46 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
         label_type_second: string, phone39 or phone48 or phone61
         num_stack: int, the number of frames to stack
         num_skip: int, the number of frames to skip
+        frame_budget: int, if set, mini-batches for training are made by
+            utils/sampler.py (BucketSampler) within this number of padded
+            frames instead of batch_size
+        use_cmvn: if True, compute the global mean & std of the training set,
+            save them in the model directory and normalize inputs by them
+        use_shared: if True, attach the frame-stacked datasets in shared
+            memory made by utils/shared_store.py, so that concurrent jobs
+            share one copy of them
+        cache_mb: float, if set, utterances are loaded when used and kept
+            in utils/cache.py (LRUCache) within this memory budget in MB
+            instead of loaded in advance
+        use_stack_cache: if True, read the frame-stacked datasets cached
+            on disk by utils/stack_cache.py, which are made by the first
+            run with the same num_stack & num_skip
     """
     # Load dataset
     train_data = DataSet(data_type='train',
                          label_type_second=label_type_second,
                          batch_size=batch_size,
                          num_stack=num_stack, num_skip=num_skip,
-                         is_sorted=True)
+                         is_sorted=True, frame_budget=frame_budget,
+                         use_shared=use_shared, cache_mb=cache_mb,
+                         use_stack_cache=use_stack_cache)
+    cmvn = None
+    if use_cmvn:
+        print('=> Computing CMVN statistics...')
+        cmvn = compute_cmvn(train_data.input_paths, num_worker=4)
+        cmvn.save(network.model_dir)
+        print(cmvn)
+        train_data.cmvn = cmvn
     dev_data = DataSet(data_type='dev', label_type_second=label_type_second,
                        batch_size=batch_size,
                        num_stack=num_stack, num_skip=num_skip,
-                       is_sorted=False)
+                       is_sorted=False, cmvn=cmvn, use_shared=use_shared,
+                       cache_mb=cache_mb, use_stack_cache=use_stack_cache)
     test_data = DataSet(data_type='test', label_type_second='phone39',
-                        batch_size=1,
+                        batch_size=batch_size,
                         num_stack=num_stack, num_skip=num_skip,
-                        is_sorted=False)
+                        is_sorted=True, cmvn=cmvn, use_shared=use_shared,
+                        cache_mb=cache_mb, use_stack_cache=use_stack_cache)
 
     # Tell TensorFlow that the model will be built into the default graph
     with tf.Graph().as_default():
@@ -140,7 +169,11 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
             sess.run(init_op)
 
             # Make mini-batch generator
-            mini_batch_train = train_data.next_batch()
+            # NOTE: mini-batches for training are prepared in the background.
+            # dev_data is not wrapped because it is shared with do_eval_*().
+            mini_batch_train = Prefetcher(train_data.next_batch(),
+                                          queue_size=2,
+                                          pool=train_data.pool)
             mini_batch_dev = dev_data.next_batch()
 
             # Train model
@@ -148,6 +181,10 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
             train_step = train_data.data_num / batch_size
             if train_step != int(train_step):
                 iter_per_epoch += 1
+            if frame_budget is not None:
+                # The number of mini-batches made by BucketSampler in an
+                # epoch is fixed and does not depend on batch_size
+                iter_per_epoch = len(train_data.sampler)
             max_steps = iter_per_epoch * epoch_num
             start_time_train = time.time()
             start_time_epoch = time.time()
@@ -223,6 +260,9 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
                     epoch = (step + 1) // iter_per_epoch
                     print('-----EPOCH:%d (%.3f min)-----' %
                           (epoch, duration_epoch / 60))
+                    if train_data.cache is not None:
+                        print('Cache: ' + str(train_data.cache))
+                    print('Buffer pool: ' + str(train_data.pool))
 
                     # Save model (check point)
                     checkpoint_file = join(network.model_dir, 'model.ckpt')
@@ -238,7 +278,8 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
                             decode_op=decode_op_main,
                             network=network,
                             dataset=dev_data,
-                            is_multitask=True)
+                            is_multitask=True,
+                            num_worker=0)
                         print('  CER: %f %%' % (cer_dev_epoch * 100))
                         per_dev_epoch = do_eval_per(
                             session=sess,
@@ -247,7 +288,8 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
                             network=network,
                             dataset=dev_data,
                             train_label_type=label_type_second,
-                            is_multitask=True)
+                            is_multitask=True,
+                            num_worker=0)
                         print('  PER: %f %%' % (per_dev_epoch * 100))
 
                         if cer_dev_epoch < cer_dev_best:
@@ -260,8 +302,9 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
                                 decode_op=decode_op_main,
                                 network=network,
                                 dataset=test_data,
-                                eval_batch_size=1,
-                                is_multitask=True)
+                                eval_batch_size=batch_size,
+                                is_multitask=True,
+                                num_worker=0)
                             print('  CER: %f %%' % (cer_test * 100))
                             per_test = do_eval_per(
                                 session=sess,
@@ -270,8 +313,9 @@ def do_train(network, optimizer, learning_rate, batch_size, epoch_num,
                                 network=network,
                                 dataset=test_data,
                                 train_label_type=label_type_second,
-                                eval_batch_size=1,
-                                is_multitask=True)
+                                eval_batch_size=batch_size,
+                                is_multitask=True,
+                                num_worker=0)
                             print('  PER: %f %%' % (per_test * 100))
 
                         duration_eval = time.time() - start_time_eval
@@ -375,7 +419,12 @@ def main(config_path):
              epoch_num=param['num_epoch'],
              label_type_second=corpus['label_type_second'],
              num_stack=feature['num_stack'],
-             num_skip=feature['num_skip'])
+             num_skip=feature['num_skip'],
+             frame_budget=param.get('frame_budget'),
+             use_cmvn=feature.get('cmvn', False),
+             use_shared=corpus.get('use_shared', False),
+             cache_mb=param.get('cache_mb'),
+             use_stack_cache=corpus.get('use_stack_cache', False))
     sys.stdout = sys.__stdout__
 
 
@@ -8,6 +8,7 @@ from __future__ import division
 from __future__ import print_function
 
 import os
+from os.path import isfile
 import sys
 import tensorflow as tf
 import yaml
@@ -17,10 +18,15 @@ sys.path.append('../../')
 sys.path.append('../../../')
 from data.read_dataset_ctc import DataSet
 from models.ctc.load_model import load
+from models.frame_stacking import stacked_seq_len
 from util_decode_ctc import decode_test
+from utils.ctc_decoder import BeamSearchDecoder
+from utils.ngram_lm import load_ngram_lm
+from utils.cmvn import CMVN_FILE_NAME, load_cmvn
 
 
-def do_decode(network, label_type, num_stack, num_skip, epoch=None):
+def do_decode(network, label_type, num_stack, num_skip, epoch=None,
+              lm_path=None):
     """Decode the CTC outputs.
     Args:
         network: model to restore
@@ -28,12 +34,20 @@ def do_decode(network, label_type, num_stack, num_skip, epoch=None):
         num_stack: int, the number of frames to stack
         num_skip: int, the number of frames to skip
         epoch: int, the epoch to restore
+        lm_path: path to the n-gram LM made by utils/ngram_lm.py. If set,
+            outputs are decoded by the prefix beam search with the LM
+            (utils/ctc_decoder.py) instead of the graph.
     """
+    # Load the statistics for normalization saved in training
+    cmvn = None
+    if isfile(os.path.join(network.model_dir, CMVN_FILE_NAME)):
+        cmvn = load_cmvn(network.model_dir)
+
     # Load dataset
     test_data = DataSet(data_type='test', label_type=label_type,
                         batch_size=1,
                         num_stack=num_stack, num_skip=num_skip,
-                        is_sorted=False, is_progressbar=True)
+                        is_sorted=False, is_progressbar=True, cmvn=cmvn)
 
     # Define placeholders
     network.inputs = tf.placeholder(
@@ -62,37 +76,53 @@ def do_decode(network, label_type, num_stack, num_skip, epoch=None):
                                 network.inputs_seq_len,
                                 decode_type='beam_search',
                                 beam_width=20)
+    decoder, logits_op = None, None
+    if lm_path is not None:
+        decoder = BeamSearchDecoder(beam_width=20,
+                                    blank_index=network.num_classes - 1,
+                                    lm=load_ngram_lm(lm_path))
+        logits_op = [logits, stacked_seq_len(network.inputs_seq_len,
+                                             network.num_skip)]
 
     # Create a saver for writing training checkpoints
     saver = tf.train.Saver()
 
-    with tf.Session() as sess:
-        ckpt = tf.train.get_checkpoint_state(network.model_dir)
-
-        # If check point exists
-        if ckpt:
-            # Use last saved model
-            model_path = ckpt.model_checkpoint_path
-            if epoch is not None:
-                model_path = model_path.split('/')[:-1]
-                model_path = '/'.join(model_path) + '/model.ckpt-' + str(epoch)
-            saver.restore(sess, model_path)
-            print("Model restored: " + model_path)
-        else:
-            raise ValueError('There are not any checkpoints.')
-
-        # Visualize
-        decode_test(session=sess,
-                    decode_op=decode_op,
-                    network=network,
-                    dataset=test_data,
-                    label_type=label_type,
-                    save_path=network.model_dir)
+    try:
+        with tf.Session() as sess:
+            ckpt = tf.train.get_checkpoint_state(network.model_dir)
+
+            # If check point exists
+            if ckpt:
+                # Use last saved model
+                model_path = ckpt.model_checkpoint_path
+                if epoch is not None:
+                    model_path = model_path.split('/')[:-1]
+                    model_path = '/'.join(model_path) + \
+                        '/model.ckpt-' + str(epoch)
+                saver.restore(sess, model_path)
+                print("Model restored: " + model_path)
+            else:
+                raise ValueError('There are not any checkpoints.')
+
+            # Visualize
+            decode_test(session=sess,
+                        decode_op=decode_op,
+                        network=network,
+                        dataset=test_data,
+                        label_type=label_type,
+                        save_path=network.model_dir,
+                        decoder=decoder,
+                        logits_op=logits_op)
+    finally:
+        # Stop workers of the decoder even when decoding fails
+        if decoder is not None:
+            decoder.close()
 
 
 def main(model_path):
 
     epoch = None  # if None, restore the final epoch
+    lm_path = None  # if set, decode with the n-gram LM
 
     # Load config file
     with open(os.path.join(model_path, 'config.yml'), "r") as f:
@@ -131,7 +161,8 @@ def main(model_path):
               label_type=corpus['label_type'],
               num_stack=feature['num_stack'],
               num_skip=feature['num_skip'],
-              epoch=epoch)
+              epoch=epoch,
+              lm_path=lm_path)
 
 
 if __name__ == '__main__':
@@ -8,6 +8,7 @@ from __future__ import division
 from __future__ import print_function
 
 import os
+from os.path import isfile
 import sys
 import tensorflow as tf
 import yaml
@@ -19,6 +20,7 @@ from data.read_dataset_attention import DataSet
 # from models.attention.load_model import load
 from models.attention import blstm_attention_seq2seq
 from util_plot_attention import attention_test
+from utils.cmvn import CMVN_FILE_NAME, load_cmvn
 
 
 def do_plot(network, label_type, eos_index, epoch=None):
@@ -29,11 +31,16 @@ def do_plot(network, label_type, eos_index, epoch=None):
         epoch: int, the epoch to restore
         eos_index: int, the index of <EOS> class. This is used for padding.
     """
+    # Load the statistics for normalization saved in training
+    cmvn = None
+    if isfile(os.path.join(network.model_dir, CMVN_FILE_NAME)):
+        cmvn = load_cmvn(network.model_dir)
+
     # Load dataset
     test_data = DataSet(data_type='test', label_type=label_type,
                         batch_size=1,
                         eos_index=eos_index,
-                        is_sorted=False, is_progressbar=True)
+                        is_sorted=False, is_progressbar=True, cmvn=cmvn)
 
     # Define placeholders
     network.inputs = tf.placeholder(tf.float32,
@@ -139,7 +146,9 @@ def main(model_path):
         clip_activation_decoder=param['clip_activation_decoder'],
         dropout_ratio_input=param['dropout_input'],
         dropout_ratio_hidden=param['dropout_hidden'],
-        weight_decay=param['weight_decay'])
+        weight_decay=param['weight_decay'],
+        attention_window_size=param.get('attention_window_size'),
+        attention_window_type=param.get('attention_window_type', 'centered'))
 
     network.model_dir = model_path
     print(network.model_dir)
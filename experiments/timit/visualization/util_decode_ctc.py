@@ -13,10 +13,11 @@ import sys
 from utils.labels.character import num2char
 from utils.labels.phone import num2phone
 from utils.sparsetensor import sparsetensor2list
+from utils.ctc_decoder import run_decoder
 
 
 def decode_test(session, decode_op, network, dataset, label_type,
-                save_path=None):
+                save_path=None, decoder=None, logits_op=None):
     """Visualize label outputs of CTC model.
     Args:
         session: session of training model
@@ -25,6 +26,11 @@ def decode_test(session, decode_op, network, dataset, label_type,
         dataset: An instance of a `Dataset` class
         label_type: string, phone39 or phone48 or phone61 or character
         save_path: path to save decoding results
+        decoder: A numpy decoder (e.g. utils.ctc_decoder.BeamSearchDecoder).
+            If set, outputs of logits_op are decoded by decoder instead of
+            decode_op.
+        logits_op: list of operations of logits & the length of logits,
+            used only when decoder is set
     """
     # Batch size is expected to be 1
     iteration = dataset.data_num
@@ -53,9 +59,10 @@ def decode_test(session, decode_op, network, dataset, label_type,
         }
 
         # Visualize
-        labels_pred_st = session.run(decode_op, feed_dict=feed_dict)
+        labels_pred = run_decoder(session, decode_op, feed_dict,
+                                  batch_size=1, decoder=decoder,
+                                  logits_op=logits_op)
         labels_true = sparsetensor2list(labels_true_st, batch_size=1)
-        labels_pred = sparsetensor2list(labels_pred_st, batch_size=1)
 
         if label_type == 'character':
             print('----- wav: %s -----' % input_names[0])
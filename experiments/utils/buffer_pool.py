@@ -0,0 +1,170 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Pool of reusable buffers for padded mini-batches."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import threading
+import numpy as np
+
+
+def _size_class(size, min_size=8):
+    """Round up the size to the power of 2.
+    Args:
+        size: int
+        min_size: int, the minimum size class
+    Returns:
+        int, the size class
+    """
+    size_class = min_size
+    while size_class < size:
+        size_class *= 2
+    return size_class
+
+
+class BufferPool(object):
+    """Pool of buffers for padded inputs (float32), labels (int32) and
+       lengths (int64). The size of mini-batch and the max length are rounded
+       up to size classes (the power of 2), and a view of a buffer of the
+       class is returned, so that buffers are reused across mini-batches
+       without allocation.
+       Buffers of each class are handed out in rotation. A buffer is reused
+       after num_buffer mini-batches of the same class are made, so num_buffer
+       must not be less than the number of mini-batches alive at the same time.
+       utils/prefetch.py increases it by reserve() to queue_size + 2.
+    Args:
+        num_buffer: int, the number of buffers of each size class
+    """
+
+    def __init__(self, num_buffer=4):
+        if num_buffer < 1:
+            raise ValueError('num_buffer must be more than 0.')
+        self.num_buffer = num_buffer
+        self.buffers = {}
+        self.cursors = {}
+
+        # Statistics
+        self.alloc_num = 0
+        self.reuse_num = 0
+        self.bytes_copied = 0
+        self.step_num = 0
+
+        # next_batch() may run in a background thread (utils/prefetch.py)
+        self.lock = threading.Lock()
+
+    def reserve(self, num_buffer):
+        """Increase the number of buffers of each size class. Buffers are
+           allocated when they are used for the first time.
+        Args:
+            num_buffer: int, the number of mini-batches alive at the same time
+        """
+        with self.lock:
+            self.num_buffer = max(self.num_buffer, num_buffer)
+
+    def get(self, name, shape, dtype):
+        """Return a view of a buffer. The contents are not initialized.
+        Args:
+            name: string, the name of the buffer (e.g. inputs, labels).
+                Buffers of different names are never shared.
+            shape: tuple of ints. The first two dimensions are rounded up to
+                size classes.
+            dtype: the type of the buffer
+        Returns:
+            A numpy array of size `shape`
+        """
+        buffer_shape = tuple(_size_class(size) for size in shape[:2])
+        buffer_shape += tuple(shape[2:])
+        key = (name, buffer_shape, np.dtype(dtype).str)
+
+        with self.lock:
+            ring = self.buffers.setdefault(key, [])
+            cursor = self.cursors.get(key, 0)
+            if len(ring) < self.num_buffer:
+                # Insert before the least recently used buffer, so that the
+                # order of rotation is kept when num_buffer is increased
+                buffer = np.empty(buffer_shape, dtype=dtype)
+                ring.insert(cursor, buffer)
+                self.alloc_num += 1
+            else:
+                cursor %= len(ring)
+                buffer = ring[cursor]
+                self.reuse_num += 1
+            self.cursors[key] = cursor + 1
+
+        return buffer[tuple(slice(0, size) for size in shape)]
+
+    def pad_inputs(self, input_list, input_size, cmvn=None, frame_nums=None,
+                   num_skip=None):
+        """Pad inputs with 0.
+        Args:
+            input_list: list of inputs of size `[frame_num, input_size]`
+            input_size: int, the dimension of inputs
+            cmvn: An instance of CMVN (utils/cmvn.py). If set, inputs are
+                normalized while copied into the buffer.
+            frame_nums: list of the number of frames of inputs before frame
+                stacking
+            num_skip: int, the number of frames skipped in frame stacking.
+                If set with frame_nums, the sub-frames padded by frame
+                stacking are kept 0 after normalization.
+        Returns:
+            inputs: A float32 numpy array of size
+                `[batch_size, max_frame_num, input_size]`
+            inputs_seq_len: An int64 numpy array of size `[batch_size]`
+        """
+        inputs_seq_len = self.get('inputs_seq_len', (len(input_list),),
+                                  np.int64)
+        inputs_seq_len[:] = [data_i.shape[0] for data_i in input_list]
+
+        inputs = self.get(
+            'inputs', (len(input_list), inputs_seq_len.max(), input_size),
+            np.float32)
+        for i_batch, data_i in enumerate(input_list):
+            frame_num = data_i.shape[0]
+            if cmvn is None:
+                inputs[i_batch, :frame_num] = data_i
+            else:
+                frame_num_raw = None
+                if frame_nums is not None:
+                    frame_num_raw = frame_nums[i_batch]
+                cmvn.normalize(data_i, out=inputs[i_batch, :frame_num],
+                               frame_num=frame_num_raw, num_skip=num_skip)
+            inputs[i_batch, frame_num:] = 0
+
+        self.bytes_copied += inputs.nbytes
+        self.step_num += 1
+        return inputs, inputs_seq_len
+
+    def pad_labels(self, label_list, padded_value=-1, name='labels'):
+        """Pad labels.
+        Args:
+            label_list: list of labels of size `[label_len]`
+            padded_value: int, the value used for padding
+            name: string, the name of buffers. Use different names for labels
+                of different tasks in the same mini-batch.
+        Returns:
+            labels: An int32 numpy array of size `[batch_size, max_label_len]`
+            labels_seq_len: An int64 numpy array of size `[batch_size]`
+        """
+        labels_seq_len = self.get(name + '_seq_len', (len(label_list),),
+                                  np.int64)
+        labels_seq_len[:] = [len(label_i) for label_i in label_list]
+
+        labels = self.get(name, (len(label_list), labels_seq_len.max()),
+                          np.int32)
+        labels.fill(padded_value)
+        for i_batch, label_i in enumerate(label_list):
+            labels[i_batch, :len(label_i)] = label_i
+
+        self.bytes_copied += labels.nbytes
+        return labels, labels_seq_len
+
+    def __str__(self):
+        return ('allocations: %d (avoided: %d), %.1f MB in buffers, '
+                '%.2f MB copied per step' %
+                (self.alloc_num, self.reuse_num,
+                 sum(buffer.nbytes for ring in self.buffers.values()
+                     for buffer in ring) / 1024 / 1024,
+                 self.bytes_copied / max(self.step_num, 1) / 1024 / 1024))
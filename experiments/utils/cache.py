@@ -0,0 +1,91 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Cache of utterances with a memory budget."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from collections import OrderedDict
+import threading
+
+
+class LRUCache(object):
+    """Keep the least recently used utterances (tuples of numpy arrays, e.g.
+       frame-stacked inputs & labels) within the memory budget. When the
+       budget is exceeded, the least recently used utterances are discarded.
+    Args:
+        max_mb: float, the memory budget in MB
+    """
+
+    def __init__(self, max_mb):
+        if max_mb < 0:
+            raise ValueError('max_mb must not be negative.')
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.bytes = 0
+        self.data = OrderedDict()
+        self.hit_num = 0
+        self.miss_num = 0
+        # next_batch() may run in a background thread (utils/prefetch.py)
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.data)
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def get(self, key):
+        """
+        Args:
+            key: the key of the utterance (e.g. the index)
+        Returns:
+            value: the cached tuple of numpy arrays, or None if not cached
+        """
+        with self.lock:
+            if key not in self.data:
+                self.miss_num += 1
+                return None
+            self.hit_num += 1
+            # Move to the end (the most recently used)
+            value = self.data.pop(key)
+            self.data[key] = value
+            return value
+
+    def put(self, key, value):
+        """Add the utterance. Utterances larger than the budget are not cached.
+        Args:
+            key: the key of the utterance (e.g. the index)
+            value: tuple of numpy arrays
+        """
+        nbytes = sum(x.nbytes for x in value)
+        if nbytes > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.data:
+                self.bytes -= sum(x.nbytes for x in self.data.pop(key))
+            # Discard the least recently used utterances
+            while self.bytes + nbytes > self.max_bytes:
+                _, value_lru = self.data.popitem(last=False)
+                self.bytes -= sum(x.nbytes for x in value_lru)
+            self.data[key] = value
+            self.bytes += nbytes
+
+    @property
+    def hit_rate(self):
+        """Return the ratio of hits to all accesses."""
+        access_num = self.hit_num + self.miss_num
+        if access_num == 0:
+            return 0.
+        return self.hit_num / access_num
+
+    def reset_stats(self):
+        self.hit_num = 0
+        self.miss_num = 0
+
+    def __str__(self):
+        return ('hit rate: %.2f %% (%d / %d), %d utterances, %.1f / %.1f MB' %
+                (self.hit_rate * 100, self.hit_num,
+                 self.hit_num + self.miss_num, len(self.data),
+                 self.bytes / 1024 / 1024, self.max_bytes / 1024 / 1024))
@@ -0,0 +1,228 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Global cepstral mean & variance normalization (CMVN).
+   The mean & standard deviation of each feature dimension are computed in
+   one pass over the training set and saved as cmvn.npz in the model
+   directory, so that the same statistics are used in training and
+   inference. Utterances are reduced in chunks (in parallel with
+   num_worker > 1), and partial statistics are merged by the parallel
+   algorithm of Chan et al., which is numerically stable.
+
+   Features can be stored without normalization and normalized when
+   mini-batches are made (utils/buffer_pool.py) or in the graph
+   (utils/tfrecord.py).
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from os.path import join
+from multiprocessing import Pool
+import numpy as np
+
+from .progressbar import wrap_iterator
+
+
+CMVN_FILE_NAME = 'cmvn.npz'
+
+
+class CMVN(object):
+    """Statistics for normalization of features. Frame-stacked features
+       are normalized by the statistics repeated num_stack times.
+    Args:
+        mean: A numpy array of size `[input_size]`
+        std: A numpy array of size `[input_size]`
+        frame_num: int, the number of frames used to compute statistics
+        eps: float, the floor of std
+    """
+
+    def __init__(self, mean, std, frame_num=0, eps=1e-8):
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.std = np.asarray(std, dtype=np.float64)
+        self.frame_num = frame_num
+        self.eps = eps
+        # key => input_size, value => (mean, 1 / std) in float32
+        self._tiled = {}
+
+    def _stats(self, input_size):
+        """Return the statistics for (frame-stacked) inputs.
+        Args:
+            input_size: int, the dimension of (frame-stacked) inputs
+        Returns:
+            mean: A float32 numpy array of size `[input_size]`
+            inv_std: A float32 numpy array of size `[input_size]`
+        """
+        if input_size not in self._tiled:
+            if input_size % len(self.mean) != 0:
+                raise ValueError('input_size must be a multiple of %d.' %
+                                 len(self.mean))
+            num_stack = input_size // len(self.mean)
+            mean = np.tile(self.mean, num_stack).astype(np.float32)
+            inv_std = 1 / np.maximum(np.tile(self.std, num_stack), self.eps)
+            self._tiled[input_size] = (mean, inv_std.astype(np.float32))
+        return self._tiled[input_size]
+
+    def normalize(self, frames, out=None, frame_num=None, num_skip=None):
+        """Normalize features without temporary arrays.
+        Args:
+            frames: A numpy array of size `[frame_num, input_size]`
+            out: A numpy array to write the result into. If None, a new
+                float32 array is allocated.
+            frame_num: int, the number of frames before frame stacking
+            num_skip: int, the number of frames skipped in frame stacking.
+                If set with frame_num, the sub-frames padded with 0 beyond
+                the end of the utterance by frame stacking are kept 0 as
+                in frame stacking inside the graph.
+        Returns:
+            out: A numpy array of size `[frame_num, input_size]`
+        """
+        mean, inv_std = self._stats(frames.shape[-1])
+        if out is None:
+            out = np.empty(frames.shape, dtype=np.float32)
+        np.subtract(frames, mean, out=out, casting='unsafe')
+        out *= inv_std
+
+        num_stack = frames.shape[-1] // len(self.mean)
+        if frame_num is not None and num_skip is not None and num_stack > 1:
+            # The k-th sub-frame of the t-th stacked frame is the
+            # (t * num_skip + k)-th frame
+            input_size = len(self.mean)
+            for k in range(num_stack):
+                begin = max((frame_num - k + num_skip - 1) // num_skip, 0)
+                out[begin:, k * input_size:(k + 1) * input_size] = 0
+        return out
+
+    def normalize_tensor(self, inputs, frame_num=None, num_skip=None):
+        """Normalize features in the graph.
+        Args:
+            inputs: A float32 tensor of size `[..., input_size]`. The last
+                dimension must be known.
+            frame_num: An int64 tensor, the number of frames before frame
+                stacking. inputs must be `[frame_num, input_size]`.
+            num_skip: int, the number of frames skipped in frame stacking.
+                If set with frame_num, the sub-frames padded with 0 beyond
+                the end of the utterance by frame stacking are kept 0 as
+                in normalize().
+        Returns:
+            A float32 tensor of the same size
+        """
+        import tensorflow as tf
+        input_size = int(inputs.get_shape()[-1])
+        mean, inv_std = self._stats(input_size)
+        outputs = (inputs - tf.constant(mean)) * tf.constant(inv_std)
+
+        num_stack = input_size // len(self.mean)
+        if frame_num is not None and num_skip is not None and num_stack > 1:
+            # The number of stacked frames in which the k-th sub-frame is
+            # in the utterance, `[num_stack]`
+            frame_num = tf.to_int64(frame_num)
+            sub_frame_nums = tf.maximum(
+                (frame_num - tf.range(num_stack, dtype=tf.int64) +
+                 num_skip - 1) // num_skip, 0)
+            # `[stacked_frame_num, num_stack]`
+            stacked_frame_num = tf.shape(inputs, out_type=tf.int64)[0]
+            is_frame = tf.less(
+                tf.expand_dims(tf.range(stacked_frame_num), axis=1),
+                tf.expand_dims(sub_frame_nums, axis=0))
+            is_frame = tf.reshape(
+                tf.tile(tf.expand_dims(is_frame, axis=2),
+                        [1, 1, len(self.mean)]), tf.shape(inputs))
+            outputs = tf.where(is_frame, outputs, tf.zeros_like(outputs))
+        return outputs
+
+    def save(self, save_path):
+        """Save statistics as cmvn.npz.
+        Args:
+            save_path: path to the directory (e.g. the model directory)
+        """
+        np.savez(join(save_path, CMVN_FILE_NAME),
+                 mean=self.mean, std=self.std, frame_num=self.frame_num)
+
+    def __str__(self):
+        return ('%d dims, %d frames, mean: %.3f (avg), std: %.3f (avg)' %
+                (len(self.mean), self.frame_num,
+                 self.mean.mean(), self.std.mean()))
+
+
+def load_cmvn(save_path):
+    """Load statistics saved by CMVN.save().
+    Args:
+        save_path: path to the directory including cmvn.npz
+    Returns:
+        An instance of CMVN
+    """
+    stats = np.load(join(save_path, CMVN_FILE_NAME))
+    return CMVN(stats['mean'], stats['std'], int(stats['frame_num']))
+
+
+def _accumulate(input_paths):
+    """Compute statistics of a chunk of utterances.
+    Args:
+        input_paths: list of paths to .npy files of inputs
+    Returns:
+        frame_num: int, the number of frames
+        mean: A float64 numpy array of size `[input_size]`
+        m2: A float64 numpy array of size `[input_size]`, the sum of squared
+            differences from the mean
+    """
+    frames = np.concatenate([np.load(path) for path in input_paths],
+                            axis=0).astype(np.float64)
+    mean = frames.mean(axis=0)
+    frames -= mean
+    return frames.shape[0], mean, np.einsum('ij,ij->j', frames, frames)
+
+
+def _merge(stats_a, stats_b):
+    """Merge statistics of two sets of frames.
+    Args:
+        stats_a, stats_b: tuples of (frame_num, mean, m2)
+    Returns:
+        tuple of (frame_num, mean, m2)
+    """
+    n_a, mean_a, m2_a = stats_a
+    n_b, mean_b, m2_b = stats_b
+    n = n_a + n_b
+    if n_a == 0:
+        return stats_b
+    delta = mean_b - mean_a
+    return (n, mean_a + delta * n_b / n,
+            m2_a + m2_b + delta ** 2 * n_a * n_b / n)
+
+
+def compute_cmvn(input_paths, num_worker=1, chunk_size=64,
+                 is_progressbar=False):
+    """Compute the mean & std of each dimension in one pass.
+    Args:
+        input_paths: list of paths to .npy files of inputs (before frame
+            stacking) of the training set
+        num_worker: int, the number of processes to reduce chunks
+        chunk_size: int, the number of utterances in each chunk
+        is_progressbar: if True, visualize progressbar
+    Returns:
+        An instance of CMVN
+    """
+    input_paths = list(input_paths)
+    if len(input_paths) == 0:
+        raise ValueError('input_paths is empty.')
+    chunks = [input_paths[i:i + chunk_size]
+              for i in range(0, len(input_paths), chunk_size)]
+
+    stats = (0, 0., 0.)
+    if num_worker > 1:
+        pool = Pool(num_worker)
+        try:
+            # The merge does not depend on the order of chunks
+            for stats_chunk in wrap_iterator(
+                    pool.imap_unordered(_accumulate, chunks), is_progressbar):
+                stats = _merge(stats, stats_chunk)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for chunk in wrap_iterator(chunks, is_progressbar):
+            stats = _merge(stats, _accumulate(chunk))
+
+    frame_num, mean, m2 = stats
+    return CMVN(mean, np.sqrt(m2 / frame_num), frame_num)
@@ -0,0 +1,310 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Decoders of CTC models in numpy. These decode logits outside the graph
+   (e.g. logits saved by logit_cache.py), so that no session is needed.
+   Unlike tf.nn.ctc_beam_search_decoder, the beam search can use an n-gram
+   LM (see ngram_lm.py) and decodes utterances in a pool of processes.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from multiprocessing import get_context
+import numpy as np
+
+from .sparsetensor import sparsetensor2list
+
+
+def greedy_decode(logits, seq_len, blank_index):
+    """Best path decoding. The most probable class is taken in each frame,
+       then repeated classes are merged and blank classes are removed.
+    Args:
+        logits: A numpy array of size `[max_time, batch_size, num_classes]`
+            (time-major)
+        seq_len: An int numpy array of size `[batch_size]`
+        blank_index: int, the index of the blank class
+    Returns:
+        labels: list of int32 numpy arrays of decoded labels
+    """
+    max_time, batch_size = logits.shape[:2]
+    # `[batch_size, max_time]`
+    best_path = np.argmax(logits, axis=2).T.astype(np.int32)
+    is_frame = np.arange(max_time) < np.asarray(seq_len)[:, None]
+
+    # Keep the first frame of each run of the same class
+    is_new = np.ones((batch_size, max_time), dtype=bool)
+    is_new[:, 1:] = best_path[:, 1:] != best_path[:, :-1]
+    is_kept = is_new & is_frame & (best_path != blank_index)
+
+    return np.split(best_path[is_kept], np.cumsum(is_kept.sum(axis=1))[:-1])
+
+
+def log_softmax(logits):
+    """
+    Args:
+        logits: A numpy array of size `[..., num_classes]`
+    Returns:
+        A float32 numpy array of log posteriors of the same size
+    """
+    logits = np.asarray(logits, dtype=np.float32)
+    max_logits = logits.max(axis=-1, keepdims=True)
+    return logits - max_logits - np.log(
+        np.exp(logits - max_logits).sum(axis=-1, keepdims=True))
+
+
+def prefix_beam_search(log_probs, beam_width, blank_index, lm=None,
+                       lm_weight=0.5, insertion_bonus=0.0,
+                       prune_threshold=1e-3):
+    """CTC prefix beam search with shallow fusion of an n-gram LM.
+       Scores of all hypotheses & all classes are computed at once in each
+       frame.
+    Args:
+        log_probs: A numpy array of log posteriors, `[frame_num, num_classes]`
+        beam_width: int, the number of hypotheses kept in each frame
+        blank_index: int, the index of the blank class
+        lm: An instance of utils.ngram_lm.NgramLM, or None. Its tokens are
+            the classes except the blank class (the blank class must be the
+            last one).
+        lm_weight: float, the weight of LM scores
+        insertion_bonus: float, the score added to each label
+        prune_threshold: float, classes whose posteriors are lower than this
+            are not appended to hypotheses in the frame
+    Returns:
+        labels: An int32 numpy array of the best hypothesis
+        score: float, the score of the best hypothesis
+    """
+    log_threshold = np.log(prune_threshold) if prune_threshold > 0 \
+        else -np.inf
+
+    # Hypotheses
+    prefixes = [()]
+    log_p_b = np.array([0.], dtype=np.float32)  # end with blank
+    log_p_nb = np.array([-np.inf], dtype=np.float32)  # end with a label
+    last = np.array([-1])
+    lm_states = [lm.initial_state()] if lm is not None else None
+
+    for log_prob in log_probs:
+        candidates = np.nonzero(log_prob >= log_threshold)[0]
+        candidates = candidates[candidates != blank_index]
+        log_p_total = np.logaddexp(log_p_b, log_p_nb)
+
+        # Keep prefixes
+        new_log_p_b = log_p_total + log_prob[blank_index]
+        new_log_p_nb = np.where(last >= 0, log_p_nb + log_prob[last],
+                                -np.inf).astype(np.float32)
+
+        # Extend prefixes by candidates, `[beam, len(candidates)]`.
+        # The same label after a label must be separated by a blank.
+        extended = np.where(candidates[None, :] == last[:, None],
+                            log_p_b[:, None], log_p_total[:, None]) + \
+            log_prob[candidates][None, :] + insertion_bonus
+        if lm is not None and len(candidates) > 0:
+            extended += lm_weight * \
+                lm.logprob_rows(lm_states)[:, candidates]
+
+        # Merge extended prefixes which are already hypotheses
+        if len(candidates) > 0:
+            prefix2index = dict(zip(prefixes, range(len(prefixes))))
+            for i_beam, prefix in enumerate(prefixes):
+                if len(prefix) == 0:
+                    continue
+                parent = prefix2index.get(prefix[:-1])
+                pos = np.searchsorted(candidates, prefix[-1])
+                if parent is None or pos == len(candidates) or \
+                        candidates[pos] != prefix[-1]:
+                    continue
+                new_log_p_nb[i_beam] = np.logaddexp(
+                    new_log_p_nb[i_beam], extended[parent, pos])
+                extended[parent, pos] = -np.inf
+
+        # Select the best hypotheses
+        scores = np.concatenate([np.logaddexp(new_log_p_b, new_log_p_nb),
+                                 extended.ravel()])
+        if len(scores) > beam_width:
+            best = np.argpartition(-scores, beam_width - 1)[:beam_width]
+        else:
+            best = np.arange(len(scores))
+        best = best[np.isfinite(scores[best])]
+
+        num_beam = len(prefixes)
+        next_prefixes = []
+        next_lm_states = [] if lm is not None else None
+        log_p_b = np.full((len(best),), -np.inf, dtype=np.float32)
+        log_p_nb = np.full((len(best),), -np.inf, dtype=np.float32)
+        next_last = np.empty((len(best),), dtype=np.int64)
+        for i, index in enumerate(best):
+            if index < num_beam:
+                next_prefixes.append(prefixes[index])
+                log_p_b[i] = new_log_p_b[index]
+                log_p_nb[i] = new_log_p_nb[index]
+                next_last[i] = last[index]
+                if lm is not None:
+                    next_lm_states.append(lm_states[index])
+            else:
+                parent, pos = divmod(index - num_beam, len(candidates))
+                label = candidates[pos]
+                next_prefixes.append(prefixes[parent] + (label,))
+                log_p_nb[i] = extended[parent, pos]
+                next_last[i] = label
+                if lm is not None:
+                    next_lm_states.append(
+                        lm.next_state(lm_states[parent], label))
+        prefixes, last, lm_states = next_prefixes, next_last, next_lm_states
+
+    scores = np.logaddexp(log_p_b, log_p_nb)
+    if lm is not None:
+        # The end of sentence
+        scores += lm_weight * lm.logprob_rows(lm_states)[:, -1]
+    best = int(np.argmax(scores))
+    return np.array(prefixes[best], dtype=np.int32), float(scores[best])
+
+
+def skip_blank_frames(log_probs, blank_index, blank_threshold=0.999,
+                      merge_repeats=True):
+    """Reduce frames before beam search. Each run of frames whose blank
+       posteriors are higher than blank_threshold is collapsed into one
+       frame, and each run of frames with the same non-blank argmax is
+       merged into one frame. Posteriors of the merged frames are averaged.
+       One frame is left for each run, so that repeated labels are still
+       separated by a blank frame.
+    Args:
+        log_probs: A numpy array of log posteriors, `[frame_num, num_classes]`
+        blank_index: int, the index of the blank class
+        blank_threshold: float, the posterior to regard a frame as blank
+        merge_repeats: if True, merge frames with the same non-blank argmax
+    Returns:
+        A float32 numpy array of log posteriors, `[reduced_frame_num,
+            num_classes]`
+    """
+    frame_num = len(log_probs)
+    if frame_num == 0:
+        return log_probs
+
+    # Frames with the same key in a row are merged
+    best_path = np.argmax(log_probs, axis=1)
+    keys = -2 - np.arange(frame_num)  # unique (not merged)
+    if merge_repeats:
+        is_label = best_path != blank_index
+        keys[is_label] = best_path[is_label]
+    keys[log_probs[:, blank_index] >= np.log(blank_threshold)] = -1
+
+    starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+    if len(starts) == frame_num:
+        return log_probs
+    probs_sum = np.add.reduceat(np.exp(log_probs, dtype=np.float64), starts,
+                                axis=0)
+    run_lens = np.diff(np.append(starts, frame_num))
+    with np.errstate(divide='ignore'):
+        return np.log(probs_sum / run_lens[:, None]).astype(np.float32)
+
+
+_worker_kwargs = None
+
+
+def _init_worker(kwargs):
+    global _worker_kwargs
+    _worker_kwargs = kwargs
+
+
+def _decode_worker(log_probs):
+    return prefix_beam_search(log_probs, **_worker_kwargs)[0]
+
+
+class BeamSearchDecoder(object):
+    """Decode mini-batches by prefix_beam_search(). Utterances are decoded
+       in a pool of processes. The LM is sent to each process only once.
+    Args:
+        beam_width: int, the number of hypotheses kept in each frame
+        blank_index: int, the index of the blank class
+        lm: An instance of utils.ngram_lm.NgramLM, or None
+        lm_weight: float, the weight of LM scores
+        insertion_bonus: float, the score added to each label
+        prune_threshold: float, classes whose posteriors are lower than this
+            are not appended to hypotheses in the frame
+        num_worker: int, the number of processes. If 0, utterances are
+            decoded in the main thread.
+        blank_threshold: float, if set, frames are reduced by
+            skip_blank_frames() before beam search. The numbers of frames
+            before & after are counted in frame_num & reduced_frame_num.
+    """
+
+    def __init__(self, beam_width, blank_index, lm=None, lm_weight=0.5,
+                 insertion_bonus=0.0, prune_threshold=1e-3, num_worker=4,
+                 blank_threshold=None):
+        self.blank_threshold = blank_threshold
+        self.frame_num = 0
+        self.reduced_frame_num = 0
+        self.kwargs = {'beam_width': beam_width,
+                       'blank_index': blank_index,
+                       'lm': lm,
+                       'lm_weight': lm_weight,
+                       'insertion_bonus': insertion_bonus,
+                       'prune_threshold': prune_threshold}
+        self.pool = None
+        if num_worker > 0:
+            # NOTE: workers are not forked from the process of the session
+            self.pool = get_context('forkserver').Pool(
+                num_worker, initializer=_init_worker, initargs=(self.kwargs,))
+
+    def __call__(self, logits, seq_len):
+        """
+        Args:
+            logits: A numpy array of size `[max_time, batch_size, num_classes]`
+                (time-major)
+            seq_len: An int numpy array of size `[batch_size]`
+        Returns:
+            labels: list of int32 numpy arrays of decoded labels
+        """
+        log_probs = log_softmax(logits)
+        log_probs_list = [log_probs[:seq_len[i_batch], i_batch]
+                          for i_batch in range(len(seq_len))]
+        if self.blank_threshold is not None:
+            self.frame_num += int(np.sum(seq_len))
+            log_probs_list = [skip_blank_frames(
+                log_probs_i, self.kwargs['blank_index'], self.blank_threshold)
+                for log_probs_i in log_probs_list]
+            self.reduced_frame_num += sum(map(len, log_probs_list))
+        if self.pool is None:
+            return [prefix_beam_search(log_probs_i, **self.kwargs)[0]
+                    for log_probs_i in log_probs_list]
+        return self.pool.map(_decode_worker, log_probs_list)
+
+    @property
+    def reduction_ratio(self):
+        """The ratio of frames removed by skip_blank_frames()."""
+        if self.frame_num == 0:
+            return 0.
+        return 1 - self.reduced_frame_num / self.frame_num
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+
+def run_decoder(session, decode_op, feed_dict, batch_size, decoder=None,
+                logits_op=None):
+    """Decode a mini-batch in the graph or by a numpy decoder.
+    Args:
+        session: session of the model
+        decode_op: operation for decoding (a SparseTensor)
+        feed_dict: dict of the mini-batch
+        batch_size: int, the size of the mini-batch
+        decoder: A function which takes time-major logits & the length of
+            them, and returns list of label sequences (e.g. an instance of
+            BeamSearchDecoder), or None
+        logits_op: list of operations of logits & the length of logits.
+            This is used instead of decode_op when decoder is set.
+    Returns:
+        labels_pred: list of label sequences
+    """
+    if decoder is None:
+        return sparsetensor2list(session.run(decode_op, feed_dict=feed_dict),
+                                 batch_size)
+    if logits_op is None:
+        raise ValueError('Set logits_op to decode by decoder.')
+    logits, seq_len = session.run(logits_op, feed_dict=feed_dict)
+    return decoder(logits, seq_len)
@@ -0,0 +1,113 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Levenshtein distance of mini-batches in numpy.
+   The dynamic programming table of all pairs in a mini-batch is filled row
+   by row, and each row is computed at once for all pairs & columns. The
+   insertion term, which depends on the left cell in the same row, is
+   computed by a cumulative minimum:
+       d[i, j] = min_k (t[k] + j - k) = min_k (t[k] - k) + j
+   No graph is built, so the cost does not grow during training.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+
+
+def _pad(label_list, padded_value):
+    """
+    Args:
+        label_list: list of label sequences
+        padded_value: int, the value used for padding
+    Returns:
+        labels: An int64 numpy array of size `[batch_size, max_len]`
+        labels_len: An int64 numpy array of size `[batch_size]`
+    """
+    labels_len = np.array([len(label_i) for label_i in label_list],
+                          dtype=np.int64)
+    labels = np.full((len(label_list), max(labels_len.max(), 1)),
+                     padded_value, dtype=np.int64)
+    for i_batch, label_i in enumerate(label_list):
+        labels[i_batch, :len(label_i)] = label_i
+    return labels, labels_len
+
+
+def edit_distance_batch(labels_true, labels_pred):
+    """Compute the edit distance and the number of substitutions, insertions
+       and deletions of each pair.
+    Args:
+        labels_true: list of reference sequences of indices
+        labels_pred: list of hypothesis sequences of indices
+    Returns:
+        distance: An int64 numpy array of size `[batch_size]`
+        substitution: An int64 numpy array of size `[batch_size]`
+        insertion: An int64 numpy array of size `[batch_size]`
+        deletion: An int64 numpy array of size `[batch_size]`
+        ref_len: An int64 numpy array of size `[batch_size]`
+    """
+    if len(labels_true) != len(labels_pred):
+        raise ValueError('The sizes of labels_true & labels_pred differ.')
+    batch_size = len(labels_true)
+    if batch_size == 0:
+        empty = np.zeros((0,), dtype=np.int64)
+        return empty, empty, empty, empty, empty
+
+    # NOTE: padded values never match each other
+    ref, ref_len = _pad(labels_true, -1)
+    hyp, hyp_len = _pad(labels_pred, -2)
+    max_ref_len, max_hyp_len = ref.shape[1], hyp.shape[1]
+
+    # `[batch_size, max_ref_len + 1, max_hyp_len + 1]`
+    columns = np.arange(max_hyp_len + 1)
+    table = np.empty((batch_size, max_ref_len + 1, max_hyp_len + 1),
+                     dtype=np.int64)
+    table[:, 0] = columns
+    row = np.empty((batch_size, max_hyp_len + 1), dtype=np.int64)
+    for i in range(1, max_ref_len + 1):
+        prev = table[:, i - 1]
+        # Substitution (or match) & deletion
+        row[:, 0] = i
+        np.minimum(prev[:, :-1] + (ref[:, i - 1:i] != hyp),
+                   prev[:, 1:] + 1, out=row[:, 1:])
+        # Insertion
+        table[:, i] = np.minimum.accumulate(row - columns, axis=1) + columns
+
+    # Backtrace to count each type of errors
+    batch_indices = np.arange(batch_size)
+    distance = table[batch_indices, ref_len, hyp_len]
+    substitution = np.zeros((batch_size,), dtype=np.int64)
+    insertion = np.zeros((batch_size,), dtype=np.int64)
+    deletion = np.zeros((batch_size,), dtype=np.int64)
+    for i_batch in range(batch_size):
+        d = table[i_batch]
+        i, j = ref_len[i_batch], hyp_len[i_batch]
+        while i > 0 or j > 0:
+            if i > 0 and j > 0 and d[i, j] == d[i - 1, j - 1] + \
+                    (ref[i_batch, i - 1] != hyp[i_batch, j - 1]):
+                if ref[i_batch, i - 1] != hyp[i_batch, j - 1]:
+                    substitution[i_batch] += 1
+                i, j = i - 1, j - 1
+            elif i > 0 and d[i, j] == d[i - 1, j] + 1:
+                deletion[i_batch] += 1
+                i -= 1
+            else:
+                insertion[i_batch] += 1
+                j -= 1
+
+    return distance, substitution, insertion, deletion, ref_len
+
+
+def error_rate(labels_true, labels_pred):
+    """Compute the edit distance normalized by the length of each reference.
+    Args:
+        labels_true: list of reference sequences of indices
+        labels_pred: list of hypothesis sequences of indices
+    Returns:
+        A float64 numpy array of size `[batch_size]`. Empty references are
+            regarded as length 1.
+    """
+    distance, _, _, _, ref_len = edit_distance_batch(labels_true, labels_pred)
+    return distance / np.maximum(ref_len, 1)
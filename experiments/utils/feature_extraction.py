@@ -0,0 +1,181 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Extract features from wav files in parallel.
+   Log mel filterbank (40 + energy) or MFCC features with delta & delta-delta
+   are computed in the same way as models/test/data.py (read_wav), and saved
+   in the per-utterance layout
+       frame_num.pickle
+       input/*.npy
+   or in the packed format (see packed_corpus.py)
+       packed/inputs.bin, packed/labels.bin (empty), packed/index.pickle
+   Features are not normalized (see cmvn.py).
+
+   Usage (in experiments/):
+       python -m utils.feature_extraction path_to_wav_dir save_path
+           [logmelfbank|mfcc] [num_worker] [--packed]
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+from os.path import join, basename, splitext
+import sys
+import time
+import pickle
+from multiprocessing import Pool
+import numpy as np
+import scipy.io.wavfile
+from python_speech_features import mfcc, fbank, hz2mel
+
+from .packed_corpus import write_packed_corpus
+from .progressbar import wrap_iterator
+
+
+def delta(feat, N):
+    """Compute delta features from a feature vector sequence. This is the
+       convolution with the kernel [-N, ..., N] / (2 * sum_n n^2) along the
+       time axis, where the first & last frames are repeated N times.
+    Args:
+        feat: A numpy array of size `[frame_num, feature_dim]`
+        N: For each frame, calculate delta features based on preceding and
+            following N frames.
+    Returns:
+        dfeat: A numpy array of size `[frame_num, feature_dim]`
+    """
+    feat = np.asarray(feat)
+    frame_num = feat.shape[0]
+    padded = np.pad(feat, ((N, N), (0, 0)), mode='edge')
+    denom = 2 * sum([i * i for i in range(1, N + 1)])
+    dfeat = np.zeros(feat.shape, dtype=np.float64)
+    # Accumulate each tap of the kernel over all frames at once
+    for n in range(1, N + 1):
+        dfeat += n * (padded[N + n:N + n + frame_num] -
+                      padded[N - n:N - n + frame_num])
+    return dfeat / denom
+
+
+def wav2feature(wav_path, feature_type='logmelfbank'):
+    """Read a wav file & convert to features.
+    Args:
+        wav_path: path to a wav file
+        feature_type: logmelfbank or mfcc
+    Returns:
+        A float32 numpy array of size `[frame_num, 123]` (logmelfbank) or
+            `[frame_num, 39]` (mfcc)
+    """
+    fs, audio = scipy.io.wavfile.read(wav_path)
+
+    if feature_type == 'mfcc':
+        features = mfcc(audio, samplerate=fs)
+    elif feature_type == 'logmelfbank':
+        fbank_features, energy = fbank(audio, samplerate=fs, nfilt=40)
+        logmelfbank = hz2mel(np.log(fbank_features))
+        features = np.c_[logmelfbank, np.log(energy)]
+    else:
+        raise ValueError('feature_type is "logmelfbank" or "mfcc".')
+
+    delta1 = delta(features, N=2)
+    delta2 = delta(delta1, N=2)
+    return np.c_[features, delta1, delta2].astype(np.float32)
+
+
+def _extract(args):
+    """
+    Args:
+        args: tuple of (wav_path, feature_type)
+    Returns:
+        input_name: string, the name of the utterance
+        features: A float32 numpy array of size `[frame_num, feature_dim]`
+    """
+    wav_path, feature_type = args
+    return splitext(basename(wav_path))[0], wav2feature(wav_path,
+                                                        feature_type)
+
+
+def extract_features(wav_paths, save_path, feature_type='logmelfbank',
+                     num_worker=4, is_packed=False, is_progressbar=False):
+    """Extract features of wav files in a process pool & save them.
+    Args:
+        wav_paths: list of paths to wav files. The file names (without
+            extension) are used as the names of utterances.
+        save_path: path to the dataset to save
+        feature_type: logmelfbank or mfcc
+        num_worker: int, the number of processes
+        is_packed: if True, save in the packed format (save_path/packed)
+            instead of input/*.npy
+        is_progressbar: if True, visualize progressbar
+    Returns:
+        file_num: int, the number of wav files
+        frame_num: int, the total number of frames
+        elapsed: float, the elapsed time in seconds
+    """
+    input_names = [splitext(basename(path))[0] for path in wav_paths]
+    if len(set(input_names)) != len(input_names):
+        raise ValueError('The names of wav files are not unique.')
+    if not os.path.isdir(join(save_path, 'input')) and not is_packed:
+        os.makedirs(join(save_path, 'input'))
+
+    start_time = time.time()
+    tasks = [(path, feature_type) for path in wav_paths]
+    pool = Pool(num_worker) if num_worker > 1 else None
+    try:
+        if pool is None:
+            results = (_extract(task) for task in tasks)
+        else:
+            # NOTE: imap keeps the order of wav_paths
+            chunk_size = max(len(tasks) // (num_worker * 16), 1)
+            results = pool.imap(_extract, tasks, chunksize=chunk_size)
+        results = wrap_iterator(results, is_progressbar)
+
+        frame_num_dict = {}
+        if is_packed:
+            # Stream features into the blob without keeping them in memory
+            def input_iter():
+                for input_name, features in results:
+                    frame_num_dict[input_name] = features.shape[0]
+                    yield features
+            write_packed_corpus(join(save_path, 'packed'), input_names,
+                                input_iter(),
+                                (np.zeros((0,), dtype=np.int32)
+                                 for _ in input_names))
+        else:
+            for input_name, features in results:
+                frame_num_dict[input_name] = features.shape[0]
+                np.save(join(save_path, 'input', input_name + '.npy'),
+                        features)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    with open(join(save_path, 'frame_num.pickle'), 'wb') as f:
+        pickle.dump(frame_num_dict, f)
+
+    elapsed = time.time() - start_time
+    frame_num = sum(frame_num_dict.values())
+    print('%d files (%.1f files/sec), %d frames (%.1f frames/sec)' %
+          (len(wav_paths), len(wav_paths) / max(elapsed, 1e-8),
+           frame_num, frame_num / max(elapsed, 1e-8)))
+    return len(wav_paths), frame_num, elapsed
+
+
+if __name__ == '__main__':
+
+    args = [arg for arg in sys.argv if arg != '--packed']
+    if len(args) not in [3, 4, 5]:
+        raise ValueError(
+            ("Usase: python -m utils.feature_extraction path_to_wav_dir "
+             "save_path [logmelfbank|mfcc] [num_worker] [--packed]"))
+    wav_paths = []
+    for dir_path, _, file_names in os.walk(args[1]):
+        wav_paths.extend(join(dir_path, file_name)
+                         for file_name in file_names
+                         if file_name.lower().endswith('.wav'))
+    extract_features(sorted(wav_paths), args[2],
+                     feature_type=args[3] if len(args) > 3 else 'logmelfbank',
+                     num_worker=int(args[4]) if len(args) > 4 else 4,
+                     is_packed='--packed' in sys.argv,
+                     is_progressbar=True)
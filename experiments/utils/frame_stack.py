@@ -30,7 +30,6 @@ def stack_frame(input_list, input_paths, frame_num_dict, num_stack, num_skip, is
     if num_stack < num_skip:
         raise ValueError('num_skip must be less than num_stack.')
 
-    input_size = input_list[0].shape[1]
     utt_num = len(input_paths)
 
     stacked_input_list = []
@@ -43,48 +42,80 @@ def stack_frame(input_list, input_paths, frame_num_dict, num_stack, num_skip, is
             frame_num_decimated += 1
         frame_num_decimated = int(frame_num_decimated)
 
-        stacked_frames = np.zeros(
-            (frame_num_decimated, input_size * num_stack))
-        stack_count = 0  # counter for stacked_frames
-        stack = []
-        for i_frame, frame in enumerate(input_list[i_utt]):
-            #####################
-            # final frame
-            #####################
-            if i_frame == len(input_list[i_utt]) - 1:
-                # Stack the final frame
-                stack.append(frame)
-
-                while stack_count != int(frame_num_decimated):
-                    # Concatenate stacked frames
-                    for i_stack in range(len(stack)):
-                        stacked_frames[stack_count][input_size *
-                                                    i_stack:input_size * (i_stack + 1)] = stack[i_stack]
-                    stack_count += 1
-
-                    # Delete some frames to skip
-                    for _ in range(num_skip):
-                        if len(stack) != 0:
-                            stack.pop(0)
-
-            ########################
-            # first & middle frames
-            ########################
-            elif len(stack) < num_stack:
-                # Stack some frames until stack is filled
-                stack.append(frame)
-
-                if len(stack) == num_stack:
-                    # Concatenate stacked frames
-                    for i_stack in range(num_stack):
-                        stacked_frames[stack_count][input_size *
-                                                    i_stack:input_size * (i_stack + 1)] = stack[i_stack]
-                    stack_count += 1
-
-                    # Delete some frames to skip
-                    for _ in range(num_skip):
-                        stack.pop(0)
-
-        stacked_input_list.append(stacked_frames)
+        stacked_input_list.append(_stack_utterance(
+            input_list[i_utt], frame_num_decimated, num_stack, num_skip))
 
     return stacked_input_list
+
+
+def _stack_utterance(frames, frame_num_decimated, num_stack, num_skip):
+    """Stack & skip frames of a single utterance.
+       The k-th stacked frame consists of frames[k * num_skip:
+       k * num_skip + num_stack], and frames beyond the end of the utterance
+       are padded with 0.
+    Args:
+        frames: A numpy array of size `[frame_num, input_size]`
+        frame_num_decimated: int, the number of stacked frames
+        num_stack: int, the number of frames to stack
+        num_skip: int, the number of frames to skip
+    Returns:
+        stacked_frames: A numpy array of size
+            `[frame_num_decimated, input_size * num_stack]`
+    """
+    frame_num, input_size = frames.shape
+
+    # Pad with 0 so that the last stacked frame does not exceed the end
+    padded_frame_num = max(
+        frame_num, (frame_num_decimated - 1) * num_skip + num_stack)
+    padded_frames = np.zeros((padded_frame_num, input_size))
+    padded_frames[:frame_num] = frames
+
+    # `[frame_num_decimated, num_stack]`
+    frame_indices = (np.arange(frame_num_decimated)[:, None] * num_skip +
+                     np.arange(num_stack)[None, :])
+    return padded_frames[frame_indices].reshape(
+        (frame_num_decimated, input_size * num_stack))
+
+
+def stack_frame_batch(inputs, inputs_seq_len, num_stack, num_skip):
+    """Stack & skip frames of a padded mini-batch at once. Each utterance is
+       stacked in the same way as stack_frame().
+    Args:
+        inputs: A numpy array of size `[batch_size, max_frame_num, input_size]`
+        inputs_seq_len: A numpy array of length of inputs of size
+            `[batch_size]`
+        num_stack: int, the number of frames to stack
+        num_skip: int, the number of frames to skip
+    Returns:
+        stacked_inputs: A numpy array of size
+            `[batch_size, max_frame_num_decimated, input_size * num_stack]`
+        stacked_inputs_seq_len: A numpy array of size `[batch_size]`
+    """
+    if num_stack < num_skip:
+        raise ValueError('num_skip must be less than num_stack.')
+
+    batch_size, max_frame_num, input_size = inputs.shape
+    inputs_seq_len = np.asarray(inputs_seq_len)
+    stacked_inputs_seq_len = (inputs_seq_len + num_skip - 1) // num_skip
+    if batch_size == 0:
+        return (np.zeros((0, 0, input_size * num_stack)),
+                stacked_inputs_seq_len)
+    max_frame_num_decimated = int(stacked_inputs_seq_len.max())
+
+    padded_frame_num = max(
+        max_frame_num, (max_frame_num_decimated - 1) * num_skip + num_stack)
+    padded_inputs = np.zeros((batch_size, padded_frame_num, input_size))
+    padded_inputs[:, :max_frame_num] = inputs
+
+    # Frames beyond the length of each utterance are regarded as 0
+    is_padding = (np.arange(padded_frame_num)[None, :] >=
+                  inputs_seq_len[:, None])
+    padded_inputs[is_padding] = 0
+
+    # `[max_frame_num_decimated, num_stack]`
+    frame_indices = (np.arange(max_frame_num_decimated)[:, None] * num_skip +
+                     np.arange(num_stack)[None, :])
+    stacked_inputs = padded_inputs[:, frame_indices].reshape(
+        (batch_size, max_frame_num_decimated, input_size * num_stack))
+
+    return stacked_inputs, stacked_inputs_seq_len
@@ -5,6 +5,8 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+from .vocab import load_vocab
+
 
 def char2num(str_char, map_file_path):
     """Convert from character to number.
@@ -14,20 +16,7 @@ def char2num(str_char, map_file_path):
     Returns:
         char_list: list of character indices
     """
-    char_list = list(str_char)
-
-    # Read mapping file
-    map_dict = {}
-    with open(map_file_path, 'r') as f:
-        for line in f:
-            line = line.strip().split()
-            map_dict[line[0]] = int(line[1])
-
-    # Convert from character to number
-    for i in range(len(char_list)):
-        char_list[i] = map_dict[char_list[i]]
-
-    return char_list
+    return load_vocab(map_file_path).ids(list(str_char))
 
 
 def num2char(num_list, map_file_path):
@@ -38,17 +27,5 @@ def num2char(num_list, map_file_path):
     Returns:
         str_char: string of characters
     """
-    # Read mapping file
-    map_dict = {}
-    with open(map_file_path, 'r') as f:
-        for line in f:
-            line = line.strip().split()
-            map_dict[int(line[1])] = line[0]
-
-    # Convert from indices to the corresponding characters
-    char_list = []
-    for i in range(len(num_list)):
-        char_list.append(map_dict[num_list[i]])
-
-    str_char = ''.join(char_list)
+    str_char = ''.join(load_vocab(map_file_path).tokens(num_list))
     return str_char
@@ -0,0 +1,121 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Vocabulary of labels loaded from mapping files.
+   Each mapping file is read only once per process, and the vocabulary is
+   shared by all callers. Mapping files must not be changed while running.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from os.path import abspath
+import threading
+import numpy as np
+
+
+class Vocab(object):
+    """Bidirectional mapping between tokens and indices.
+    Args:
+        map_file_path: path to the mapping file. Each line is
+            `token index`.
+    """
+
+    def __init__(self, map_file_path):
+        self.token2id = {}
+        with open(map_file_path, 'r') as f:
+            for line in f:
+                line = line.strip().split()
+                if len(line) == 0:
+                    continue
+                self.token2id[line[0]] = int(line[1])
+
+        # Lookup array of tokens (None for unused indices)
+        self.id2token = np.empty((max(self.token2id.values()) + 1,),
+                                 dtype=object)
+        for token, index in self.token2id.items():
+            self.id2token[index] = token
+
+    def __len__(self):
+        return len(self.token2id)
+
+    def ids(self, tokens):
+        """
+        Args:
+            tokens: list of tokens (string)
+        Returns:
+            list of indices (int)
+        """
+        return [self.token2id[token] for token in tokens]
+
+    def tokens(self, ids):
+        """Convert indices to tokens by a single gather.
+        Args:
+            ids: list or numpy array of indices
+        Returns:
+            list of tokens (string)
+        """
+        return self.id2token[np.asarray(ids, dtype=np.int64)].tolist()
+
+
+_vocab_cache = {}
+_lock = threading.Lock()
+
+
+def load_vocab(map_file_path):
+    """Load the vocabulary. The same instance is returned for the same file.
+    Args:
+        map_file_path: path to the mapping file
+    Returns:
+        An instance of Vocab
+    """
+    key = abspath(map_file_path)
+    with _lock:
+        if key not in _vocab_cache:
+            _vocab_cache[key] = Vocab(map_file_path)
+        return _vocab_cache[key]
+
+
+def make_map_table(vocab_src, vocab_dst, token_map):
+    """Make the lookup array to map indices of vocab_src to vocab_dst.
+    Args:
+        vocab_src: An instance of Vocab
+        vocab_dst: An instance of Vocab
+        token_map: dict, key => token of vocab_src, value => token of
+            vocab_dst. Tokens mapped to '' (or not in token_map) are removed.
+    Returns:
+        table: An int32 numpy array of size `[max index of vocab_src + 1]`.
+            Removed tokens are mapped to -1.
+    """
+    table = np.full((len(vocab_src.id2token),), -1, dtype=np.int32)
+    for token, index in vocab_src.token2id.items():
+        token_dst = token_map.get(token, '')
+        if token_dst != '':
+            table[index] = vocab_dst.token2id[token_dst]
+    return table
+
+
+def map_batch(table, label_list):
+    """Map label sequences of a mini-batch by a single vectorized gather.
+    Args:
+        table: An int numpy array made by make_map_table()
+        label_list: list of label sequences (list or numpy array of indices)
+    Returns:
+        list of numpy arrays of mapped indices. Removed tokens are dropped.
+    """
+    if len(label_list) == 0:
+        return []
+    label_lens = np.array([len(label_i) for label_i in label_list],
+                          dtype=np.int64)
+    if label_lens.sum() == 0:
+        return [np.zeros((0,), dtype=table.dtype) for _ in label_list]
+
+    mapped = table[np.concatenate(
+        [np.asarray(label_i, dtype=np.int64) for label_i in label_list])]
+    is_kept = mapped >= 0
+
+    # The number of kept tokens in each sequence
+    row_ids = np.repeat(np.arange(len(label_list)), label_lens)
+    kept_lens = np.bincount(row_ids[is_kept], minlength=len(label_list))
+    return np.split(mapped[is_kept], np.cumsum(kept_lens)[:-1])
@@ -0,0 +1,322 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""On-disk cache of logits of CTC models.
+   Logits of a split are computed once per checkpoint and saved in
+       model_dir/logit_cache/<checkpoint>_<data_type>_<top_k>_<fingerprint>/
+           logits.bin: float16 logits of all utterances,
+               `[total_frame_num, num_classes]` (or `[total_frame_num, top_k]`)
+           indices.bin: int16 classes of the kept logits (only if pruned)
+           index.pickle: offsets & frame nums of each utterance, labels of
+               ground truth and the meta data
+   The fingerprint is made from the one of the dataset (see stack_cache.py)
+   and the sizes & modification times of the checkpoint files, so that the
+   cache is made again when the dataset is changed or the model is trained
+   again into the same directory. Then
+   decoding settings (beam width, greedy or beam search, label mapping) can be
+   swept by re-decoding the cache without running the acoustic model.
+
+   When pruned, only top_k logits of each frame are kept (the blank class is
+   always kept), and the other classes are regarded as PRUNED_LOGIT.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+from os.path import join, isdir, isfile, basename
+from glob import glob
+import hashlib
+import pickle
+import shutil
+import numpy as np
+
+from .stack_cache import fingerprint
+from .sparsetensor import sparsetensor2list
+from .progressbar import wrap_iterator
+
+
+LOGIT_DTYPE = np.float16
+INDEX_DTYPE = np.int16
+PRUNED_LOGIT = -1e4
+
+
+def checkpoint_fingerprint(model_path):
+    """Compute the fingerprint of the checkpoint.
+    Args:
+        model_path: path to the checkpoint (e.g. model_dir/model.ckpt-20)
+    Returns:
+        string, the hex digest of the names, sizes and modification times of
+            the checkpoint files (.index, .data-*, .meta)
+    """
+    md5 = hashlib.md5()
+    paths = glob(model_path + '.*')
+    if isfile(model_path):
+        # The checkpoint of V1 format
+        paths.append(model_path)
+    for path in sorted(paths):
+        stat = os.stat(path)
+        md5.update(('%s:%d:%d\n' % (basename(path), stat.st_size,
+                                    int(stat.st_mtime))).encode('utf-8'))
+    return md5.hexdigest()
+
+
+def logit_cache_path(model_dir, model_path, data_type, dataset_path,
+                     top_k=None):
+    """Return the path to the cache of logits.
+    Args:
+        model_dir: path to the directory of the model
+        model_path: path to the checkpoint (e.g. model_dir/model.ckpt-20)
+        data_type: string, the name of the split (e.g. test)
+        dataset_path: path to the dataset including frame_num.pickle
+        top_k: int, the number of classes kept in each frame, or None
+    Returns:
+        path to the cache
+    """
+    md5 = hashlib.md5()
+    md5.update(fingerprint(dataset_path).encode('utf-8'))
+    md5.update(checkpoint_fingerprint(model_path).encode('utf-8'))
+    return join(model_dir, 'logit_cache', '%s_%s_%s_%s' %
+                (basename(model_path), data_type,
+                 'all' if top_k is None else 'top%d' % top_k,
+                 md5.hexdigest()[:16]))
+
+
+def prune_logits(logits, top_k, blank_index):
+    """Keep top_k logits of each frame.
+    Args:
+        logits: A numpy array of size `[frame_num, num_classes]`
+        top_k: int, the number of classes to keep
+        blank_index: int, the index of the blank class, which is always kept
+    Returns:
+        values: A numpy array of size `[frame_num, top_k]`
+        indices: An int64 numpy array of size `[frame_num, top_k]`
+    """
+    scores = np.array(logits, dtype=np.float32)
+    scores[:, blank_index] = np.inf
+    indices = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+    values = logits[np.arange(len(logits))[:, None], indices]
+    return values, indices
+
+
+class LogitCacheWriter(object):
+    """Write logits of utterances into the cache one by one.
+       Everything is written into a temporary directory, which is renamed to
+       save_path by close(), so that an incomplete cache is never opened.
+       Call abort() instead of close() to discard it.
+    Args:
+        save_path: path to save the cache
+        num_classes: int, the number of classes including the blank class
+        top_k: int, the number of classes to keep in each frame. If None,
+            all logits are saved.
+        meta: dict, additional information saved in the cache
+            (e.g. label_type)
+    """
+
+    def __init__(self, save_path, num_classes, top_k=None, meta=None):
+        if top_k is not None and not 0 < top_k <= num_classes:
+            raise ValueError('top_k must be in [1, num_classes].')
+        if num_classes > np.iinfo(INDEX_DTYPE).max:
+            raise ValueError('Too many classes.')
+
+        self.save_path = save_path
+        self.num_classes = num_classes
+        self.top_k = top_k
+        self.meta = {} if meta is None else meta
+
+        self.tmp_path = save_path + '.tmp%d' % os.getpid()
+        if not isdir(self.tmp_path):
+            os.makedirs(self.tmp_path)
+        self.f_logits = open(join(self.tmp_path, 'logits.bin'), 'wb')
+        self.f_indices = None
+        if top_k is not None:
+            self.f_indices = open(join(self.tmp_path, 'indices.bin'), 'wb')
+
+        self.input_names = []
+        self.frame_nums = []
+        self.labels = []
+
+    def add(self, input_name, logits, label):
+        """
+        Args:
+            input_name: string, the name of the utterance
+            logits: A numpy array of size `[frame_num, num_classes]`
+            label: list or numpy array of labels of ground truth
+        """
+        if logits.shape[1] != self.num_classes:
+            raise ValueError('The number of classes is not same.')
+        if self.top_k is not None:
+            logits, indices = prune_logits(logits, self.top_k,
+                                           self.num_classes - 1)
+            self.f_indices.write(
+                np.ascontiguousarray(indices, dtype=INDEX_DTYPE).tobytes())
+        self.f_logits.write(
+            np.ascontiguousarray(logits, dtype=LOGIT_DTYPE).tobytes())
+        self.input_names.append(input_name)
+        self.frame_nums.append(logits.shape[0])
+        self.labels.append(np.asarray(label))
+
+    def close(self):
+        self.f_logits.close()
+        if self.f_indices is not None:
+            self.f_indices.close()
+
+        frame_nums = np.array(self.frame_nums, dtype=np.int64)
+        offsets = np.zeros((len(frame_nums),), dtype=np.int64)
+        offsets[1:] = np.cumsum(frame_nums)[:-1]
+        index = {
+            'input_names': self.input_names,
+            'offsets': offsets,
+            'frame_nums': frame_nums,
+            'num_classes': self.num_classes,
+            'top_k': self.top_k,
+            'labels': self.labels,
+            'meta': self.meta,
+        }
+        with open(join(self.tmp_path, 'index.pickle'), 'wb') as f:
+            pickle.dump(index, f)
+        os.rename(self.tmp_path, self.save_path)
+
+    def abort(self):
+        """Close files and remove the temporary directory."""
+        self.f_logits.close()
+        if self.f_indices is not None:
+            self.f_indices.close()
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+
+
+class LogitCache(object):
+    """Read the cache of logits. Logits are memory-mapped.
+    Args:
+        cache_path: path to the cache
+    """
+
+    def __init__(self, cache_path):
+        self.cache_path = cache_path
+
+        with open(join(cache_path, 'index.pickle'), 'rb') as f:
+            index = pickle.load(f)
+        self.input_names = index['input_names']
+        self.offsets = index['offsets']
+        self.frame_nums = index['frame_nums']
+        self.num_classes = index['num_classes']
+        self.top_k = index['top_k']
+        self.labels = index['labels']
+        self.meta = index['meta']
+
+        total_frame_num = int(self.frame_nums.sum())
+        width = self.num_classes if self.top_k is None else self.top_k
+        self.logits = np.zeros((0, width), dtype=LOGIT_DTYPE)
+        self.indices = np.zeros((0, width), dtype=INDEX_DTYPE)
+        if total_frame_num > 0:
+            self.logits = np.memmap(join(cache_path, 'logits.bin'),
+                                    dtype=LOGIT_DTYPE, mode='r',
+                                    shape=(total_frame_num, width))
+            if self.top_k is not None:
+                self.indices = np.memmap(join(cache_path, 'indices.bin'),
+                                         dtype=INDEX_DTYPE, mode='r',
+                                         shape=(total_frame_num, width))
+
+    def __len__(self):
+        return len(self.input_names)
+
+    def logit(self, i):
+        """
+        Args:
+            i: int, the index of the utterance
+        Returns:
+            A float32 numpy array of size `[frame_num, num_classes]`. Pruned
+                classes are PRUNED_LOGIT.
+        """
+        begin = self.offsets[i]
+        end = begin + self.frame_nums[i]
+        if self.top_k is None:
+            return self.logits[begin:end].astype(np.float32)
+        logits = np.full((end - begin, self.num_classes), PRUNED_LOGIT,
+                         dtype=np.float32)
+        logits[np.arange(end - begin)[:, None],
+               self.indices[begin:end].astype(np.int64)] = \
+            self.logits[begin:end]
+        return logits
+
+    def batches(self, batch_size):
+        """Iterate over mini-batches in the order of the cache.
+        Args:
+            batch_size: int, the size of mini-batch
+        Yields:
+            logits: A float32 numpy array of size
+                `[max_time, batch_size, num_classes]` (time-major) padded
+                with 0
+            seq_len: An int32 numpy array of size `[batch_size]`
+            labels: list of labels of ground truth
+        """
+        for begin in range(0, len(self), batch_size):
+            indices = range(begin, min(begin + batch_size, len(self)))
+            seq_len = self.frame_nums[begin:indices[-1] + 1].astype(np.int32)
+            logits = np.zeros((max(seq_len.max(), 1), len(seq_len),
+                               self.num_classes), dtype=np.float32)
+            for i_batch, i in enumerate(indices):
+                logits[:seq_len[i_batch], i_batch] = self.logit(i)
+            yield logits, seq_len, [self.labels[i] for i in indices]
+
+
+def save_logits(session, logits_op, seq_len_op, network, dataset, save_path,
+                eval_batch_size=None, top_k=None, meta=None,
+                is_progressbar=False):
+    """Compute logits of all utterances in the dataset and save them.
+    Args:
+        session: session of the restored model
+        logits_op: operation of logits, `[max_time, batch_size, num_classes]`
+        seq_len_op: operation of the length of logits, `[batch_size]`
+        network: network to evaluate
+        dataset: An instance of a `Dataset' class
+        save_path: path to save the cache
+        eval_batch_size: int, the size of mini-batch
+        top_k: int, the number of classes to keep in each frame
+        meta: dict, additional information saved in the cache
+        is_progressbar: if True, visualize the progressbar
+    Returns:
+        An instance of LogitCache
+    """
+    if dataset.data_num == 0:
+        # The number of classes is not known without logits
+        raise ValueError('The dataset is empty.')
+
+    if eval_batch_size is not None:
+        batch_size = eval_batch_size
+    else:
+        batch_size = dataset.batch_size
+
+    iteration = int(np.ceil(dataset.data_num / batch_size))
+    mini_batch = dataset.next_batch(batch_size=batch_size)
+
+    writer = None
+    try:
+        for step in wrap_iterator(range(iteration), is_progressbar):
+            inputs, labels_st, inputs_seq_len, input_names = \
+                mini_batch.__next__()
+            feed_dict = {
+                network.inputs: inputs,
+                network.inputs_seq_len: inputs_seq_len,
+                network.keep_prob_input: 1.0,
+                network.keep_prob_hidden: 1.0
+            }
+            logits, seq_len = session.run([logits_op, seq_len_op],
+                                          feed_dict=feed_dict)
+            if writer is None:
+                writer = LogitCacheWriter(save_path, logits.shape[2],
+                                          top_k=top_k, meta=meta)
+
+            labels = sparsetensor2list(labels_st, len(inputs_seq_len))
+            for i_batch, input_name in enumerate(input_names):
+                writer.add(input_name, logits[:seq_len[i_batch], i_batch],
+                           labels[i_batch])
+        writer.close()
+    except BaseException:
+        # Do not leave the incomplete cache (even when interrupted)
+        if writer is not None:
+            writer.abort()
+        raise
+
+    return LogitCache(save_path)
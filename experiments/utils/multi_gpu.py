@@ -0,0 +1,82 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Utilities for data parallel training with multiple GPUs."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import tensorflow as tf
+
+
+def split_batch(num_gpu, inputs, inputs_seq_len, *args):
+    """Split the mini-batch into num_gpu towers along the batch axis in numpy.
+       If the size of mini-batch is not divisible by num_gpu, utterances are
+       redistributed so that the sizes of towers differ by at most one. If the
+       size of mini-batch is less than num_gpu, utterances are repeated so that
+       each tower has at least one utterance. Inputs in each tower are trimmed
+       to the max frame num in the tower.
+    Args:
+        num_gpu: int, the number of GPUs
+        inputs: A numpy array of size `[batch_size, max_frame_num, input_size]`
+        inputs_seq_len: A numpy array of size `[batch_size]`
+        args: arrays or lists of size `[batch_size, ...]` to split in the
+            same way (labels, input_names etc.)
+    Returns:
+        inputs: list of inputs in each tower, size of num_gpu
+        inputs_seq_len: list of inputs_seq_len in each tower
+        args: lists of each argument in each tower
+    """
+    batch_size = len(inputs_seq_len)
+    if batch_size == 0:
+        raise ValueError('The mini-batch is empty.')
+    inputs_seq_len = np.asarray(inputs_seq_len)
+
+    # Pad by repeating utterances
+    indices = np.arange(max(batch_size, num_gpu)) % batch_size
+
+    inputs_tower, inputs_seq_len_tower = [], []
+    args_tower = [[] for _ in args]
+    for tower_indices in np.array_split(indices, num_gpu):
+        seq_len = inputs_seq_len[tower_indices]
+        inputs_tower.append(inputs[tower_indices, :seq_len.max()])
+        inputs_seq_len_tower.append(seq_len)
+        for i_arg, arg in enumerate(args):
+            if isinstance(arg, np.ndarray):
+                args_tower[i_arg].append(arg[tower_indices])
+            else:
+                args_tower[i_arg].append([arg[i] for i in tower_indices])
+
+    return (inputs_tower, inputs_seq_len_tower) + tuple(args_tower)
+
+
+def average_gradients(tower_grads):
+    """Calculate the average gradient for each shared variable across all
+       towers. This is the synchronization point across all towers.
+    Args:
+        tower_grads: list of lists of (gradient, variable) tuples. The outer
+            list is over towers. The inner list is over individual gradients
+            computed in each tower.
+    Returns:
+        average_grads: list of (gradient, variable) tuples where the gradient
+            has been averaged across all towers
+    """
+    average_grads = []
+    for grad_and_vars in zip(*tower_grads):
+        # grad_and_vars: ((grad0_gpu0, var0_gpu0), ..., (grad0_gpuN, var0_gpuN))
+        grads = [tf.expand_dims(g, 0) for g, _ in grad_and_vars
+                 if g is not None]
+        if len(grads) == 0:
+            continue
+
+        # Average over the 'tower' dimension
+        grad = tf.reduce_mean(tf.concat(axis=0, values=grads), 0)
+
+        # Variables are shared across towers, so return the first tower's
+        # pointer to the variable
+        var = grad_and_vars[0][1]
+        average_grads.append((grad, var))
+
+    return average_grads
@@ -0,0 +1,189 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Character/phone n-gram language model for decoding of CTC models.
+   Probabilities are interpolated with lower orders:
+       P(w|h) = (c(h, w) + alpha * P(w|h')) / (c(h) + alpha)
+   where h' is h without the oldest token, down to the uniform distribution.
+   The end of sentence is the index vocab_size.
+
+   The state of the LM is the last (order - 1) tokens. Log probabilities of
+   all tokens are computed only once per state and kept in a table, so that
+   the beam search gathers the rows of all hypotheses at once.
+
+   Usage (in experiments/):
+       python -m utils.ngram_lm path_to_dataset vocab_size save_path [order]
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+from os.path import join
+import sys
+import pickle
+from collections import defaultdict
+import numpy as np
+
+
+BOS = -1
+
+
+class NgramLM(object):
+    """
+    Args:
+        vocab_size: int, the number of tokens (except the blank class)
+        order: int, the order of n-gram
+        alpha: float, the weight of lower orders in interpolation
+    """
+
+    def __init__(self, vocab_size, order=3, alpha=1.0):
+        if order < 1:
+            raise ValueError('order must be more than 0.')
+        self.vocab_size = vocab_size
+        self.order = order
+        self.alpha = alpha
+
+        # counts[n][context of n tokens] => {token: count}
+        self.counts = [defaultdict(lambda: defaultdict(int))
+                       for _ in range(order)]
+        self._reset_states()
+
+    def _reset_states(self):
+        self.states = []
+        self.state2id = {}
+        self.rows = []
+        self.transitions = {}
+
+    def fit(self, label_list):
+        """Count n-grams.
+        Args:
+            label_list: list of label sequences
+        """
+        for labels in label_list:
+            tokens = [BOS] * (self.order - 1) + \
+                [int(x) for x in labels] + [self.vocab_size]
+            for i in range(self.order - 1, len(tokens)):
+                for n in range(self.order):
+                    context = tuple(tokens[i - n:i])
+                    self.counts[n][context][tokens[i]] += 1
+        self._reset_states()
+        return self
+
+    def _prob(self, history):
+        """
+        Args:
+            history: tuple of the last (order - 1) tokens
+        Returns:
+            A float64 numpy array of size `[vocab_size + 1]`
+        """
+        prob = np.full((self.vocab_size + 1,), 1 / (self.vocab_size + 1))
+        for n in range(self.order):
+            context = history[len(history) - n:] if n > 0 else ()
+            counts = self.counts[n].get(context)
+            if counts is None:
+                # Back off to the lower order
+                continue
+            count_vec = np.zeros((self.vocab_size + 1,))
+            count_vec[list(counts.keys())] = list(counts.values())
+            prob = (count_vec + self.alpha * prob) / \
+                (count_vec.sum() + self.alpha)
+        return prob
+
+    def _state_id(self, history):
+        state_id = self.state2id.get(history)
+        if state_id is None:
+            state_id = len(self.states)
+            self.state2id[history] = state_id
+            self.states.append(history)
+            self.rows.append(np.log(self._prob(history)).astype(np.float32))
+        return state_id
+
+    def initial_state(self):
+        """
+        Returns:
+            int, the state at the beginning of sentence
+        """
+        return self._state_id((BOS,) * (self.order - 1))
+
+    def next_state(self, state_id, token):
+        """
+        Args:
+            state_id: int, the current state
+            token: int, the next token
+        Returns:
+            int, the state after token
+        """
+        key = (state_id, token)
+        next_state_id = self.transitions.get(key)
+        if next_state_id is None:
+            history = self.states[state_id] + (int(token),)
+            next_state_id = self._state_id(history[1:] if self.order > 1
+                                           else ())
+            self.transitions[key] = next_state_id
+        return next_state_id
+
+    def logprob_rows(self, state_ids):
+        """
+        Args:
+            state_ids: list or numpy array of states
+        Returns:
+            A float32 numpy array of size `[len(state_ids), vocab_size + 1]`.
+                The last column is the end of sentence.
+        """
+        return np.stack([self.rows[state_id] for state_id in state_ids])
+
+    def __getstate__(self):
+        # The table of states is made again in each process
+        counts = [dict((context, dict(tokens))
+                       for context, tokens in counts_n.items())
+                  for counts_n in self.counts]
+        return {'vocab_size': self.vocab_size, 'order': self.order,
+                'alpha': self.alpha, 'counts': counts}
+
+    def __setstate__(self, state):
+        self.vocab_size = state['vocab_size']
+        self.order = state['order']
+        self.alpha = state['alpha']
+        self.counts = [defaultdict(lambda: defaultdict(int))
+                       for _ in range(self.order)]
+        for counts_n, state_counts_n in zip(self.counts, state['counts']):
+            for context, tokens in state_counts_n.items():
+                counts_n[context].update(tokens)
+        self._reset_states()
+
+    def save(self, save_path):
+        with open(save_path, 'wb') as f:
+            pickle.dump(self, f)
+
+
+def load_ngram_lm(save_path):
+    """
+    Args:
+        save_path: path to the LM saved by NgramLM.save()
+    Returns:
+        An instance of NgramLM
+    """
+    with open(save_path, 'rb') as f:
+        return pickle.load(f)
+
+
+if __name__ == '__main__':
+
+    args = sys.argv
+    if len(args) not in [4, 5]:
+        raise ValueError(
+            ("Set a path to the training dataset.\n"
+             "Usase: python -m utils.ngram_lm path_to_dataset vocab_size "
+             "save_path [order]"))
+    label_list = []
+    for dir_path, _, file_names in os.walk(join(args[1], 'label')):
+        for file_name in sorted(file_names):
+            if file_name.endswith('.npy'):
+                label_list.append(np.load(join(dir_path, file_name)))
+    order = int(args[4]) if len(args) == 5 else 3
+    lm = NgramLM(int(args[2]), order=order).fit(label_list)
+    lm.save(args[3])
+    print('%d-gram LM of %d utterances saved in %s' %
+          (order, len(label_list), args[3]))
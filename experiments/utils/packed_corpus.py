@@ -0,0 +1,292 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Packed & memory-mapped corpus format.
+   A dataset directory in the per-utterance layout
+       frame_num.pickle
+       input/(speaker/)*.npy
+       label/(speaker/)*.npy
+   is converted into
+       packed/inputs.bin: float32 features of all utterances,
+           `[total_frame_num, input_size]`
+       packed/labels.bin: concatenated labels of all utterances
+       packed/index.pickle: offsets & lengths of each utterance
+   Both blobs are opened with np.memmap, so that each utterance is sliced
+   without copy.
+
+   Usage (in experiments/):
+       python -m utils.packed_corpus path_to_dataset [path_to_dataset ...]
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+from os.path import join, isfile, isdir
+import sys
+import fcntl
+import shutil
+import pickle
+from contextlib import contextmanager
+import numpy as np
+
+from .progressbar import wrap_iterator
+from .frame_stack import _stack_utterance
+
+
+INPUT_DTYPE = np.float32
+
+
+def pack_dataset(dataset_path, save_path=None, is_progressbar=False,
+                 num_stack=None, num_skip=None):
+    """Convert the per-utterance dataset to the packed format.
+    Args:
+        dataset_path: path to the dataset including frame_num.pickle
+        save_path: path to save the packed dataset. If None, save in
+            dataset_path/packed
+        is_progressbar: if True, visualize progressbar
+        num_stack: int, if set with num_skip, pack frame-stacked inputs
+        num_skip: int, the number of frames to skip
+    Returns:
+        save_path: path to the packed dataset
+    """
+    if save_path is None:
+        save_path = join(dataset_path, 'packed')
+
+    # Load the frame number dictionary
+    frame_num_dict_path = join(dataset_path, 'frame_num.pickle')
+    if not isfile(frame_num_dict_path):
+        # Attention datasets
+        frame_num_dict_path = join(dataset_path, 'frame_num_dict.pickle')
+    with open(frame_num_dict_path, 'rb') as f:
+        frame_num_dict = pickle.load(f)
+
+    # Sort by frame num in the same way as DataSet
+    frame_num_tuple_sorted = sorted(frame_num_dict.items(), key=lambda x: x[1])
+
+    input_names = [input_name for input_name, _ in frame_num_tuple_sorted]
+    input_iter = (np.load(_utterance_path(dataset_path, 'input', input_name))
+                  for input_name in input_names)
+    if num_stack is not None and num_skip is not None:
+        input_iter = (_stack_utterance(
+            data_i, (data_i.shape[0] + num_skip - 1) // num_skip,
+            num_stack, num_skip) for data_i in input_iter)
+    label_iter = (np.load(_utterance_path(dataset_path, 'label', input_name))
+                  for input_name in input_names)
+    write_packed_corpus(save_path, input_names,
+                        wrap_iterator(input_iter, is_progressbar), label_iter)
+
+    return save_path
+
+
+@contextmanager
+def file_lock(lock_path):
+    """Hold an exclusive lock of the file while in the context. The lock
+       file is kept after unlocking, so that all processes lock the same
+       file.
+    Args:
+        lock_path: path to the lock file
+    """
+    with open(lock_path, 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def open_or_pack(dataset_path, save_path, num_stack=None, num_skip=None,
+                 is_progressbar=False):
+    """Open the packed dataset. If it does not exist, pack the dataset first.
+       Only one process packs the dataset, and the others wait for it.
+    Args:
+        dataset_path: path to the dataset including frame_num.pickle
+        save_path: path to the packed dataset
+        num_stack: int, if set with num_skip, pack frame-stacked inputs
+        num_skip: int, the number of frames to skip
+        is_progressbar: if True, visualize progressbar
+    Returns:
+        An instance of PackedCorpus
+    """
+    if not isdir(save_path):
+        parent_path = os.path.dirname(save_path)
+        if not isdir(parent_path):
+            try:
+                os.makedirs(parent_path)
+            except OSError:
+                # Made by another process
+                pass
+        with file_lock(save_path + '.lock'):
+            if not isdir(save_path):
+                print('=> Packing %s to %s...' % (dataset_path, save_path))
+                # Write into a temporary directory and rename it, so that
+                # other processes never open an incomplete dataset
+                tmp_path = save_path + '.tmp%d' % os.getpid()
+                try:
+                    pack_dataset(dataset_path, save_path=tmp_path,
+                                 is_progressbar=is_progressbar,
+                                 num_stack=num_stack, num_skip=num_skip)
+                    os.rename(tmp_path, save_path)
+                except BaseException:
+                    # Do not leave the incomplete dataset (even when
+                    # interrupted), which stays in memory in /dev/shm
+                    shutil.rmtree(tmp_path, ignore_errors=True)
+                    raise
+    return PackedCorpus(save_path)
+
+
+def write_packed_corpus(save_path, input_names, input_iter, label_iter):
+    """Write inputs & labels in the packed format.
+    Args:
+        save_path: path to save the packed dataset
+        input_names: list of the names of utterances
+        input_iter: iterator of inputs of each utterance,
+            `[frame_num, input_size]`
+        label_iter: iterator of labels of each utterance, `[label_len]`
+    """
+    if not os.path.isdir(save_path):
+        os.makedirs(save_path)
+
+    input_offsets = np.zeros((len(input_names),), dtype=np.int64)
+    frame_nums = np.zeros((len(input_names),), dtype=np.int64)
+    label_list = []
+    input_size = None
+    offset = 0
+    with open(join(save_path, 'inputs.bin'), 'wb') as f:
+        for i, (data_i, label_i) in enumerate(zip(input_iter, label_iter)):
+            if input_size is None:
+                input_size = data_i.shape[1]
+            elif data_i.shape[1] != input_size:
+                raise ValueError('The dimensions of inputs are not same.')
+            f.write(np.ascontiguousarray(data_i, dtype=INPUT_DTYPE).tobytes())
+            input_offsets[i] = offset
+            frame_nums[i] = data_i.shape[0]
+            offset += data_i.shape[0]
+            label_list.append(np.asarray(label_i))
+
+    # Labels are indices except for some test sets (raw strings)
+    label_lens = np.array(list(map(len, label_list)), dtype=np.int64)
+    label_offsets = np.zeros((len(label_list),), dtype=np.int64)
+    label_offsets[1:] = np.cumsum(label_lens)[:-1]
+    if label_lens.sum() > 0:
+        labels = np.concatenate(label_list)
+    else:
+        labels = np.zeros((0,), dtype=np.int32)
+    if labels.dtype.kind in 'iub':
+        labels = labels.astype(np.int32)
+    elif labels.dtype.kind == 'O':
+        labels = labels.astype(np.str_)
+    with open(join(save_path, 'labels.bin'), 'wb') as f:
+        f.write(np.ascontiguousarray(labels).tobytes())
+
+    index = {
+        'input_names': list(input_names),
+        'input_offsets': input_offsets,
+        'frame_nums': frame_nums,
+        'input_size': input_size,
+        'label_offsets': label_offsets,
+        'label_lens': label_lens,
+        'label_dtype': labels.dtype.str,
+    }
+    with open(join(save_path, 'index.pickle'), 'wb') as f:
+        pickle.dump(index, f)
+
+
+def _utterance_path(dataset_path, data_dir, input_name):
+    """Return the path to the .npy file of the utterance. CSJ datasets are
+       divided into each speaker directory.
+    Args:
+        dataset_path: path to the dataset
+        data_dir: input or label
+        input_name: string, the name of the utterance
+    Returns:
+        path to the .npy file
+    """
+    path = join(dataset_path, data_dir, input_name + '.npy')
+    if isfile(path):
+        return path
+    speaker_name = input_name.split('_')[0]
+    return join(dataset_path, data_dir, speaker_name, input_name + '.npy')
+
+
+class PackedCorpus(object):
+    """Read the packed dataset. Both inputs & labels are memory-mapped.
+    Args:
+        packed_path: path to the packed dataset
+    """
+
+    def __init__(self, packed_path):
+        self.packed_path = packed_path
+
+        with open(join(packed_path, 'index.pickle'), 'rb') as f:
+            index = pickle.load(f)
+        self.input_names = index['input_names']
+        self.input_offsets = index['input_offsets']
+        self.frame_nums = index['frame_nums']
+        self.input_size = index['input_size']
+        self.label_offsets = index['label_offsets']
+        self.label_lens = index['label_lens']
+        self.label_dtype = np.dtype(index['label_dtype'])
+
+        self.name2index = dict(
+            zip(self.input_names, range(len(self.input_names))))
+
+        total_frame_num = int(self.frame_nums.sum())
+        if total_frame_num > 0:
+            self.inputs = np.memmap(join(packed_path, 'inputs.bin'),
+                                    dtype=INPUT_DTYPE, mode='r',
+                                    shape=(total_frame_num, self.input_size))
+        else:
+            self.inputs = np.zeros((0, self.input_size), dtype=INPUT_DTYPE)
+        total_label_len = int(self.label_lens.sum())
+        if total_label_len > 0:
+            self.labels = np.memmap(join(packed_path, 'labels.bin'),
+                                    dtype=self.label_dtype, mode='r',
+                                    shape=(total_label_len,))
+        else:
+            self.labels = np.zeros((0,), dtype=self.label_dtype)
+
+    def __len__(self):
+        return len(self.input_names)
+
+    def index(self, input_name):
+        """
+        Args:
+            input_name: string, the name of the utterance
+        Returns:
+            int, the index of the utterance in the packed dataset
+        """
+        return self.name2index[input_name]
+
+    def input(self, i):
+        """
+        Args:
+            i: int, the index of the utterance
+        Returns:
+            A view of the memory-mapped inputs, `[frame_num, input_size]`
+        """
+        offset = self.input_offsets[i]
+        return self.inputs[offset:offset + self.frame_nums[i]]
+
+    def label(self, i):
+        """
+        Args:
+            i: int, the index of the utterance
+        Returns:
+            A view of the memory-mapped labels, `[label_len]`
+        """
+        offset = self.label_offsets[i]
+        return self.labels[offset:offset + self.label_lens[i]]
+
+
+if __name__ == '__main__':
+
+    args = sys.argv
+    if len(args) < 2:
+        raise ValueError(
+            ("Set paths to datasets.\n"
+             "Usase: python -m utils.packed_corpus path_to_dataset ..."))
+    for dataset_path in args[1:]:
+        print('=> Packing ' + dataset_path + '...')
+        print('Saved in ' + pack_dataset(dataset_path, is_progressbar=True))
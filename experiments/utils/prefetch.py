@@ -0,0 +1,114 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Prepare mini-batches in the background while the model is running.
+   Mini-batches are made in a background thread of the main process, so
+   that the sampler, the cache and the buffer pool of the dataset are
+   shared with the main thread. numpy and file I/O release GIL while they
+   are working.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import threading
+import traceback
+import numpy as np
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+class _WorkerError(object):
+    """Wrap an exception raised in the worker."""
+
+    def __init__(self, message):
+        self.message = message
+
+
+def _copy_arrays(batch):
+    """Copy numpy arrays in a mini-batch.
+    Args:
+        batch: A numpy array, or tuple or list of them (nested)
+    Returns:
+        A copy of batch. Objects other than numpy arrays are not copied.
+    """
+    if isinstance(batch, np.ndarray):
+        return batch.copy()
+    if isinstance(batch, tuple):
+        return tuple(_copy_arrays(x) for x in batch)
+    if isinstance(batch, list):
+        return [_copy_arrays(x) for x in batch]
+    return batch
+
+
+def _produce(mini_batch, batch_queue, is_copied=False):
+    """Put mini-batches into the queue until the generator stops.
+    Args:
+        mini_batch: A generator of mini-batches
+        batch_queue: A queue to put mini-batches
+        is_copied: if True, put copies of mini-batches
+    """
+    try:
+        for batch in mini_batch:
+            if is_copied:
+                batch = _copy_arrays(batch)
+            batch_queue.put(batch)
+        batch_queue.put(StopIteration())
+    except Exception:
+        batch_queue.put(_WorkerError(traceback.format_exc()))
+
+
+class Prefetcher(object):
+    """Wrap the generator made by `DataSet.next_batch()`. Mini-batches are
+       made by a background thread in advance, so that the (N+1)-th
+       mini-batch is prepared while the N-th step is running. The order of
+       mini-batches is the same as that of the original generator.
+       Note that the state of the dataset (e.g. the rest of the epoch) is
+       shared with the other generators of the same dataset.
+    Args:
+        mini_batch: A generator of mini-batches
+        queue_size: int, the maximum number of mini-batches prepared in
+            advance
+        pool: An instance of BufferPool (utils/buffer_pool.py) which the
+            mini-batches are views of (e.g. `dataset.pool`). Up to
+            queue_size + 2 mini-batches are alive at the same time, so the
+            pool is increased to keep them from being overwritten. If None,
+            numpy arrays in mini-batches are copied instead.
+    """
+
+    def __init__(self, mini_batch, queue_size=2, pool=None):
+        if queue_size < 1:
+            raise ValueError('queue_size must be more than 0.')
+
+        self.queue_size = queue_size
+
+        # The worker holds one mini-batch waiting for the queue, and the
+        # main thread holds the last one in addition to the queue
+        if pool is not None:
+            pool.reserve(queue_size + 2)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.worker = threading.Thread(target=_produce,
+                                       args=(mini_batch, self.queue,
+                                             pool is None))
+        # The worker never stops because next_batch() is an infinite loop,
+        # and it is stopped when the main thread exits
+        self.worker.daemon = True
+        self.worker.start()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        batch = self.queue.get()
+        if isinstance(batch, StopIteration):
+            raise StopIteration
+        if isinstance(batch, _WorkerError):
+            raise RuntimeError(
+                'Error occurred in making mini-batch:\n' + batch.message)
+        return batch
+
+    # For python2
+    next = __next__
@@ -0,0 +1,251 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Samplers to decide which utterances are packed into each mini-batch.
+   Each sampler keeps the order of utterances in the current epoch and a
+   cursor, so that making a mini-batch does not depend on the dataset size.
+   The state can be saved by state_dict() (picklable) and restored by
+   load_state_dict() to resume training from the middle of an epoch.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+
+
+class Sampler(object):
+    """Base class of samplers.
+    Args:
+        seed: int, the random seed
+    """
+
+    def __init__(self, seed=None):
+        self.rng = np.random.RandomState(seed)
+        self.epoch = 0
+        self.cursor = 0
+
+    def sample(self, batch_size=None):
+        """Return the next mini-batch.
+        Args:
+            batch_size: int, the size of mini-batch
+        Returns:
+            indices: numpy array of indices of utterances
+            next_epoch_flag: if True, the returned mini-batch is the last one
+                in the epoch
+        """
+        raise NotImplementedError
+
+    def state_dict(self):
+        """
+        Returns:
+            state: dict, the state of the sampler
+        """
+        return {'epoch': self.epoch,
+                'cursor': self.cursor,
+                'rng_state': self.rng.get_state()}
+
+    def load_state_dict(self, state):
+        """
+        Args:
+            state: dict, the state returned by state_dict()
+        """
+        self.epoch = state['epoch']
+        self.cursor = state['cursor']
+        self.rng.set_state(state['rng_state'])
+
+
+class RandomSampler(Sampler):
+    """Sample mini-batches at random. The order of utterances is shuffled
+       every epoch.
+    Args:
+        data_num: int, the number of utterances
+        batch_size: int, the default size of mini-batch
+        seed: int, the random seed
+    """
+
+    def __init__(self, data_num, batch_size, seed=None):
+        super(RandomSampler, self).__init__(seed)
+        if data_num < 1:
+            raise ValueError('There are no utterances.')
+        self.data_num = data_num
+        self.batch_size = batch_size
+        self.order = self._make_order()
+
+    def _make_order(self):
+        """Make the order of utterances in one epoch.
+        Returns:
+            order: numpy array of indices of utterances
+        """
+        return self.rng.permutation(self.data_num)
+
+    def sample(self, batch_size=None):
+        if batch_size is None:
+            batch_size = self.batch_size
+
+        if self.data_num - self.cursor > batch_size:
+            indices = self.order[self.cursor:self.cursor + batch_size]
+            self.cursor += batch_size
+            return indices, False
+
+        # The rest of the epoch
+        indices = self.order[self.cursor:]
+
+        # Next epoch
+        self.epoch += 1
+        self.order = self._make_order()
+        self.cursor = 0
+        return indices, True
+
+    def state_dict(self):
+        state = super(RandomSampler, self).state_dict()
+        state['order'] = self.order
+        return state
+
+    def load_state_dict(self, state):
+        super(RandomSampler, self).load_state_dict(state)
+        self.order = state['order']
+
+
+class SortedSampler(RandomSampler):
+    """Sample mini-batches in the order of frame num. Utterances are assumed
+       to be sorted by frame num in advance. The order of utterances in each
+       mini-batch is shuffled.
+    Args:
+        data_num: int, the number of utterances
+        batch_size: int, the default size of mini-batch
+        seed: int, the random seed
+    """
+
+    def _make_order(self):
+        return np.arange(self.data_num)
+
+    def sample(self, batch_size=None):
+        indices, next_epoch_flag = super(SortedSampler, self).sample(
+            batch_size)
+        # Shuffle selected mini-batch
+        return self.rng.permutation(indices), next_epoch_flag
+
+
+class SequentialSampler(RandomSampler):
+    """Sample mini-batches in the order of utterances without shuffling.
+       Utterances are assumed to be sorted by frame num in advance, so that
+       each mini-batch has the least padding. Used for evaluation, where the
+       results of utterances come out in the order of the dataset.
+    Args:
+        data_num: int, the number of utterances
+        batch_size: int, the default size of mini-batch
+        seed: int, not used
+    """
+
+    def _make_order(self):
+        return np.arange(self.data_num)
+
+
+class BucketSampler(Sampler):
+    """Make mini-batches from buckets of utterances of similar lengths.
+       The size of mini-batches in each bucket is fixed within the budget
+       of padded frames (the size of mini-batch * the max frame num in the
+       bucket), so that mini-batches of short utterances become large and
+       those of long utterances become small. Utterances are shuffled
+       within each bucket and mini-batches are shuffled across buckets every
+       epoch. The number of mini-batches in an epoch does not change, so
+       that training loops can count the steps of an epoch by len().
+    Args:
+        frame_nums: list of frame nums of each utterance
+        frame_budget: int, the maximum number of padded frames in a
+            mini-batch. An utterance longer than this is made into a
+            mini-batch by itself.
+        num_bucket: int, the number of buckets. Utterances are divided into
+            buckets of the same size in the order of frame num.
+        max_batch_size: int, the maximum size of mini-batch. If None, the
+            size of mini-batch is limited by only frame_budget.
+        seed: int, the random seed
+    """
+
+    def __init__(self, frame_nums, frame_budget, num_bucket=10,
+                 max_batch_size=None, seed=None):
+        if frame_budget < 1:
+            raise ValueError('frame_budget must be more than 0.')
+        if num_bucket < 1:
+            raise ValueError('num_bucket must be more than 0.')
+
+        super(BucketSampler, self).__init__(seed)
+        self.frame_nums = np.asarray(frame_nums, dtype=np.int64)
+        self.frame_budget = frame_budget
+        self.num_bucket = num_bucket
+        self.max_batch_size = max_batch_size
+
+        if len(self.frame_nums) == 0:
+            raise ValueError('There are no utterances.')
+
+        # Utterances longer than frame_budget are made into mini-batches by
+        # themselves
+        order = np.argsort(self.frame_nums, kind='mergesort')
+        is_long = self.frame_nums[order] > frame_budget
+        self.long_indices = order[is_long]
+        order = order[~is_long]
+
+        # Divide utterances into buckets. The size of mini-batches in each
+        # bucket is decided by the longest utterance in it.
+        self.buckets, self.batch_sizes = [], []
+        if len(order) > 0:
+            self.buckets = np.array_split(order, min(num_bucket, len(order)))
+        for bucket in self.buckets:
+            batch_size = frame_budget // max(self.frame_nums[bucket[-1]], 1)
+            if max_batch_size is not None:
+                batch_size = min(batch_size, max_batch_size)
+            self.batch_sizes.append(max(batch_size, 1))
+
+        self.batches = self._make_batches()
+
+    def __len__(self):
+        """Return the number of mini-batches in an epoch."""
+        return len(self.batches)
+
+    def _make_batches(self):
+        """Make mini-batches of one epoch.
+        Returns:
+            batches: list of numpy arrays of indices of utterances
+        """
+        batches = [self.long_indices[i:i + 1]
+                   for i in range(len(self.long_indices))]
+        for bucket, batch_size in zip(self.buckets, self.batch_sizes):
+            bucket = self.rng.permutation(bucket)
+            batches.extend(bucket[i:i + batch_size]
+                           for i in range(0, len(bucket), batch_size))
+
+        # Shuffle mini-batches across buckets
+        self.rng.shuffle(batches)
+        return batches
+
+    def sample(self, batch_size=None):
+        """Return the next mini-batch.
+        Args:
+            batch_size: not used. The size of mini-batch is decided by
+                frame_budget.
+        Returns:
+            indices: numpy array of indices of utterances
+            next_epoch_flag: if True, the returned mini-batch is the last one
+                in the epoch
+        """
+        indices = self.batches[self.cursor]
+        self.cursor += 1
+        if self.cursor < len(self.batches):
+            return indices, False
+
+        # Next epoch
+        self.epoch += 1
+        self.batches = self._make_batches()
+        self.cursor = 0
+        return indices, True
+
+    def state_dict(self):
+        state = super(BucketSampler, self).state_dict()
+        state['batches'] = self.batches
+        return state
+
+    def load_state_dict(self, state):
+        super(BucketSampler, self).load_state_dict(state)
+        self.batches = state['batches']
@@ -0,0 +1,126 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Score decoded mini-batches in worker processes.
+   Decoding (session.run) continues in the main thread while the workers
+   convert labels, compute edit distance and return error counts, which are
+   accumulated over the corpus. The metric is computed when all mini-batches
+   are scored.
+
+   Workers are started by the forkserver, not forked from the caller, because
+   forking a process in which a TensorFlow session has started its thread
+   pools can deadlock.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import re
+from collections import deque
+from multiprocessing import get_context
+import numpy as np
+
+from .edit_distance import edit_distance_batch
+
+
+class Scorer(object):
+    """Apply score_func to decoded mini-batches in a pool of processes and
+       sum up the results.
+    Args:
+        score_func: A function at the module level, which returns a tuple of
+            numbers (e.g. error counts) of a mini-batch
+        num_worker: int, the number of processes. If 0, mini-batches are
+            scored in the main thread when submitted. Use 0 in training
+            loops, so that workers are not started in every evaluation.
+        queue_size: int, the maximum number of mini-batches waiting for
+            scoring. submit() blocks when the queue is full.
+    """
+
+    def __init__(self, score_func, num_worker=2, queue_size=8):
+        self.score_func = score_func
+        self.queue_size = queue_size
+        self.pool = None
+        if num_worker > 0:
+            self.pool = get_context('forkserver').Pool(num_worker)
+        self.pending = deque()
+        self.total = None
+
+    def _accumulate(self, score):
+        if self.total is None:
+            self.total = list(score)
+        else:
+            for i, value in enumerate(score):
+                self.total[i] += value
+
+    def submit(self, *args):
+        """Score a mini-batch asynchronously.
+        Args:
+            args: arguments of score_func
+        """
+        if self.pool is None:
+            self._accumulate(self.score_func(*args))
+            return
+        while len(self.pending) >= self.queue_size:
+            self._accumulate(self.pending.popleft().get())
+        self.pending.append(self.pool.apply_async(self.score_func, args))
+
+    def result(self):
+        """Wait for all mini-batches & stop workers. If no mini-batch was
+           submitted (e.g. the dataset is empty), ValueError is raised.
+        Returns:
+            total: list of the sums of the results of score_func
+        """
+        while len(self.pending) > 0:
+            self._accumulate(self.pending.popleft().get())
+        self.close()
+        if self.total is None:
+            raise ValueError('No mini-batch was scored. '
+                             'The dataset may be empty.')
+        return self.total
+
+    def close(self):
+        """Stop workers. Mini-batches not scored yet are discarded."""
+        if self.pool is not None:
+            if len(self.pending) > 0:
+                self.pool.terminate()
+            else:
+                self.pool.close()
+            self.pool.join()
+            self.pool = None
+        self.pending.clear()
+
+
+def score_labels(labels_true, labels_pred):
+    """Compute error counts of a mini-batch.
+    Args:
+        labels_true: list of reference sequences of indices
+        labels_pred: list of hypothesis sequences of indices
+    Returns:
+        error_rate_sum: float, the sum of error rates of utterances
+        utt_num: int, the number of utterances
+        substitution: int, the number of substitutions
+        insertion: int, the number of insertions
+        deletion: int, the number of deletions
+        ref_len: int, the total length of references
+    """
+    distance, substitution, insertion, deletion, ref_len = \
+        edit_distance_batch(labels_true, labels_pred)
+    return (float((distance / np.maximum(ref_len, 1)).sum()),
+            len(labels_true), int(substitution.sum()),
+            int(insertion.sum()), int(deletion.sum()), int(ref_len.sum()))
+
+
+def score_strings(str_true_list, str_pred_list, ignore_pattern=r'[_]+'):
+    """Compute error counts of characters of a mini-batch.
+    Args:
+        str_true_list: list of reference strings
+        str_pred_list: list of hypothesis strings
+        ignore_pattern: regular expression of characters to remove (silence)
+    Returns:
+        The same as score_labels()
+    """
+    def to_codes(str_list):
+        return [[ord(c) for c in re.sub(ignore_pattern, '', str_i)]
+                for str_i in str_list]
+    return score_labels(to_codes(str_true_list), to_codes(str_pred_list))
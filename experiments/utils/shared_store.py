@@ -0,0 +1,93 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Feature store in shared memory for concurrent training jobs.
+   The first process packs the (frame-stacked) dataset in the packed format
+   (see packed_corpus.py) into /dev/shm, and later processes attach it
+   read-only with np.memmap. All processes share one copy of the features
+   in the page cache, and the startup after the first one costs almost
+   nothing.
+   The store remains until it is removed explicitly. The store is keyed by
+   the fingerprint of the dataset (see stack_cache.py), so that a new store
+   is published when the dataset is made again.
+
+   Usage (in experiments/):
+       python -m utils.shared_store remove path_to_dataset num_stack num_skip
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from os.path import join, isdir, abspath
+import sys
+import shutil
+import hashlib
+
+from .packed_corpus import open_or_pack, file_lock
+from .stack_cache import fingerprint
+
+
+SHM_DIR = '/dev/shm'
+
+
+def store_path(dataset_path, num_stack=None, num_skip=None, shm_dir=SHM_DIR):
+    """Return the path to the store of the dataset.
+    Args:
+        dataset_path: path to the dataset including frame_num.pickle
+        num_stack: int, the number of frames to stack
+        num_skip: int, the number of frames to skip
+        shm_dir: path to the directory in shared memory
+    Returns:
+        path to the store
+    """
+    key = '%s:%s:%s:%s' % (abspath(dataset_path), str(num_stack),
+                           str(num_skip), fingerprint(dataset_path))
+    key = hashlib.md5(key.encode('utf-8')).hexdigest()[:16]
+    return join(shm_dir, 'feature_store_' + key)
+
+
+def open_store(dataset_path, num_stack=None, num_skip=None, shm_dir=SHM_DIR,
+               is_progressbar=False):
+    """Attach the store of the dataset. If it does not exist, publish it.
+       Only one process publishes the store, and the others wait for it.
+    Args:
+        dataset_path: path to the dataset including frame_num.pickle
+        num_stack: int, the number of frames to stack
+        num_skip: int, the number of frames to skip
+        shm_dir: path to the directory in shared memory
+        is_progressbar: if True, visualize progressbar
+    Returns:
+        An instance of PackedCorpus of (frame-stacked) inputs & labels
+    """
+    return open_or_pack(dataset_path,
+                        store_path(dataset_path, num_stack, num_skip, shm_dir),
+                        num_stack=num_stack, num_skip=num_skip,
+                        is_progressbar=is_progressbar)
+
+
+def remove_store(dataset_path, num_stack=None, num_skip=None,
+                 shm_dir=SHM_DIR):
+    """Remove the store of the dataset. Processes attaching the store can
+       continue to read it until they exit. The lock file is kept, because
+       processes waiting for the lock hold the same file.
+    Args:
+        dataset_path: path to the dataset including frame_num.pickle
+        num_stack: int, the number of frames to stack
+        num_skip: int, the number of frames to skip
+        shm_dir: path to the directory in shared memory
+    """
+    path = store_path(dataset_path, num_stack, num_skip, shm_dir)
+    with file_lock(path + '.lock'):
+        if isdir(path):
+            shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+
+    args = sys.argv
+    if len(args) != 5 or args[1] != 'remove':
+        raise ValueError(
+            ("Usase: python -m utils.shared_store remove path_to_dataset "
+             "num_stack num_skip"))
+    remove_store(args[2], num_stack=int(args[3]), num_skip=int(args[4]))
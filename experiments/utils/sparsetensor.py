@@ -9,28 +9,53 @@ import numpy as np
 import tensorflow as tf
 
 
+def _pad_labels(labels, padded_value):
+    """Convert ragged labels to a padded numpy array.
+    Args:
+        labels: list of labels or a numpy array of size `[batch_size, max_len]`
+        padded_value: int, the value used for padding
+    Returns:
+        labels: A numpy array of size `[batch_size, max_len]`
+        labels_seq_len: A numpy array of size `[batch_size]`
+    """
+    if isinstance(labels, np.ndarray) and labels.ndim == 2:
+        # Labels after the first padded value are ignored
+        is_label = np.cumprod(labels != padded_value, axis=1).astype(bool)
+        return labels, is_label.sum(axis=1)
+
+    labels_seq_len = np.array([len(l) for l in labels], dtype=np.int64)
+    max_len = labels_seq_len.max() if len(labels_seq_len) > 0 else 0
+    labels_padded = np.full((len(labels), max(max_len, 1)),
+                            padded_value, dtype=np.int64)
+    if labels_seq_len.sum() > 0:
+        is_label = np.arange(labels_padded.shape[1]) < labels_seq_len[:, None]
+        labels_padded[is_label] = np.concatenate(
+            [np.asarray(l, dtype=np.int64).reshape(-1) for l in labels])
+    return _pad_labels(labels_padded, padded_value)
+
+
 def list2sparsetensor(labels, padded_value=-1):
     """Convert labels from list to sparse tensor.
     Args:
-        labels: list of labels
+        labels: list of labels, or a numpy array of size `[batch_size, max_len]`
+            padded with padded_value. Empty labels are allowed.
         padded_value: int, the value used for padding
     Returns:
         labels_st: A SparseTensor of labels,
             list of indices, values, dense_shape
     """
-    indices, values = [], []
-    for i_utt, each_label in enumerate(labels):
-        for i_l, l in enumerate(each_label):
-            # -1 means empty
-            # Plaese see details in
-            # some_timit/data/read_dataset_ctc.py
-            if l == padded_value:
-                break
-            indices.append([i_utt, i_l])
-            values.append(l)
-    dense_shape = [len(labels), np.asarray(indices).max(0)[1] + 1]
-    labels_st = [np.array(indices, dtype=np.int64),
-                 np.array(values, dtype=np.int32),
+    labels, labels_seq_len = _pad_labels(labels, padded_value)
+
+    # -1 means empty
+    # Plaese see details in
+    # some_timit/data/read_dataset_ctc.py
+    is_label = np.arange(labels.shape[1]) < labels_seq_len[:, None]
+    indices = np.stack(np.nonzero(is_label), axis=1).astype(np.int64)
+    values = labels[is_label].astype(np.int32)
+    max_len = labels_seq_len.max() if len(labels_seq_len) > 0 else 0
+    dense_shape = [len(labels), max_len]
+    labels_st = [indices,
+                 values,
                  np.array(dense_shape, dtype=np.int64)]
 
     return labels_st
@@ -42,7 +67,8 @@ def sparsetensor2list(labels_st, batch_size):
         labels_st: A SparseTensor of labels
         batch_size: int the size of mini-batch
     Returns:
-        labels: list of labels
+        labels: list of labels. Utterances without any labels (e.g. when ctc
+            models do not output any labels) are empty lists.
     """
     if isinstance(labels_st, tf.SparseTensorValue):
         indices = labels_st.indices
@@ -51,19 +77,27 @@ def sparsetensor2list(labels_st, batch_size):
         # expected to list of [indices, values, shape]
         indices = labels_st[0]
         values = labels_st[1]
+    indices = np.asarray(indices).reshape(-1, 2)
+    values = np.asarray(values)
 
-    labels = []
-    batch_boundary = np.where(indices[:, 1] == 0)[0]
+    # Indices are sorted in row-major order
+    label_nums = np.bincount(indices[:, 0], minlength=batch_size)
+    labels = np.split(values, np.cumsum(label_nums)[:-1])
 
-    # TODO: fix error occurred when ctc models do not output any labels
-    # print(batch_boundary)
-    # if len(batch_boundary) != batch_size:
-    #     batch_boundary = np.array(batch_boundary.tolist() + [max(batch_boundary) + 1])
-    # print(indices)
+    return [label_each_wav.tolist() for label_each_wav in labels]
 
-    for i in range(batch_size - 1):
-        label_each_wav = values[batch_boundary[i]:batch_boundary[i + 1]]
-        labels.append(label_each_wav.tolist())
-    labels.append(values[batch_boundary[-1]:].tolist())
 
-    return labels
+def dense2sparse(labels, padded_value=-1):
+    """Convert padded labels to a sparse tensor in the graph. This can be used
+       to feed labels densely.
+    Args:
+        labels: An int32 tensor of size `[batch_size, max_len]` padded with
+            padded_value
+        padded_value: int, the value used for padding
+    Returns:
+        labels_st: A SparseTensor of labels
+    """
+    indices = tf.where(tf.not_equal(labels, padded_value))
+    values = tf.gather_nd(labels, indices)
+    dense_shape = tf.shape(labels, out_type=tf.int64)
+    return tf.SparseTensor(indices, values, dense_shape)
@@ -0,0 +1,76 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""On-disk cache of frame-stacked datasets.
+   Frame-stacked inputs depend only on the dataset and (num_stack, num_skip),
+   so they are stacked once and saved in the packed format
+   (see packed_corpus.py) next to the dataset:
+       stack_cache/stack3_skip3_<fingerprint>/
+   The fingerprint is made from the names, sizes and modification times of
+   the source files, so that the cache is made again when the dataset is
+   changed. Caches of old fingerprints can be removed safely.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+from os.path import join, isfile
+import hashlib
+
+from .packed_corpus import open_or_pack
+
+
+def fingerprint(dataset_path):
+    """Compute the fingerprint of the dataset.
+    Args:
+        dataset_path: path to the dataset including frame_num.pickle
+    Returns:
+        string, the hex digest of the names, sizes and modification times of
+            frame_num.pickle and all files in input/ and label/
+    """
+    md5 = hashlib.md5()
+    paths = [join(dataset_path, file_name)
+             for file_name in ['frame_num.pickle', 'frame_num_dict.pickle']
+             if isfile(join(dataset_path, file_name))]
+    for data_dir in ['input', 'label']:
+        for dir_path, _, file_names in os.walk(join(dataset_path, data_dir)):
+            paths.extend(join(dir_path, file_name) for file_name in file_names)
+
+    for path in sorted(paths):
+        stat = os.stat(path)
+        md5.update(('%s:%d:%d\n' % (os.path.relpath(path, dataset_path),
+                                    stat.st_size,
+                                    int(stat.st_mtime))).encode('utf-8'))
+    return md5.hexdigest()
+
+
+def stack_cache_path(dataset_path, num_stack, num_skip):
+    """Return the path to the cache of the frame-stacked dataset.
+    Args:
+        dataset_path: path to the dataset including frame_num.pickle
+        num_stack: int, the number of frames to stack
+        num_skip: int, the number of frames to skip
+    Returns:
+        path to the cache
+    """
+    return join(dataset_path, 'stack_cache', 'stack%d_skip%d_%s' %
+                (num_stack, num_skip, fingerprint(dataset_path)[:16]))
+
+
+def open_stack_cache(dataset_path, num_stack, num_skip, is_progressbar=False):
+    """Open the cache of the frame-stacked dataset. If it does not exist,
+       stack frames of all utterances and save them first.
+    Args:
+        dataset_path: path to the dataset including frame_num.pickle
+        num_stack: int, the number of frames to stack
+        num_skip: int, the number of frames to skip
+        is_progressbar: if True, visualize progressbar
+    Returns:
+        An instance of PackedCorpus of frame-stacked inputs & labels
+    """
+    return open_or_pack(dataset_path,
+                        stack_cache_path(dataset_path, num_stack, num_skip),
+                        num_stack=num_stack, num_skip=num_skip,
+                        is_progressbar=is_progressbar)
@@ -0,0 +1,77 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import unittest
+import numpy as np
+
+sys.path.append('../../')
+from utils.buffer_pool import BufferPool
+
+
+class TestBufferPool(unittest.TestCase):
+
+    def test(self):
+        pool = BufferPool(num_buffer=3)
+        batches = []
+        for step in range(20):
+            batch_size = np.random.randint(1, 10)
+            input_list = [np.random.randn(np.random.randint(1, 100), 5)
+                          for _ in range(batch_size)]
+            label_list = [np.random.randint(0, 30,
+                                            size=np.random.randint(0, 10))
+                          for _ in range(batch_size)]
+
+            inputs, inputs_seq_len = pool.pad_inputs(input_list, 5)
+            labels, labels_seq_len = pool.pad_labels(label_list)
+            self.assertEqual(inputs.dtype, np.float32)
+            self.assertEqual(labels.dtype, np.int32)
+            self.assertEqual(inputs.shape, (batch_size, max(
+                len(x) for x in input_list), 5))
+
+            # The same as padding by np.zeros
+            inputs_ref = np.zeros(inputs.shape, dtype=np.float32)
+            labels_ref = np.full(labels.shape, -1, dtype=np.int32)
+            for i_batch in range(batch_size):
+                inputs_ref[i_batch, :len(input_list[i_batch])] = \
+                    input_list[i_batch]
+                labels_ref[i_batch, :len(label_list[i_batch])] = \
+                    label_list[i_batch]
+            self.assertTrue(np.array_equal(inputs, inputs_ref))
+            self.assertTrue(np.array_equal(labels, labels_ref))
+            self.assertEqual(inputs_seq_len.tolist(),
+                             [len(x) for x in input_list])
+            self.assertEqual(labels_seq_len.tolist(),
+                             [len(x) for x in label_list])
+
+            # The last num_buffer mini-batches are not overwritten
+            batches.append((inputs.copy(), inputs))
+            for inputs_copy, inputs_view in batches[-3:]:
+                self.assertTrue(np.array_equal(inputs_copy, inputs_view))
+
+        self.assertTrue(pool.reuse_num > 0)
+        self.assertEqual(pool.step_num, 20)
+        print(pool)
+
+        # Buffers in use are not overwritten after num_buffer is increased
+        pool = BufferPool(num_buffer=2)
+        batches = []
+        for step in range(12):
+            if step == 5:
+                pool.reserve(4)
+            inputs, _ = pool.pad_inputs([np.full((3, 2), step)], 2)
+            batches.append(inputs)
+            # The last 2 mini-batches before reserve() are kept as well
+            alive_num = 2 if step < 5 else min(4, step - 2)
+            for i in range(max(step - alive_num + 1, 0), step + 1):
+                self.assertTrue(np.all(batches[i] == i))
+        # 4 buffers of inputs & inputs_seq_len
+        self.assertEqual(pool.alloc_num, 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
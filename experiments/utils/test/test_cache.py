@@ -0,0 +1,54 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import unittest
+import numpy as np
+
+sys.path.append('../../')
+from utils.cache import LRUCache
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def test(self):
+        # 1 MB = 2 utterances of 64 * 1024 float64 values (+ labels)
+        cache = LRUCache(max_mb=1.1)
+        utterances = [(np.full((64, 1024), i, dtype=np.float64),
+                       np.arange(i)) for i in range(4)]
+
+        self.assertTrue(cache.get(0) is None)
+        cache.put(0, utterances[0])
+        cache.put(1, utterances[1])
+        self.assertEqual(len(cache), 2)
+
+        # 0 is used more recently than 1
+        self.assertTrue(cache.get(0)[0][0, 0] == 0)
+        cache.put(2, utterances[2])
+        self.assertTrue(1 not in cache)
+        self.assertTrue(0 in cache and 2 in cache)
+        self.assertTrue(cache.bytes <= cache.max_bytes)
+
+        # Utterances larger than the budget are not cached
+        cache.put(3, (np.zeros((1024, 1024)),))
+        self.assertTrue(3 not in cache)
+        self.assertEqual(len(cache), 2)
+
+        # Replace the same key
+        cache.put(2, utterances[3])
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.bytes, sum(
+            x.nbytes for key in [0, 2] for x in cache.data[key]))
+
+        self.assertEqual(cache.hit_num, 1)
+        self.assertEqual(cache.miss_num, 1)
+        self.assertEqual(cache.hit_rate, 0.5)
+        print(cache)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from os.path import join
+import sys
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+sys.path.append('../../')
+from utils.cmvn import compute_cmvn, load_cmvn
+from utils.buffer_pool import BufferPool
+from utils.frame_stack import _stack_utterance
+
+
+class TestCMVN(unittest.TestCase):
+
+    def test(self):
+        dataset_path = tempfile.mkdtemp()
+        try:
+            # Make dummy utterances
+            input_list, input_paths = [], []
+            for i in range(50):
+                input_i = np.random.randn(np.random.randint(1, 100), 5)
+                input_i = input_i * np.arange(1, 6) + np.arange(5) * 100
+                input_list.append(input_i)
+                input_paths.append(join(dataset_path, 'utt%02d.npy' % i))
+                np.save(input_paths[-1], input_i)
+            frames = np.concatenate(input_list, axis=0)
+
+            # The same as the statistics of all frames
+            for num_worker in [1, 3]:
+                cmvn = compute_cmvn(input_paths, num_worker=num_worker,
+                                    chunk_size=7)
+                self.assertEqual(cmvn.frame_num, frames.shape[0])
+                self.assertTrue(np.allclose(cmvn.mean, frames.mean(axis=0)))
+                self.assertTrue(np.allclose(cmvn.std, frames.std(axis=0)))
+
+            # Save & load
+            cmvn.save(dataset_path)
+            cmvn = load_cmvn(dataset_path)
+            self.assertTrue(np.allclose(cmvn.std, frames.std(axis=0)))
+
+            # Normalize
+            normalized = cmvn.normalize(frames)
+            self.assertEqual(normalized.dtype, np.float32)
+            self.assertTrue(np.allclose(normalized.mean(axis=0), 0,
+                                        atol=1e-4))
+            self.assertTrue(np.allclose(normalized.std(axis=0), 1,
+                                        atol=1e-4))
+
+            # Frame-stacked inputs
+            stacked = np.c_[frames, frames, frames]
+            self.assertTrue(np.allclose(cmvn.normalize(stacked),
+                                        np.c_[normalized, normalized,
+                                              normalized]))
+            self.assertRaises(ValueError, cmvn.normalize, frames[:, :4])
+
+            # Normalize while padding
+            pool = BufferPool()
+            inputs, _ = pool.pad_inputs(input_list[:4], 5, cmvn=cmvn)
+            for i_batch, input_i in enumerate(input_list[:4]):
+                self.assertTrue(np.allclose(
+                    inputs[i_batch, :len(input_i)],
+                    (input_i - cmvn.mean) / cmvn.std, atol=1e-5))
+                self.assertTrue(np.all(inputs[i_batch, len(input_i):] == 0))
+
+            # The same as normalizing before frame stacking, where the
+            # sub-frames padded beyond the end of utterances are 0
+            for num_stack, num_skip in [(3, 1), (3, 2), (5, 3), (3, 3)]:
+                stacked_list = [_stack_utterance(
+                    input_i, (len(input_i) + num_skip - 1) // num_skip,
+                    num_stack, num_skip) for input_i in input_list[:6]]
+                inputs, _ = pool.pad_inputs(
+                    stacked_list, 5 * num_stack, cmvn=cmvn,
+                    frame_nums=[len(input_i) for input_i in input_list[:6]],
+                    num_skip=num_skip)
+                for i_batch, input_i in enumerate(input_list[:6]):
+                    stacked_ref = _stack_utterance(
+                        (input_i - cmvn.mean) / cmvn.std,
+                        len(stacked_list[i_batch]), num_stack, num_skip)
+                    self.assertTrue(np.allclose(
+                        inputs[i_batch, :len(stacked_ref)], stacked_ref,
+                        atol=1e-5))
+        finally:
+            shutil.rmtree(dataset_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import itertools
+import unittest
+import numpy as np
+
+sys.path.append('../../')
+from utils.ctc_decoder import greedy_decode, log_softmax, \
+    prefix_beam_search, skip_blank_frames, BeamSearchDecoder, run_decoder
+from utils.ngram_lm import NgramLM
+
+
+def _collapse(path, blank_index):
+    labels = []
+    prev = None
+    for c in path:
+        if c != prev and c != blank_index:
+            labels.append(c)
+        prev = c
+    return tuple(labels)
+
+
+class TestCTCDecoder(unittest.TestCase):
+
+    def test_greedy(self):
+        # blank: 3
+        best_paths = [[0, 0, 3, 0, 1, 1, 3, 3, 2],
+                      [3, 3, 3],
+                      [2, 2, 1]]
+        seq_len = np.array([9, 3, 2])
+        logits = np.zeros((9, 3, 4), dtype=np.float32)
+        for i_batch, best_path in enumerate(best_paths):
+            logits[np.arange(len(best_path)), i_batch, best_path] = 1
+        labels = greedy_decode(logits, seq_len, blank_index=3)
+        self.assertEqual([x.tolist() for x in labels],
+                         [[0, 0, 1, 2], [], [2]])
+
+    def test_beam_search(self):
+        num_classes, frame_num = 3, 6
+        blank_index = num_classes - 1
+        for _ in range(5):
+            log_probs = log_softmax(
+                np.random.randn(frame_num, num_classes) * 2)
+
+            # Exact probabilities of all label sequences
+            probs = {}
+            for path in itertools.product(range(num_classes),
+                                          repeat=frame_num):
+                labels = _collapse(path, blank_index)
+                probs[labels] = probs.get(labels, 0) + np.exp(
+                    log_probs[np.arange(frame_num), path].sum())
+            labels_best = max(probs, key=probs.get)
+
+            # Exact if all hypotheses are kept
+            labels, score = prefix_beam_search(
+                log_probs, beam_width=1000, blank_index=blank_index,
+                prune_threshold=0)
+            self.assertEqual(tuple(labels.tolist()), labels_best)
+            self.assertAlmostEqual(score, np.log(probs[labels_best]),
+                                   places=4)
+
+        # LM
+        lm = NgramLM(vocab_size=2, order=4).fit([[1, 0, 1, 0]] * 10)
+        log_probs = log_softmax(np.zeros((4, num_classes)))
+        labels, _ = prefix_beam_search(log_probs, beam_width=10,
+                                       blank_index=blank_index, lm=lm,
+                                       lm_weight=10)
+        self.assertEqual(labels.tolist(), [1, 0, 1, 0])
+
+        # The same results with & without workers
+        logits = np.random.randn(20, 4, num_classes).astype(np.float32)
+        seq_len = np.array([20, 15, 3, 1])
+        results = []
+        for num_worker in [0, 2]:
+            decoder = BeamSearchDecoder(beam_width=5, blank_index=blank_index,
+                                        lm=lm, num_worker=num_worker)
+            results.append(decoder(logits, seq_len))
+            decoder.close()
+        for labels_0, labels_1 in zip(*results):
+            self.assertEqual(labels_0.tolist(), labels_1.tolist())
+
+    def test_skip_blank_frames(self):
+        num_classes = 5
+        blank_index = num_classes - 1
+        # Peaky posteriors dominated by blank frames
+        best_path = [4, 4, 4, 0, 0, 4, 4, 0, 4, 4, 4, 1, 2, 2, 4, 4, 3]
+        logits = np.random.randn(len(best_path), num_classes)
+        logits[np.arange(len(best_path)), best_path] += 20
+        log_probs = log_softmax(logits)
+
+        log_probs_reduced = skip_blank_frames(log_probs, blank_index,
+                                              blank_threshold=0.99)
+        # `4 0 4 0 4 1 2 4 3`
+        self.assertEqual(len(log_probs_reduced), 9)
+        self.assertTrue(np.allclose(np.exp(log_probs_reduced).sum(axis=1), 1,
+                                    atol=1e-4))
+
+        # The same results
+        labels, _ = prefix_beam_search(log_probs, 10, blank_index)
+        labels_reduced, _ = prefix_beam_search(log_probs_reduced, 10,
+                                               blank_index)
+        self.assertEqual(labels.tolist(), [0, 0, 1, 2, 3])
+        self.assertEqual(labels_reduced.tolist(), labels.tolist())
+
+        decoder = BeamSearchDecoder(beam_width=10, blank_index=blank_index,
+                                    num_worker=0, blank_threshold=0.99)
+        decoder(logits[:, None, :], np.array([len(best_path)]))
+        self.assertAlmostEqual(decoder.reduction_ratio,
+                               1 - 9 / len(best_path))
+
+    def test_run_decoder(self):
+        # The evaluation path with lm_path: decode_op stays the op of the
+        # graph, and logits_op is decoded by the numpy decoder.
+        class FakeSession(object):
+            def __init__(self, outputs):
+                self.outputs = outputs
+
+            def run(self, fetches, feed_dict=None):
+                return self.outputs[id(fetches)]
+
+        # blank: 3
+        best_paths = [[0, 3, 0, 1, 1, 3], [2, 2, 3]]
+        seq_len = np.array([6, 3])
+        logits = np.zeros((6, 2, 4), dtype=np.float32)
+        for i_batch, best_path in enumerate(best_paths):
+            logits[np.arange(len(best_path)), i_batch, best_path] = 5
+
+        decode_op = object()
+        logits_op = [object(), object()]
+        session = FakeSession({id(logits_op): (logits, seq_len)})
+
+        lm = NgramLM(vocab_size=3, order=2).fit([[0, 0, 1], [2]])
+        decoder = BeamSearchDecoder(beam_width=4, blank_index=3, lm=lm,
+                                    num_worker=0)
+        labels = run_decoder(session, decode_op, {}, 2, decoder=decoder,
+                             logits_op=logits_op)
+        self.assertEqual([list(x) for x in labels], [[0, 0, 1], [2]])
+
+        with self.assertRaises(ValueError):
+            run_decoder(session, decode_op, {}, 2, decoder=decoder)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import unittest
+import numpy as np
+
+sys.path.append('../../')
+from utils.edit_distance import edit_distance_batch, error_rate
+
+
+def levenshtein(ref, hyp):
+    """Dynamic programming for reference."""
+    d = np.zeros((len(ref) + 1, len(hyp) + 1), dtype=np.int64)
+    d[:, 0] = np.arange(len(ref) + 1)
+    d[0, :] = np.arange(len(hyp) + 1)
+    for i in range(1, len(ref) + 1):
+        for j in range(1, len(hyp) + 1):
+            d[i, j] = min(d[i - 1, j] + 1, d[i, j - 1] + 1,
+                          d[i - 1, j - 1] + (ref[i - 1] != hyp[j - 1]))
+    return d[-1, -1]
+
+
+class TestEditDistance(unittest.TestCase):
+
+    def test(self):
+        # Known cases
+        distance, sub, ins, dele, ref_len = edit_distance_batch(
+            [[1, 2, 3], [1, 2, 3], [1, 2, 3], [], [4, 5]],
+            [[1, 9, 3], [1, 2, 3, 4], [1, 3], [7, 7], []])
+        self.assertEqual(distance.tolist(), [1, 1, 1, 2, 2])
+        self.assertEqual(sub.tolist(), [1, 0, 0, 0, 0])
+        self.assertEqual(ins.tolist(), [0, 1, 0, 2, 0])
+        self.assertEqual(dele.tolist(), [0, 0, 1, 0, 2])
+        self.assertEqual(ref_len.tolist(), [3, 3, 3, 0, 2])
+
+        # Random cases
+        labels_true = [np.random.randint(0, 5, size=np.random.randint(0, 30))
+                       for _ in range(50)]
+        labels_pred = [np.random.randint(0, 5, size=np.random.randint(0, 30))
+                       for _ in range(50)]
+        distance, sub, ins, dele, ref_len = edit_distance_batch(
+            labels_true, labels_pred)
+        for i_batch in range(50):
+            self.assertEqual(distance[i_batch], levenshtein(
+                labels_true[i_batch], labels_pred[i_batch]))
+        self.assertTrue(np.array_equal(sub + ins + dele, distance))
+        # Insertions & deletions explain the difference of lengths
+        self.assertTrue(np.array_equal(
+            ins - dele,
+            [len(y) - len(x) for x, y in zip(labels_true, labels_pred)]))
+
+        ler = error_rate(labels_true, labels_pred)
+        self.assertTrue(np.allclose(ler, distance / np.maximum(ref_len, 1)))
+        self.assertEqual(len(error_rate([], [])), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+from os.path import join
+import sys
+import pickle
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import scipy.io.wavfile
+
+sys.path.append('../../')
+from utils.feature_extraction import delta, wav2feature, extract_features
+from utils.packed_corpus import PackedCorpus
+
+
+def delta_loop(feat, N):
+    """Frame-by-frame implementation for reference."""
+    frame_num = len(feat)
+    feat = np.concatenate(([feat[0] for i in range(N)],
+                           feat, [feat[-1] for i in range(N)]))
+    denom = sum([2 * i * i for i in range(1, N + 1)])
+    return np.array([np.sum([n * feat[N + j + n]
+                             for n in range(-1 * N, N + 1)], axis=0) / denom
+                     for j in range(frame_num)])
+
+
+class TestFeatureExtraction(unittest.TestCase):
+
+    def test_delta(self):
+        for frame_num in [1, 3, 100]:
+            feat = np.random.randn(frame_num, 41)
+            self.assertTrue(np.allclose(delta(feat, 2), delta_loop(feat, 2)))
+
+    def test(self):
+        wav_dir = tempfile.mkdtemp()
+        save_path = tempfile.mkdtemp()
+        try:
+            # Make dummy wav files
+            wav_paths = []
+            for i in range(6):
+                wav_paths.append(join(wav_dir, 'utt%02d.wav' % i))
+                audio = np.random.randint(
+                    -3000, 3000, size=np.random.randint(4000, 16000))
+                scipy.io.wavfile.write(wav_paths[-1], 16000,
+                                       audio.astype(np.int16))
+
+            # The per-utterance layout
+            file_num, frame_num, _ = extract_features(
+                wav_paths, join(save_path, 'npy'), num_worker=2)
+            self.assertEqual(file_num, 6)
+            with open(join(save_path, 'npy', 'frame_num.pickle'), 'rb') as f:
+                frame_num_dict = pickle.load(f)
+            self.assertEqual(sum(frame_num_dict.values()), frame_num)
+            for wav_path in wav_paths:
+                input_name = os.path.basename(wav_path).split('.')[0]
+                features = np.load(
+                    join(save_path, 'npy', 'input', input_name + '.npy'))
+                self.assertEqual(features.shape,
+                                 (frame_num_dict[input_name], 123))
+                self.assertTrue(np.array_equal(features,
+                                               wav2feature(wav_path)))
+
+            # The packed format
+            extract_features(wav_paths, join(save_path, 'packed_dataset'),
+                             feature_type='mfcc', num_worker=1,
+                             is_packed=True)
+            corpus = PackedCorpus(join(save_path, 'packed_dataset', 'packed'))
+            self.assertEqual(len(corpus), 6)
+            for i, wav_path in enumerate(wav_paths):
+                self.assertTrue(np.array_equal(
+                    corpus.input(i), wav2feature(wav_path, 'mfcc')))
+                self.assertEqual(len(corpus.label(i)), 0)
+        finally:
+            shutil.rmtree(wav_dir)
+            shutil.rmtree(save_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
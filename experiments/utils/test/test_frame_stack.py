@@ -0,0 +1,135 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import time
+import unittest
+import numpy as np
+
+sys.path.append('../../')
+from utils.frame_stack import stack_frame, stack_frame_batch
+
+
+def stack_frame_legacy(input_list, input_paths, frame_num_dict, num_stack,
+                       num_skip):
+    """The original implementation looping over each frame."""
+    if num_stack < num_skip:
+        raise ValueError('num_skip must be less than num_stack.')
+
+    input_size = input_list[0].shape[1]
+    utt_num = len(input_paths)
+
+    stacked_input_list = []
+    for i_utt in range(utt_num):
+        # Per utterance
+        input_name = input_paths[i_utt].split('/')[-1].split('.')[0]
+        frame_num = frame_num_dict[input_name]
+        frame_num_decimated = frame_num / num_skip
+        if frame_num_decimated != int(frame_num_decimated):
+            frame_num_decimated += 1
+        frame_num_decimated = int(frame_num_decimated)
+
+        stacked_frames = np.zeros(
+            (frame_num_decimated, input_size * num_stack))
+        stack_count = 0  # counter for stacked_frames
+        stack = []
+        for i_frame, frame in enumerate(input_list[i_utt]):
+            #####################
+            # final frame
+            #####################
+            if i_frame == len(input_list[i_utt]) - 1:
+                # Stack the final frame
+                stack.append(frame)
+
+                while stack_count != int(frame_num_decimated):
+                    # Concatenate stacked frames
+                    for i_stack in range(len(stack)):
+                        stacked_frames[stack_count][input_size *
+                                                    i_stack:input_size * (i_stack + 1)] = stack[i_stack]
+                    stack_count += 1
+
+                    # Delete some frames to skip
+                    for _ in range(num_skip):
+                        if len(stack) != 0:
+                            stack.pop(0)
+
+            ########################
+            # first & middle frames
+            ########################
+            elif len(stack) < num_stack:
+                # Stack some frames until stack is filled
+                stack.append(frame)
+
+                if len(stack) == num_stack:
+                    # Concatenate stacked frames
+                    for i_stack in range(num_stack):
+                        stacked_frames[stack_count][input_size *
+                                                    i_stack:input_size * (i_stack + 1)] = stack[i_stack]
+                    stack_count += 1
+
+                    # Delete some frames to skip
+                    for _ in range(num_skip):
+                        stack.pop(0)
+
+        stacked_input_list.append(stacked_frames)
+
+    return stacked_input_list
+
+
+class TestFrameStack(unittest.TestCase):
+
+    def test(self):
+        for num_stack, num_skip in [(1, 1), (3, 3), (3, 2), (5, 3), (9, 1)]:
+            print('----- num_stack: %d, num_skip: %d -----' %
+                  (num_stack, num_skip))
+            self.check_stacking(num_stack, num_skip)
+
+    def check_stacking(self, num_stack, num_skip):
+        # Include very short utterances
+        frame_nums = [1, 2, num_stack, num_stack + 1] + \
+            list(np.random.randint(1, 300, size=60))
+        input_list = [np.random.randn(frame_num, 123).astype(np.float32)
+                      for frame_num in frame_nums]
+        input_paths = ['/path/to/utt%d.npy' % i for i in range(len(frame_nums))]
+        frame_num_dict = dict(zip(['utt%d' % i for i in range(len(frame_nums))],
+                                  frame_nums))
+
+        start_time = time.time()
+        stacked_legacy = stack_frame_legacy(
+            input_list, input_paths, frame_num_dict, num_stack, num_skip)
+        time_legacy = time.time() - start_time
+
+        start_time = time.time()
+        stacked = stack_frame(
+            input_list, input_paths, frame_num_dict, num_stack, num_skip)
+        time_vectorized = time.time() - start_time
+        print('legacy: %.4f sec, vectorized: %.4f sec' %
+              (time_legacy, time_vectorized))
+
+        # Bit-identical
+        for x_legacy, x in zip(stacked_legacy, stacked):
+            self.assertEqual(x_legacy.dtype, x.dtype)
+            self.assertEqual(x_legacy.shape, x.shape)
+            self.assertEqual(x_legacy.tobytes(), x.tobytes())
+
+        # Mini-batch version
+        batch_size = len(input_list)
+        inputs = np.zeros((batch_size, max(frame_nums), 123))
+        for i_batch, data_i in enumerate(input_list):
+            inputs[i_batch, :len(data_i)] = data_i
+        stacked_inputs, stacked_inputs_seq_len = stack_frame_batch(
+            inputs, np.array(frame_nums), num_stack, num_skip)
+        for i_batch, x_legacy in enumerate(stacked_legacy):
+            self.assertEqual(stacked_inputs_seq_len[i_batch], len(x_legacy))
+            self.assertEqual(
+                stacked_inputs[i_batch, :len(x_legacy)].tobytes(),
+                x_legacy.tobytes())
+            self.assertFalse(np.any(stacked_inputs[i_batch, len(x_legacy):]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+from os.path import join
+import sys
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+sys.path.append('../../')
+from utils.logit_cache import LogitCacheWriter, LogitCache, PRUNED_LOGIT, \
+    logit_cache_path, save_logits
+
+
+class TestLogitCache(unittest.TestCase):
+
+    def test(self):
+        num_classes = 10
+        logits_list, labels_list = [], []
+        for _ in range(7):
+            logits_list.append(np.random.randn(
+                np.random.randint(1, 30), num_classes).astype(np.float32))
+            labels_list.append(np.random.randint(
+                0, num_classes - 1, size=np.random.randint(0, 10)))
+
+        save_dir = tempfile.mkdtemp()
+        try:
+            for top_k in [None, 3]:
+                save_path = join(save_dir, 'cache%s' % top_k)
+                writer = LogitCacheWriter(save_path, num_classes, top_k=top_k,
+                                          meta={'label_type': 'phone39'})
+                for i, (logits, labels) in enumerate(
+                        zip(logits_list, labels_list)):
+                    writer.add('utt%d' % i, logits, labels)
+                writer.close()
+                # The temporary directory is renamed
+                self.assertFalse(any('.tmp' in file_name
+                                     for file_name in os.listdir(save_dir)))
+
+                cache = LogitCache(save_path)
+                self.assertEqual(len(cache), len(logits_list))
+                self.assertEqual(cache.meta['label_type'], 'phone39')
+                for i, logits in enumerate(logits_list):
+                    logits_cached = cache.logit(i)
+                    self.assertEqual(logits_cached.shape, logits.shape)
+                    if top_k is None:
+                        self.assertTrue(np.allclose(
+                            logits_cached, logits, atol=1e-2))
+                        continue
+                    # The blank class & top_k classes are kept
+                    is_kept = logits_cached != PRUNED_LOGIT
+                    self.assertTrue(np.all(is_kept.sum(axis=1) == top_k))
+                    self.assertTrue(np.all(is_kept[:, -1]))
+                    self.assertTrue(np.all(is_kept[np.arange(len(logits)),
+                                           logits[:, :-1].argmax(axis=1)]))
+                    self.assertTrue(np.allclose(
+                        logits_cached[is_kept], logits[is_kept], atol=1e-2))
+
+                # Mini-batches (time-major)
+                i = 0
+                for logits, seq_len, labels in cache.batches(3):
+                    for i_batch in range(len(seq_len)):
+                        self.assertTrue(np.array_equal(
+                            logits[:seq_len[i_batch], i_batch],
+                            cache.logit(i)))
+                        self.assertTrue(np.array_equal(labels[i_batch],
+                                                       labels_list[i]))
+                        i += 1
+                self.assertEqual(i, len(logits_list))
+        finally:
+            shutil.rmtree(save_dir)
+
+    def test_abort(self):
+        save_dir = tempfile.mkdtemp()
+        try:
+            save_path = join(save_dir, 'cache')
+            writer = LogitCacheWriter(save_path, 10, top_k=3)
+            writer.add('utt0', np.random.randn(5, 10), [1, 2])
+            writer.abort()
+            self.assertTrue(writer.f_logits.closed)
+            self.assertTrue(writer.f_indices.closed)
+            self.assertEqual(os.listdir(save_dir), [])
+
+            # Nothing is written for the empty dataset
+            class EmptyDataSet(object):
+                data_num = 0
+                batch_size = 1
+            with self.assertRaises(ValueError):
+                save_logits(None, None, None, None, EmptyDataSet(),
+                            save_path)
+            self.assertEqual(os.listdir(save_dir), [])
+        finally:
+            shutil.rmtree(save_dir)
+
+    def test_cache_path(self):
+        save_dir = tempfile.mkdtemp()
+        try:
+            dataset_path = join(save_dir, 'dataset')
+            os.makedirs(join(dataset_path, 'input'))
+            with open(join(dataset_path, 'frame_num.pickle'), 'wb') as f:
+                f.write(b'0')
+            model_path = join(save_dir, 'model.ckpt-20')
+            for ext in ['.index', '.data-00000-of-00001']:
+                with open(model_path + ext, 'wb') as f:
+                    f.write(b'0')
+
+            def cache_path(top_k=None):
+                return logit_cache_path(save_dir, model_path, 'test',
+                                        dataset_path, top_k=top_k)
+            path = cache_path()
+            self.assertEqual(path, cache_path())
+
+            # Pruned logits are cached separately
+            self.assertNotEqual(path, cache_path(top_k=5))
+
+            # The model is trained again into the same directory
+            with open(model_path + '.index', 'wb') as f:
+                f.write(b'00')
+            self.assertNotEqual(path, cache_path())
+        finally:
+            shutil.rmtree(save_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import unittest
+import numpy as np
+
+sys.path.append('../../')
+from utils.multi_gpu import split_batch
+
+
+class TestSplitBatch(unittest.TestCase):
+
+    def test(self):
+        for batch_size in [1, 3, 8, 13]:
+            for num_gpu in [2, 4]:
+                print('----- batch_size: %d, num_gpu: %d -----' %
+                      (batch_size, num_gpu))
+                self.check_splitting(batch_size, num_gpu)
+
+    def check_splitting(self, batch_size, num_gpu):
+        inputs_seq_len = np.random.randint(1, 50, size=batch_size)
+        inputs = np.zeros((batch_size, inputs_seq_len.max(), 3))
+        for i_batch, frame_num in enumerate(inputs_seq_len):
+            inputs[i_batch, :frame_num] = i_batch + 1
+        labels = np.arange(batch_size)[:, None] * np.ones((1, 5), dtype=int)
+        input_names = ['utt%d' % i for i in range(batch_size)]
+
+        inputs_tower, inputs_seq_len_tower, labels_tower, input_names_tower = \
+            split_batch(num_gpu, inputs, inputs_seq_len, labels, input_names)
+
+        self.assertEqual(len(inputs_tower), num_gpu)
+        sizes = [len(x) for x in inputs_seq_len_tower]
+        self.assertTrue(min(sizes) >= 1)
+        self.assertTrue(max(sizes) - min(sizes) <= 1)
+
+        seen = []
+        for i_gpu in range(num_gpu):
+            # Trimmed to the max frame num in each tower
+            self.assertEqual(inputs_tower[i_gpu].shape[1],
+                             inputs_seq_len_tower[i_gpu].max())
+            for i, name in enumerate(input_names_tower[i_gpu]):
+                i_utt = int(name[3:])
+                seen.append(i_utt)
+                self.assertEqual(labels_tower[i_gpu][i][0], i_utt)
+                self.assertEqual(inputs_seq_len_tower[i_gpu][i],
+                                 inputs_seq_len[i_utt])
+                self.assertTrue(np.all(
+                    inputs_tower[i_gpu][i, :inputs_seq_len[i_utt]] ==
+                    i_utt + 1))
+
+        # All utterances are included (repeated only if padded)
+        self.assertEqual(sorted(set(seen)), list(range(batch_size)))
+        self.assertEqual(len(seen), max(batch_size, num_gpu))
+
+
+if __name__ == '__main__':
+    unittest.main()
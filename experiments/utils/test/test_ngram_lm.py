@@ -0,0 +1,64 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import tempfile
+import unittest
+import numpy as np
+
+sys.path.append('../../')
+from utils.ngram_lm import NgramLM, load_ngram_lm
+
+
+class TestNgramLM(unittest.TestCase):
+
+    def test(self):
+        vocab_size = 5
+        label_list = [np.random.randint(0, vocab_size,
+                                        size=np.random.randint(0, 20))
+                      for _ in range(30)]
+        for order in [1, 2, 3]:
+            lm = NgramLM(vocab_size, order=order).fit(label_list)
+
+            # Distributions of each state
+            state = lm.initial_state()
+            for token in label_list[0]:
+                rows = lm.logprob_rows([state])
+                self.assertEqual(rows.shape, (1, vocab_size + 1))
+                self.assertAlmostEqual(np.exp(rows).sum(), 1, places=5)
+                state = lm.next_state(state, token)
+            # Cached
+            self.assertEqual(lm.next_state(lm.initial_state(), 0),
+                             lm.next_state(lm.initial_state(), 0))
+
+            # Save & load
+            save_path = tempfile.mktemp()
+            try:
+                lm.save(save_path)
+                lm_loaded = load_ngram_lm(save_path)
+            finally:
+                os.remove(save_path)
+            self.assertTrue(np.array_equal(
+                lm.logprob_rows([lm.initial_state()]),
+                lm_loaded.logprob_rows([lm_loaded.initial_state()])))
+
+            # The loaded LM can be fit again
+            lm.fit(label_list[:10])
+            lm_loaded.fit(label_list[:10])
+            self.assertTrue(np.array_equal(
+                lm.logprob_rows([lm.initial_state()]),
+                lm_loaded.logprob_rows([lm_loaded.initial_state()])))
+
+        # Seen n-grams are more probable
+        lm = NgramLM(vocab_size, order=2).fit([[0, 1, 2]] * 10)
+        rows = lm.logprob_rows([lm.next_state(lm.initial_state(), 0)])
+        self.assertEqual(np.argmax(rows[0]), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+from os.path import join
+import sys
+import pickle
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+sys.path.append('../../')
+from utils.packed_corpus import pack_dataset, PackedCorpus
+
+
+class TestPackedCorpus(unittest.TestCase):
+
+    def test(self):
+        self.check_packing(is_speaker_dir=False)
+        self.check_packing(is_speaker_dir=True)
+
+    def check_packing(self, is_speaker_dir):
+        print('----- is_speaker_dir: ' + str(is_speaker_dir) + ' -----')
+
+        dataset_path = tempfile.mkdtemp()
+        try:
+            # Make a dummy dataset
+            frame_num_dict, inputs, labels = {}, {}, {}
+            for i in range(10):
+                input_name = 'S%02d_%04d' % (i % 3, i)
+                frame_num = np.random.randint(1, 100)
+                frame_num_dict[input_name] = frame_num
+                inputs[input_name] = np.random.randn(frame_num, 123)
+                labels[input_name] = np.random.randint(
+                    0, 30, size=np.random.randint(0, 20))
+
+                for data_dir, data in [('input', inputs), ('label', labels)]:
+                    save_dir = join(dataset_path, data_dir)
+                    if is_speaker_dir:
+                        save_dir = join(save_dir, input_name.split('_')[0])
+                    if not os.path.isdir(save_dir):
+                        os.makedirs(save_dir)
+                    np.save(join(save_dir, input_name + '.npy'),
+                            data[input_name])
+            with open(join(dataset_path, 'frame_num.pickle'), 'wb') as f:
+                pickle.dump(frame_num_dict, f)
+
+            corpus = PackedCorpus(pack_dataset(dataset_path))
+            self.assertEqual(len(corpus), len(frame_num_dict))
+            for input_name in frame_num_dict.keys():
+                i = corpus.index(input_name)
+                self.assertTrue(np.array_equal(
+                    corpus.input(i), inputs[input_name].astype(np.float32)))
+                self.assertTrue(np.array_equal(
+                    corpus.label(i), labels[input_name]))
+        finally:
+            shutil.rmtree(dataset_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import unittest
+import numpy as np
+
+sys.path.append('../../')
+from utils.prefetch import Prefetcher
+from utils.buffer_pool import BufferPool
+
+
+def dummy_generator(num):
+    for i in range(num):
+        yield np.full((2, 3), i), [i], i
+
+
+def pool_generator(pool, num):
+    for i in range(num):
+        inputs, inputs_seq_len = pool.pad_inputs([np.full((2, 3), i)], 3)
+        yield inputs, inputs_seq_len
+
+
+def error_generator():
+    yield 0
+    raise ValueError('dummy error')
+
+
+class TestPrefetcher(unittest.TestCase):
+
+    def test(self):
+        for queue_size in [1, 3]:
+            print('----- queue_size: %d -----' % queue_size)
+            self.check_order(queue_size)
+        self.check_error()
+
+    def test_pool(self):
+        # Mini-batches waiting in the queue are not overwritten
+        for use_pool in [True, False]:
+            pool = BufferPool(num_buffer=1)
+            mini_batch = Prefetcher(pool_generator(pool, 20), queue_size=3,
+                                    pool=pool if use_pool else None)
+            batches = []
+            for i, (inputs, _) in enumerate(mini_batch):
+                batches.append(inputs)
+                # The previous mini-batch is still used
+                for j, inputs_prev in enumerate(batches[-2:]):
+                    self.assertTrue(np.all(
+                        inputs_prev == i - len(batches[-2:]) + 1 + j))
+            self.assertEqual(pool.num_buffer, 5 if use_pool else 1)
+
+    def check_order(self, queue_size):
+        mini_batch = Prefetcher(dummy_generator(20), queue_size=queue_size)
+        for i, (inputs, labels, num) in enumerate(mini_batch):
+            self.assertTrue(np.array_equal(inputs, np.full((2, 3), i)))
+            self.assertEqual(labels, [i])
+            self.assertEqual(num, i)
+        self.assertEqual(i, 19)
+
+    def check_error(self):
+        mini_batch = Prefetcher(error_generator())
+        self.assertEqual(next(mini_batch), 0)
+        with self.assertRaises(RuntimeError):
+            next(mini_batch)
+
+
+if __name__ == '__main__':
+    unittest.main()
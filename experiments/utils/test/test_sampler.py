@@ -0,0 +1,122 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import pickle
+import unittest
+import numpy as np
+
+sys.path.append('../../')
+from utils.sampler import SortedSampler, RandomSampler, BucketSampler
+from utils.sampler import SequentialSampler
+
+
+def check_resume(test_case, make_sampler):
+    """Check that the restored sampler makes the same mini-batches."""
+    sampler = make_sampler()
+    for _ in range(7):
+        sampler.sample()
+    state = pickle.loads(pickle.dumps(sampler.state_dict()))
+
+    sampler_resumed = make_sampler()
+    sampler_resumed.load_state_dict(state)
+    for _ in range(30):
+        indices, next_epoch_flag = sampler.sample()
+        indices_resumed, next_epoch_flag_resumed = sampler_resumed.sample()
+        test_case.assertTrue(np.array_equal(indices, indices_resumed))
+        test_case.assertEqual(next_epoch_flag, next_epoch_flag_resumed)
+
+
+class TestSampler(unittest.TestCase):
+
+    def test(self):
+        for sampler_class in [SortedSampler, RandomSampler,
+                              SequentialSampler]:
+            for data_num, batch_size in [(100, 10), (105, 10), (3, 10)]:
+                print('----- %s, data_num: %d, batch_size: %d -----' %
+                      (sampler_class.__name__, data_num, batch_size))
+                self.check_sampling(sampler_class, data_num, batch_size)
+            check_resume(self, lambda: sampler_class(105, 10))
+
+    def check_sampling(self, sampler_class, data_num, batch_size):
+        sampler = sampler_class(data_num, batch_size)
+        for epoch in range(3):
+            seen = []
+            while True:
+                indices, next_epoch_flag = sampler.sample()
+                self.assertTrue(len(indices) <= batch_size)
+                if sampler_class == SortedSampler:
+                    self.assertEqual(sorted(indices),
+                                     list(range(len(seen),
+                                                len(seen) + len(indices))))
+                elif sampler_class == SequentialSampler:
+                    # The order of the dataset is kept
+                    self.assertEqual(list(indices),
+                                     list(range(len(seen),
+                                                len(seen) + len(indices))))
+                seen.extend(indices)
+                if next_epoch_flag:
+                    break
+
+            # Each utterance appears once per epoch
+            self.assertEqual(sorted(seen), list(range(data_num)))
+            self.assertEqual(sampler.epoch, epoch + 1)
+
+        # Change the size of mini-batch
+        indices, _ = sampler.sample(batch_size=1)
+        self.assertEqual(len(indices), 1)
+
+
+class TestBucketSampler(unittest.TestCase):
+
+    def test(self):
+        frame_nums = np.random.randint(50, 800, size=1000)
+        frame_nums[0] = 5000  # longer than frame_budget
+
+        self.check_sampling(frame_nums, frame_budget=4000, max_batch_size=None)
+        self.check_sampling(frame_nums, frame_budget=4000, max_batch_size=16)
+        self.check_sampling(frame_nums, frame_budget=1, max_batch_size=None)
+
+        # The same seed makes the same mini-batches
+        sampler1 = BucketSampler(frame_nums, frame_budget=4000, seed=1)
+        sampler2 = BucketSampler(frame_nums, frame_budget=4000, seed=1)
+        for _ in range(len(sampler1) * 2):
+            indices1, flag1 = sampler1.sample()
+            indices2, flag2 = sampler2.sample()
+            self.assertTrue(np.array_equal(indices1, indices2))
+            self.assertEqual(flag1, flag2)
+
+        check_resume(self, lambda: BucketSampler(frame_nums, frame_budget=4000))
+
+    def check_sampling(self, frame_nums, frame_budget, max_batch_size):
+        print('----- frame_budget: %d, max_batch_size: %s -----' %
+              (frame_budget, str(max_batch_size)))
+
+        sampler = BucketSampler(frame_nums, frame_budget=frame_budget,
+                                max_batch_size=max_batch_size)
+        batch_num = len(sampler)
+        for epoch in range(3):
+            # The number of mini-batches does not change across epochs
+            self.assertEqual(len(sampler), batch_num)
+            seen = []
+            for i in range(batch_num):
+                indices, next_epoch_flag = sampler.sample()
+                self.assertEqual(next_epoch_flag, i == batch_num - 1)
+                if len(indices) > 1:
+                    padded_frame_num = max(frame_nums[indices]) * len(indices)
+                    self.assertTrue(padded_frame_num <= frame_budget)
+                if max_batch_size is not None:
+                    self.assertTrue(len(indices) <= max_batch_size)
+                seen.extend(indices)
+
+            # Each utterance appears once per epoch
+            self.assertEqual(sorted(seen), list(range(len(frame_nums))))
+            self.assertEqual(sampler.epoch, epoch + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import unittest
+import numpy as np
+
+sys.path.append('../../')
+from utils.scorer import Scorer, score_labels, score_strings
+
+
+class TestScorer(unittest.TestCase):
+
+    def test(self):
+        batches = []
+        for _ in range(20):
+            batch_size = np.random.randint(1, 8)
+            batches.append((
+                [np.random.randint(0, 5, size=np.random.randint(1, 20))
+                 for _ in range(batch_size)],
+                [np.random.randint(0, 5, size=np.random.randint(0, 20))
+                 for _ in range(batch_size)]))
+
+        # The same results with & without workers
+        results = []
+        for num_worker in [0, 2]:
+            scorer = Scorer(score_labels, num_worker=num_worker,
+                            queue_size=2)
+            for labels_true, labels_pred in batches:
+                scorer.submit(labels_true, labels_pred)
+            results.append(scorer.result())
+        self.assertEqual(results[0][1:], results[1][1:])
+        self.assertAlmostEqual(results[0][0], results[1][0])
+        self.assertEqual(results[0][1], sum(len(x) for x, _ in batches))
+
+        # Workers are stopped when evaluation stops before result()
+        scorer = Scorer(score_labels, num_worker=2)
+        for labels_true, labels_pred in batches:
+            scorer.submit(labels_true, labels_pred)
+        pool = scorer.pool
+        scorer.close()
+        self.assertIsNone(scorer.pool)
+        self.assertEqual(len(scorer.pending), 0)
+        self.assertTrue(all(not p.is_alive() for p in pool._pool))
+
+        # Nothing to score
+        for num_worker in [0, 2]:
+            scorer = Scorer(score_labels, num_worker=num_worker)
+            with self.assertRaises(ValueError):
+                scorer.result()
+            self.assertIsNone(scorer.pool)
+
+        # Characters (silence is removed)
+        error_rate_sum, utt_num, sub, ins, dele, ref_len = score_strings(
+            ['a_bc', 'abc__'], ['abd', '_'])
+        self.assertAlmostEqual(error_rate_sum, 1 / 3 + 1)
+        self.assertEqual((utt_num, sub, ins, dele, ref_len),
+                         (2, 1, 0, 3, 6))
+
+
+if __name__ == '__main__':
+    unittest.main()
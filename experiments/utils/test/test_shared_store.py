@@ -0,0 +1,96 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+from os.path import join
+import sys
+import pickle
+import shutil
+import tempfile
+import unittest
+import multiprocessing
+import numpy as np
+
+sys.path.append('../../')
+from utils.shared_store import open_store, remove_store, store_path
+from utils.frame_stack import stack_frame
+
+
+def attach(dataset_path, shm_dir, queue):
+    corpus = open_store(dataset_path, num_stack=3, num_skip=2,
+                        shm_dir=shm_dir)
+    queue.put(corpus.packed_path)
+
+
+class TestSharedStore(unittest.TestCase):
+
+    def test(self):
+        dataset_path = tempfile.mkdtemp()
+        shm_dir = tempfile.mkdtemp()
+        try:
+            # Make a dummy dataset
+            frame_num_dict, inputs, labels = {}, {}, {}
+            for data_dir in ['input', 'label']:
+                os.makedirs(join(dataset_path, data_dir))
+            for i in range(10):
+                input_name = 'utt%02d' % i
+                frame_num = np.random.randint(1, 100)
+                frame_num_dict[input_name] = frame_num
+                inputs[input_name] = np.random.randn(frame_num, 5)
+                labels[input_name] = np.random.randint(
+                    0, 30, size=np.random.randint(0, 20))
+                np.save(join(dataset_path, 'input', input_name + '.npy'),
+                        inputs[input_name])
+                np.save(join(dataset_path, 'label', input_name + '.npy'),
+                        labels[input_name])
+            with open(join(dataset_path, 'frame_num.pickle'), 'wb') as f:
+                pickle.dump(frame_num_dict, f)
+
+            # Publish by concurrent processes
+            queue = multiprocessing.Queue()
+            processes = [multiprocessing.Process(
+                target=attach, args=(dataset_path, shm_dir, queue))
+                for _ in range(4)]
+            for p in processes:
+                p.start()
+            for p in processes:
+                p.join()
+            path = store_path(dataset_path, 3, 2, shm_dir)
+            for _ in processes:
+                self.assertEqual(queue.get(), path)
+            self.assertEqual(sorted(os.listdir(shm_dir)),
+                             sorted([os.path.basename(path),
+                                     os.path.basename(path) + '.lock']))
+
+            # Attach
+            corpus = open_store(dataset_path, 3, 2, shm_dir=shm_dir)
+            for input_name in frame_num_dict.keys():
+                i = corpus.index(input_name)
+                stacked_input = stack_frame(
+                    [inputs[input_name]], [input_name + '.npy'],
+                    frame_num_dict, 3, 2)[0]
+                self.assertTrue(np.allclose(corpus.input(i), stacked_input,
+                                            atol=1e-6))
+                self.assertTrue(np.array_equal(
+                    corpus.label(i), labels[input_name]))
+
+            # The lock file is kept
+            remove_store(dataset_path, 3, 2, shm_dir=shm_dir)
+            self.assertEqual(os.listdir(shm_dir),
+                             [os.path.basename(path) + '.lock'])
+
+            # The store of the dataset made again is not the same
+            np.save(join(dataset_path, 'label', 'utt00.npy'),
+                    np.append(labels['utt00'], 0))
+            self.assertNotEqual(store_path(dataset_path, 3, 2, shm_dir), path)
+        finally:
+            shutil.rmtree(dataset_path)
+            shutil.rmtree(shm_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import unittest
+import numpy as np
+
+sys.path.append('../../')
+from utils.sparsetensor import list2sparsetensor, sparsetensor2list
+
+
+def list2sparsetensor_legacy(labels, padded_value=-1):
+    indices, values = [], []
+    for i_utt, each_label in enumerate(labels):
+        for i_l, l in enumerate(each_label):
+            if l == padded_value:
+                break
+            indices.append([i_utt, i_l])
+            values.append(l)
+    dense_shape = [len(labels), np.asarray(indices).max(0)[1] + 1]
+    return [np.array(indices, dtype=np.int64),
+            np.array(values, dtype=np.int32),
+            np.array(dense_shape, dtype=np.int64)]
+
+
+class TestSparseTensor(unittest.TestCase):
+
+    def test(self):
+        # Padded labels
+        labels = np.array([[1, 2, 3, -1], [4, -1, -1, -1], [5, 6, 7, 8]])
+        self.check_same_as_legacy(labels)
+        self.assertEqual(sparsetensor2list(list2sparsetensor(labels), 3),
+                         [[1, 2, 3], [4], [5, 6, 7, 8]])
+
+        # Ragged labels
+        labels = [[1, 2], [3, 4, 5, 6], [7]]
+        self.check_same_as_legacy(labels)
+        self.assertEqual(sparsetensor2list(list2sparsetensor(labels), 3),
+                         labels)
+
+        # Empty labels
+        for labels in [[[], [1, 2], []], [[1], [], [], [2, 3]],
+                       [[], []], np.full((2, 3), -1)]:
+            labels_st = list2sparsetensor(labels)
+            self.assertEqual(sparsetensor2list(labels_st, len(labels)),
+                             [list(l[l != -1]) if isinstance(l, np.ndarray)
+                              else l for l in labels])
+
+        # Decoded labels without any outputs in the last utterance
+        labels_st = [np.array([[0, 0], [0, 1], [2, 0]], dtype=np.int64),
+                     np.array([3, 4, 5], dtype=np.int32),
+                     np.array([4, 2], dtype=np.int64)]
+        self.assertEqual(sparsetensor2list(labels_st, 4),
+                         [[3, 4], [], [5], []])
+
+    def check_same_as_legacy(self, labels):
+        for array, array_legacy in zip(list2sparsetensor(labels),
+                                       list2sparsetensor_legacy(labels)):
+            self.assertTrue(np.array_equal(array, array_legacy))
+            self.assertEqual(array.dtype, array_legacy.dtype)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+from os.path import join, dirname, basename
+import sys
+import time
+import pickle
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+sys.path.append('../../')
+from utils.stack_cache import open_stack_cache, stack_cache_path
+from utils.frame_stack import stack_frame
+
+
+class TestStackCache(unittest.TestCase):
+
+    def test(self):
+        dataset_path = tempfile.mkdtemp()
+        try:
+            # Make a dummy dataset
+            frame_num_dict, inputs, labels = {}, {}, {}
+            for data_dir in ['input', 'label']:
+                os.makedirs(join(dataset_path, data_dir))
+            for i in range(10):
+                input_name = 'utt%02d' % i
+                frame_num = np.random.randint(1, 100)
+                frame_num_dict[input_name] = frame_num
+                inputs[input_name] = np.random.randn(frame_num, 5)
+                labels[input_name] = np.random.randint(
+                    0, 30, size=np.random.randint(0, 20))
+                np.save(join(dataset_path, 'input', input_name + '.npy'),
+                        inputs[input_name])
+                np.save(join(dataset_path, 'label', input_name + '.npy'),
+                        labels[input_name])
+            with open(join(dataset_path, 'frame_num.pickle'), 'wb') as f:
+                pickle.dump(frame_num_dict, f)
+
+            # Make the cache
+            corpus = open_stack_cache(dataset_path, 3, 2)
+            path = stack_cache_path(dataset_path, 3, 2)
+            self.assertEqual(corpus.packed_path, path)
+            for input_name in frame_num_dict.keys():
+                i = corpus.index(input_name)
+                stacked_input = stack_frame(
+                    [inputs[input_name]], [input_name + '.npy'],
+                    frame_num_dict, 3, 2)[0]
+                self.assertTrue(np.allclose(corpus.input(i), stacked_input,
+                                            atol=1e-6))
+                self.assertTrue(np.array_equal(
+                    corpus.label(i), labels[input_name]))
+
+            # Reuse the cache in the next run
+            mtime = os.stat(join(path, 'inputs.bin')).st_mtime
+            corpus = open_stack_cache(dataset_path, 3, 2)
+            self.assertEqual(corpus.packed_path, path)
+            self.assertEqual(
+                os.stat(join(path, 'inputs.bin')).st_mtime, mtime)
+
+            # Other frame stacking
+            self.assertNotEqual(stack_cache_path(dataset_path, 2, 2), path)
+
+            # Remake the cache when the dataset is changed
+            np.save(join(dataset_path, 'input', 'utt00.npy'),
+                    np.random.randn(frame_num_dict['utt00'] + 1, 5))
+            future = time.time() + 10
+            os.utime(join(dataset_path, 'input', 'utt00.npy'),
+                     (future, future))
+            self.assertNotEqual(stack_cache_path(dataset_path, 3, 2), path)
+            self.assertEqual(sorted(os.listdir(dirname(path))),
+                             sorted([basename(path),
+                                     basename(path) + '.lock']))
+        finally:
+            shutil.rmtree(dataset_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+from os.path import join
+import sys
+import pickle
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import tensorflow as tf
+
+sys.path.append('../../')
+from utils.tfrecord import write_tfrecord, read_tfrecord
+from utils.frame_stack import stack_frame
+from utils.sparsetensor import sparsetensor2list
+from utils.cmvn import compute_cmvn
+from utils.buffer_pool import BufferPool
+
+
+class TestTFRecord(unittest.TestCase):
+
+    def test(self):
+        dataset_path = tempfile.mkdtemp()
+        try:
+            # Make a dummy dataset
+            frame_num_dict, inputs, labels = {}, {}, {}
+            for data_dir in ['input', 'label']:
+                os.makedirs(join(dataset_path, data_dir))
+            for i in range(10):
+                input_name = 'utt%02d' % i
+                frame_num = np.random.randint(1, 100)
+                frame_num_dict[input_name] = frame_num
+                inputs[input_name] = np.random.randn(frame_num, 5)
+                labels[input_name] = np.random.randint(
+                    0, 30, size=np.random.randint(1, 20))
+                np.save(join(dataset_path, 'input', input_name + '.npy'),
+                        inputs[input_name])
+                np.save(join(dataset_path, 'label', input_name + '.npy'),
+                        labels[input_name])
+            with open(join(dataset_path, 'frame_num.pickle'), 'wb') as f:
+                pickle.dump(frame_num_dict, f)
+
+            for num_stack, num_skip in [(None, None), (3, 2)]:
+                print('----- num_stack: %s, num_skip: %s -----' %
+                      (str(num_stack), str(num_skip)))
+                self.check_reading(dataset_path, frame_num_dict, inputs,
+                                   labels, num_stack, num_skip)
+            self.check_cmvn(dataset_path, frame_num_dict, inputs, 3, 2)
+        finally:
+            shutil.rmtree(dataset_path)
+
+    def check_reading(self, dataset_path, frame_num_dict, inputs, labels,
+                      num_stack, num_skip):
+        tfrecord_path = write_tfrecord(dataset_path, num_stack, num_skip,
+                                       num_shard=3)
+        input_size = 5 if num_stack is None else 5 * num_stack
+
+        # In the order of frame num
+        input_names = [input_name for input_name, _ in sorted(
+            frame_num_dict.items(), key=lambda x: x[1])]
+
+        with tf.Graph().as_default():
+            batch = read_tfrecord(tfrecord_path, input_size=input_size,
+                                  batch_size=4, is_training=False)
+            with tf.Session() as sess:
+                names_read = []
+                while True:
+                    try:
+                        inputs_pad, labels_st, inputs_seq_len, names = \
+                            sess.run(batch)
+                    except tf.errors.OutOfRangeError:
+                        break
+                    labels_list = sparsetensor2list(labels_st, len(names))
+                    for i_batch, name in enumerate(names):
+                        name = name.decode('utf-8')
+                        names_read.append(name)
+                        data_i = inputs[name]
+                        if num_stack is not None:
+                            data_i = stack_frame(
+                                [data_i], [name + '.npy'], frame_num_dict,
+                                num_stack, num_skip)[0]
+                        frame_num = inputs_seq_len[i_batch]
+                        self.assertEqual(frame_num, len(data_i))
+                        self.assertTrue(np.allclose(
+                            inputs_pad[i_batch, :frame_num], data_i,
+                            atol=1e-6))
+                        self.assertEqual(labels_list[i_batch],
+                                         labels[name].tolist())
+
+        self.assertEqual(names_read, input_names)
+
+    def check_cmvn(self, dataset_path, frame_num_dict, inputs, num_stack,
+                   num_skip):
+        tfrecord_path = write_tfrecord(dataset_path, num_stack, num_skip,
+                                       num_shard=3)
+        input_size = 5 * num_stack
+        cmvn = compute_cmvn([join(dataset_path, 'input', input_name + '.npy')
+                             for input_name in frame_num_dict.keys()])
+
+        with tf.Graph().as_default():
+            batch = read_tfrecord(tfrecord_path, input_size=input_size,
+                                  batch_size=4, is_training=False,
+                                  cmvn=cmvn, num_skip=num_skip)
+            with tf.Session() as sess:
+                while True:
+                    try:
+                        inputs_pad, _, inputs_seq_len, names = \
+                            sess.run(batch)
+                    except tf.errors.OutOfRangeError:
+                        break
+                    names = [name.decode('utf-8') for name in names]
+
+                    # The same as mini-batches made by DataSet
+                    input_list = [stack_frame(
+                        [inputs[name]], [name + '.npy'], frame_num_dict,
+                        num_stack, num_skip)[0] for name in names]
+                    inputs_dataset, _ = BufferPool().pad_inputs(
+                        input_list, input_size, cmvn=cmvn,
+                        frame_nums=[frame_num_dict[name] for name in names],
+                        num_skip=num_skip)
+                    self.assertTrue(np.allclose(inputs_pad, inputs_dataset,
+                                                atol=1e-5))
+
+
+if __name__ == '__main__':
+    unittest.main()
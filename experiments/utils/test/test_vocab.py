@@ -0,0 +1,73 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from os.path import join
+import sys
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+sys.path.append('../../')
+from utils.labels.vocab import load_vocab, make_map_table, map_batch
+from utils.labels.phone import num2phone, phone2num
+from utils.labels.character import num2char, char2num
+
+
+class TestVocab(unittest.TestCase):
+
+    def test(self):
+        save_path = tempfile.mkdtemp()
+        try:
+            phones = ['aa', 'ao', 'ax', 'ah', 'q', 'sil']
+            phones_39 = ['aa', 'ah', 'sil']
+            fold = {'aa': 'aa', 'ao': 'aa', 'ax': 'ah', 'ah': 'ah', 'q': '',
+                    'sil': 'sil'}
+            map_file_path = join(save_path, 'phone2num.txt')
+            map_file_path_39 = join(save_path, 'phone2num_39.txt')
+            with open(map_file_path, 'w') as f:
+                for i, phone in enumerate(phones):
+                    f.write('%s  %d\n' % (phone, i))
+            with open(map_file_path_39, 'w') as f:
+                for i, phone in enumerate(phones_39):
+                    f.write('%s  %d\n' % (phone, i))
+
+            # Loaded only once
+            vocab = load_vocab(map_file_path)
+            self.assertTrue(load_vocab(map_file_path) is vocab)
+            self.assertEqual(len(vocab), 6)
+
+            # Conversion
+            self.assertEqual(num2phone([5, 0, 1], map_file_path),
+                             'sil aa ao')
+            self.assertEqual(num2phone(np.array([], dtype=np.int32),
+                                       map_file_path), '')
+            self.assertEqual(phone2num(['sil', 'aa', 'ao'], map_file_path),
+                             [5, 0, 1])
+            self.assertEqual(num2char([1, 0], map_file_path), 'aoaa')
+            self.assertEqual(char2num('', map_file_path), [])
+
+            # Folding of mini-batches
+            table = make_map_table(vocab, load_vocab(map_file_path_39), fold)
+            self.assertEqual(table.tolist(), [0, 0, 1, 1, -1, 2])
+            label_list = [np.random.randint(0, 6, size=np.random.randint(
+                0, 10)) for _ in range(20)]
+            for label_i, mapped_i in zip(label_list,
+                                         map_batch(table, label_list)):
+                mapped_ref = [phones_39.index(fold[phones[index]])
+                              for index in label_i
+                              if fold[phones[index]] != '']
+                self.assertEqual(mapped_i.tolist(), mapped_ref)
+            self.assertEqual([x.tolist() for x in map_batch(
+                table, [[], [4, 4]])], [[], []])
+            self.assertEqual(map_batch(table, []), [])
+        finally:
+            shutil.rmtree(save_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,279 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Sharded TFRecord format & input pipeline in the graph.
+   A dataset directory in the per-utterance layout (see packed_corpus.py)
+   is converted into
+       tfrecord(_stack*_skip*)/shard-00000-of-00008.tfrecord
+       ...
+   Each record has the name of the utterance, the (frame-stacked) float32
+   features as raw bytes, the frame num (before & after frame stacking) and
+   the labels. Utterances are
+   divided into shards in the order of frame num, so that reading shards in
+   order gives the same order as DataSet(is_sorted=True).
+
+   read_tfrecord() makes tensors of mini-batches with parallel parsing,
+   bucketing by frame num, padding and prefetch, which can be used instead
+   of the placeholders of inputs, labels and inputs_seq_len.
+
+   Usage (in experiments/):
+       python -m utils.tfrecord path_to_dataset num_stack num_skip [num_shard]
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+from os.path import join, isfile
+import sys
+import glob
+import pickle
+import numpy as np
+import tensorflow as tf
+
+from .packed_corpus import _utterance_path
+from .frame_stack import _stack_utterance
+from .sparsetensor import dense2sparse
+from .progressbar import wrap_iterator
+
+
+def tfrecord_dir(dataset_path, num_stack=None, num_skip=None):
+    """Return the path to the TFRecord files of the dataset.
+    Args:
+        dataset_path: path to the dataset including frame_num.pickle
+        num_stack: int, the number of frames to stack
+        num_skip: int, the number of frames to skip
+    Returns:
+        path to the TFRecord files
+    """
+    if num_stack is None or num_skip is None:
+        return join(dataset_path, 'tfrecord')
+    return join(dataset_path,
+                'tfrecord_stack%d_skip%d' % (num_stack, num_skip))
+
+
+def write_tfrecord(dataset_path, num_stack=None, num_skip=None, num_shard=8,
+                   save_path=None, is_progressbar=False):
+    """Convert the per-utterance dataset to sharded TFRecord files.
+    Args:
+        dataset_path: path to the dataset including frame_num.pickle
+        num_stack: int, the number of frames to stack
+        num_skip: int, the number of frames to skip
+        num_shard: int, the number of TFRecord files
+        save_path: path to save TFRecord files. If None, use tfrecord_dir()
+        is_progressbar: if True, visualize progressbar
+    Returns:
+        save_path: path to TFRecord files
+    """
+    if save_path is None:
+        save_path = tfrecord_dir(dataset_path, num_stack, num_skip)
+    if not os.path.isdir(save_path):
+        os.makedirs(save_path)
+
+    # Load the frame number dictionary
+    frame_num_dict_path = join(dataset_path, 'frame_num.pickle')
+    if not isfile(frame_num_dict_path):
+        # Attention datasets
+        frame_num_dict_path = join(dataset_path, 'frame_num_dict.pickle')
+    with open(frame_num_dict_path, 'rb') as f:
+        frame_num_dict = pickle.load(f)
+
+    # Sort by frame num in the same way as DataSet
+    frame_num_tuple_sorted = sorted(frame_num_dict.items(), key=lambda x: x[1])
+    input_names = [input_name for input_name, _ in frame_num_tuple_sorted]
+
+    # Divide utterances into shards in the order of frame num
+    num_shard = max(min(num_shard, len(input_names)), 1)
+    shard_ids = np.array_split(np.arange(len(input_names)), num_shard)
+    shard_index = np.zeros((len(input_names),), dtype=np.int64)
+    for i_shard, indices in enumerate(shard_ids):
+        shard_index[indices] = i_shard
+
+    writer = None
+    for i in wrap_iterator(range(len(input_names)), is_progressbar):
+        if writer is None or shard_index[i] != shard_index[i - 1]:
+            if writer is not None:
+                writer.close()
+            writer = tf.python_io.TFRecordWriter(join(
+                save_path, 'shard-%05d-of-%05d.tfrecord' %
+                (shard_index[i], num_shard)))
+
+        input_name = input_names[i]
+        inputs = np.load(_utterance_path(dataset_path, 'input', input_name))
+        labels = np.load(_utterance_path(dataset_path, 'label', input_name))
+        if labels.dtype.kind not in 'iu':
+            raise ValueError('Only labels of indices can be written.')
+        frame_num_raw = inputs.shape[0]
+        if num_stack is not None and num_skip is not None:
+            frame_num_decimated = int(np.ceil(inputs.shape[0] / num_skip))
+            inputs = _stack_utterance(
+                inputs, frame_num_decimated, num_stack, num_skip)
+        writer.write(_make_example(input_name, inputs, labels,
+                                   frame_num_raw))
+    if writer is not None:
+        writer.close()
+
+    return save_path
+
+
+def _make_example(input_name, inputs, labels, frame_num_raw):
+    """
+    Args:
+        input_name: string, the name of the utterance
+        inputs: A numpy array of size `[frame_num, input_size]`
+        labels: A numpy array of size `[label_len]`
+        frame_num_raw: int, the number of frames before frame stacking
+    Returns:
+        A serialized tf.train.Example
+    """
+    inputs = np.ascontiguousarray(inputs, dtype=np.float32)
+    feature = {
+        'input_name': tf.train.Feature(bytes_list=tf.train.BytesList(
+            value=[input_name.encode('utf-8')])),
+        'inputs': tf.train.Feature(bytes_list=tf.train.BytesList(
+            value=[inputs.tobytes()])),
+        'frame_num': tf.train.Feature(int64_list=tf.train.Int64List(
+            value=[inputs.shape[0]])),
+        'frame_num_raw': tf.train.Feature(int64_list=tf.train.Int64List(
+            value=[frame_num_raw])),
+        'labels': tf.train.Feature(int64_list=tf.train.Int64List(
+            value=labels.astype(np.int64).tolist())),
+    }
+    example = tf.train.Example(features=tf.train.Features(feature=feature))
+    return example.SerializeToString()
+
+
+def _parse_example(serialized, input_size, cmvn=None, num_skip=None):
+    """Parse one record in the graph.
+    Args:
+        serialized: A string tensor of the serialized tf.train.Example
+        input_size: int, the dimension of (frame-stacked) inputs
+        cmvn: An instance of CMVN (utils/cmvn.py). If set, inputs are
+            normalized
+        num_skip: int, the number of frames skipped in frame stacking. If
+            set with cmvn, the sub-frames padded by frame stacking are kept
+            0 after normalization as in utils/buffer_pool.py
+    Returns:
+        inputs: A float32 tensor of size `[frame_num, input_size]`
+        labels: An int32 tensor of size `[label_len]`
+        frame_num: An int64 tensor
+        input_name: A string tensor
+    """
+    feature_spec = {
+        'input_name': tf.FixedLenFeature([], tf.string),
+        'inputs': tf.FixedLenFeature([], tf.string),
+        'frame_num': tf.FixedLenFeature([], tf.int64),
+        'labels': tf.VarLenFeature(tf.int64),
+    }
+    if cmvn is not None and num_skip is not None:
+        # NOTE: TFRecord files written without this must be written again
+        feature_spec['frame_num_raw'] = tf.FixedLenFeature([], tf.int64)
+    features = tf.parse_single_example(serialized, features=feature_spec)
+    inputs = tf.reshape(tf.decode_raw(features['inputs'], tf.float32),
+                        [-1, input_size])
+    if cmvn is not None:
+        inputs = cmvn.normalize_tensor(
+            inputs, frame_num=features.get('frame_num_raw'),
+            num_skip=num_skip)
+    labels = tf.cast(tf.sparse_tensor_to_dense(features['labels']), tf.int32)
+    return inputs, labels, features['frame_num'], features['input_name']
+
+
+def read_tfrecord(tfrecord_path, input_size, batch_size, is_training=True,
+                  bucket_boundaries=None, num_threads=4, shuffle_size=1000,
+                  prefetch_size=4, cmvn=None, num_skip=None):
+    """Make mini-batches from TFRecord files in the graph.
+    Args:
+        tfrecord_path: path to TFRecord files made by write_tfrecord()
+        input_size: int, the dimension of (frame-stacked) inputs
+        batch_size: int, the size of mini-batch
+        is_training: if True, shuffle utterances and repeat the dataset
+            endlessly. Otherwise, read utterances once in the order of frame
+            num (tf.errors.OutOfRangeError is raised at the end).
+        bucket_boundaries: list of frame nums. If set, utterances are grouped
+            into buckets by these boundaries, and each mini-batch is made from
+            one bucket. Only used when is_training is True.
+        num_threads: int, the number of threads to parse records
+        shuffle_size: int, the size of the shuffle buffer
+        prefetch_size: int, the number of mini-batches prepared in advance
+        cmvn: An instance of CMVN (utils/cmvn.py). If set, inputs are
+            normalized in the graph, so that TFRecord files can be written
+            without normalization
+        num_skip: int, the number of frames skipped in frame stacking of
+            the TFRecord files. Set this with cmvn for frame-stacked inputs.
+    Returns:
+        inputs: A float32 tensor of size `[B, T, input_size]`
+        labels_st: A SparseTensor of labels
+        inputs_seq_len: An int64 tensor of size `[B]`
+        input_names: A string tensor of size `[B]`
+    """
+    shard_paths = sorted(glob.glob(join(tfrecord_path, '*.tfrecord')))
+    if len(shard_paths) == 0:
+        raise ValueError('There are no TFRecord files in %s.' % tfrecord_path)
+
+    if hasattr(tf, 'data'):
+        # TensorFlow >= 1.4
+        dataset = tf.data.TFRecordDataset(shard_paths)
+        if is_training:
+            dataset = dataset.shuffle(shuffle_size).repeat()
+        dataset = dataset.map(lambda x: _parse_example(x, input_size, cmvn, num_skip),
+                              num_parallel_calls=num_threads)
+    else:
+        dataset = tf.contrib.data.TFRecordDataset(shard_paths)
+        if is_training:
+            dataset = dataset.shuffle(shuffle_size).repeat()
+        dataset = dataset.map(lambda x: _parse_example(x, input_size, cmvn, num_skip),
+                              num_threads=num_threads,
+                              output_buffer_size=prefetch_size * batch_size)
+
+    padded_shapes = ([None, input_size], [None], [], [])
+    padding_values = (0., -1, np.int64(0), '')
+
+    def batching(dataset):
+        return dataset.padded_batch(batch_size, padded_shapes,
+                                    padding_values=padding_values)
+
+    if is_training and bucket_boundaries is not None:
+        boundaries = tf.constant(bucket_boundaries, dtype=tf.int64)
+
+        def key_func(inputs, labels, frame_num, input_name):
+            return tf.reduce_sum(tf.cast(frame_num >= boundaries, tf.int64))
+
+        def reduce_func(key, dataset):
+            return batching(dataset)
+
+        if hasattr(tf, 'data'):
+            dataset = dataset.apply(tf.contrib.data.group_by_window(
+                key_func, reduce_func, window_size=batch_size))
+        else:
+            dataset = dataset.group_by_window(
+                key_func, reduce_func, window_size=batch_size)
+    else:
+        dataset = batching(dataset)
+
+    if hasattr(dataset, 'prefetch'):
+        dataset = dataset.prefetch(prefetch_size)
+
+    inputs, labels, inputs_seq_len, input_names = \
+        dataset.make_one_shot_iterator().get_next()
+    labels_st = dense2sparse(labels, padded_value=-1)
+
+    return inputs, labels_st, inputs_seq_len, input_names
+
+
+if __name__ == '__main__':
+
+    args = sys.argv
+    if len(args) not in [4, 5]:
+        raise ValueError(
+            ("Set a path to dataset and frame stacking.\n"
+             "Usase: python -m utils.tfrecord path_to_dataset "
+             "num_stack num_skip [num_shard]"))
+    num_shard = int(args[4]) if len(args) == 5 else 8
+    print('=> Writing ' + args[1] + '...')
+    print('Saved in ' + write_tfrecord(args[1],
+                                       num_stack=int(args[2]),
+                                       num_skip=int(args[3]),
+                                       num_shard=num_shard,
+                                       is_progressbar=True))
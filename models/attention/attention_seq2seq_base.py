@@ -8,7 +8,7 @@ from __future__ import division
 from __future__ import print_function
 
 import tensorflow as tf
-# from .decoders.beam_search_decoder_from_seq2seq import BeamSearchDecoder
+from .decoders.beam_search_decoder import BeamSearchDecoder
 
 
 OPTIMIZER_CLS_NAMES = {
@@ -39,6 +39,8 @@ class AttentionBase(object):
         clip_grad: A float value. Range of gradient clipping (> 0)
         weight_decay: A float value. Regularization parameter for weight decay
         beam_width: if 0, use greedy decoding
+        length_penalty_weight: the weight of the length penalty in beam search
+        beam_top_n: the number of hypotheses to output by beam search
     """
 
     def __init__(self,
@@ -52,6 +54,8 @@ class AttentionBase(object):
                  clip_grad,
                  weight_decay,
                  beam_width,
+                 length_penalty_weight=0.0,
+                 beam_top_n=1,
                  name=None):
 
         # Network size
@@ -69,6 +73,8 @@ class AttentionBase(object):
         self.sos_index = sos_index
         self.eos_index = eos_index
         self.beam_width = beam_width
+        self.length_penalty_weight = length_penalty_weight
+        self.beam_top_n = beam_top_n
 
         # Summaries for TensorBoard
         self.summaries_train = []
@@ -87,47 +93,6 @@ class AttentionBase(object):
                     self.parameter_init))
         # TODO: Consider shape of target_embedding
 
-    def choose_top_k(scores_flat, config):
-        """Chooses the top-k beams as successors.
-        Args:
-            scores:
-            config:
-        Returns:
-            next_beam_scores:
-            word_indices:
-        """
-        next_beam_scores, word_indices = tf.nn.top_k(
-            scores_flat, k=config.beam_width)
-        return next_beam_scores, word_indices
-
-    # def _beam_search_decoder_wrapper(self, decoder, beam_width=None,
-    #                                  length_penalty_weight=0.0):
-    #     """Wraps a decoder into a Beam Search decoder.
-    #     Args:
-    #         decoder: The decoder class instance
-    #         beam_width: Number of beams to use, an integer
-    #         length_penalty_weight: Weight for the length penalty factor. 0.0
-    #             disables the penalty.
-    #         choose_successors_fn: A function used to choose beam successors
-    #             based on their scores.
-    #             Maps from (scores, config) => (chosen scores, chosen_ids)
-    #     Returns:
-    #         A BeamSearchDecoder with the same interfaces as the decoder.
-    #     """
-    #     if beam_width is None:
-    #         # Greedy decoding
-    #         return decoder
-    #
-    #     config = BeamSearchConfig(
-    #         beam_width=beam_width,
-    #         vocab_size=self.num_classes,
-    #         eos_token=self.eos_index,
-    #         length_penalty_weight=length_penalty_weight,
-    #         choose_successors_fn=self.choose_top_k)
-    #
-    #     return BeamSearchDecoder(decoder=decoder,
-    #                              config=config)
-
     @property
     def decode(self):
         """Return operation for decoding."""
@@ -206,7 +171,6 @@ class AttentionBase(object):
         # Output tensor has shape [2, 3].
         # tf.fill([2, 3], 9) ==> [[9, 9, 9]
         #                         [9, 9, 9]]
-        # TODO: beam_search_decoder
 
         decoder_initial_state = bridge(reuse=True)
 
@@ -219,6 +183,39 @@ class AttentionBase(object):
 
         return (decoder_outputs, final_state)
 
+    def _decode_infer_beam(self, decoder, bridge, encoder_outputs):
+        """Runs decoding in inference mode by beam search.
+        Args:
+            decoder: An instance of the decoder class
+            bridge:
+            encoder_outputs: A namedtuple of
+                outputs
+                final_state
+                attention_values
+                attention_values_length
+        Returns:
+            decoder_outputs: A tuple of `(BeamSearchDecoderOutput,
+                final_state)`. They are batch-major.
+        """
+        target_embedding = self._generate_target_embedding(reuse=True)
+
+        beam_search_decoder = BeamSearchDecoder(
+            decoder=decoder,
+            embedding=target_embedding,
+            beam_width=self.beam_width,
+            sos_index=self.sos_index,
+            eos_index=self.eos_index,
+            length_penalty_weight=self.length_penalty_weight,
+            top_n=self.beam_top_n)
+
+        decoder_initial_state = bridge(reuse=True)
+
+        # Call decoder class
+        (decoder_outputs, final_state) = beam_search_decoder(
+            initial_state=decoder_initial_state)
+
+        return (decoder_outputs, final_state)
+
     def compute_loss(self, inputs, labels, inputs_seq_len, labels_seq_len,
                      keep_prob_input, keep_prob_hidden, num_gpu=1, scope=None):
         """Operation for computing cross entropy sequence loss.
@@ -384,7 +381,8 @@ class AttentionBase(object):
             decoder_outputs_train:
             decoder_outputs_infer:
             decode_type: greedy or beam_search
-            beam_width: beam width for beam search
+            beam_width: beam width for beam search. This must be the
+                beam_width of the model.
         Return:
             decoded_train: operation for decoding in training
             decoded_infer: operation for decoding in inference
@@ -399,7 +397,13 @@ class AttentionBase(object):
         elif decode_type == 'beam_search':
             if beam_width is None:
                 raise ValueError('Set beam_width.')
-            raise NotImplementedError
+            if beam_width != self.beam_width:
+                raise ValueError(
+                    'beam_width must be the one of the model (%d).' %
+                    self.beam_width)
+            decoded_train = decoder_outputs_train.predicted_ids
+            # The best hypothesis of each utterance
+            decoded_infer = self.decoder_outputs_beam.predicted_ids[:, 0]
 
         return decoded_train, decoded_infer
 
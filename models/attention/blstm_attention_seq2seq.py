@@ -48,6 +48,16 @@ class BLSTMAttetion(AttentionBase):
             layers
         weight_decay: A float value. Regularization parameter for weight decay
         time-major:
+        num_stack: int, the number of frames to stack in the encoder
+        num_skip: int, the number of frames to skip in the encoder
+        attention_window_size: int, if set, only this number of frames
+            around the previous attention peak are scored in each step
+        attention_window_type: centered or monotonic
+        beam_width: int, if more than 0, the inference graph of beam search
+            is also built
+        length_penalty_weight: A float value. The weight of the length
+            penalty in beam search
+        beam_top_n: int, the number of hypotheses to output by beam search
     """
 
     def __init__(self,
@@ -74,12 +84,19 @@ class BLSTMAttetion(AttentionBase):
                  weight_decay=0.0,
                  beam_width=0,
                  time_major=True,
+                 num_stack=None,
+                 num_skip=None,
+                 attention_window_size=None,
+                 attention_window_type='centered',
+                 length_penalty_weight=0.0,
+                 beam_top_n=1,
                  name='blstm_attention_seq2seq'):
 
         AttentionBase.__init__(self, batch_size, input_size,
                                attention_dim, embedding_dim,
                                output_size, sos_index, eos_index,
-                               clip_grad, weight_decay, beam_width, name)
+                               clip_grad, weight_decay, beam_width,
+                               length_penalty_weight, beam_top_n, name)
 
         # Network size
         self.encoder_num_unit = encoder_num_unit
@@ -107,6 +124,14 @@ class BLSTMAttetion(AttentionBase):
         # recommended
         self.time_major = time_major
 
+        # Frame stacking in the encoder
+        self.num_stack = num_stack
+        self.num_skip = num_skip
+
+        # Windowed attention
+        self.attention_window_size = attention_window_size
+        self.attention_window_type = attention_window_type
+
     def _encode(self, inputs, inputs_seq_len,
                 keep_prob_input, keep_prob_hidden):
         """Encode input features.
@@ -127,7 +152,9 @@ class BLSTMAttetion(AttentionBase):
             num_layer=self.encoder_num_layer,
             parameter_init=self.parameter_init,
             clip_activation=self.clip_activation_encoder,
-            num_proj=None)
+            num_proj=None,
+            num_stack=self.num_stack,
+            num_skip=self.num_skip)
 
         encoder_outputs = encoder(inputs=inputs,
                                   inputs_seq_len=inputs_seq_len)
@@ -146,7 +173,9 @@ class BLSTMAttetion(AttentionBase):
         self.attention_layer = AttentionLayer(
             num_unit=self.attention_dim,
             attention_weights_tempareture=self.attention_weights_tempareture,
-            attention_type='bahdanau')
+            attention_type='bahdanau',
+            window_size=self.attention_window_size,
+            window_type=self.attention_window_type)
 
         # Define RNN decoder
         rnn_decoder = load_decoder(model_type='lstm_decoder')
@@ -191,12 +220,6 @@ class BLSTMAttetion(AttentionBase):
         # NOTE: initial_state and helper will be substituted in
         # self._decode_train() or self._decode_infer()
 
-        # Wrap decoder
-        # decoder_train = self._beam_search_decoder_wrapper(decoder_train,
-        #                                                   beam_width=20)
-        # decoder_infer = self._beam_search_decoder_wrapper(decoder_infer,
-        #                                                   beam_width=20)
-
         # Connect between encoder and decoder
         bridge = InitialStateBridge(
             encoder_outputs=encoder_outputs,
@@ -218,6 +241,16 @@ class BLSTMAttetion(AttentionBase):
             encoder_outputs=encoder_outputs)
         # NOTE: decoder_outputs are time-major
 
+        # Inference by beam search
+        self.decoder_outputs_beam = None
+        if self.beam_width > 0:
+            decoder_infer_beam = self._create_decoder(encoder_outputs, labels)
+            self.decoder_outputs_beam, _ = self._decode_infer_beam(
+                decoder=decoder_infer_beam,
+                bridge=bridge,
+                encoder_outputs=encoder_outputs)
+            # NOTE: These are batch-major
+
         # Transpose to batch-major
         if self.time_major:
             logits = time2batch(decoder_outputs_train.logits)
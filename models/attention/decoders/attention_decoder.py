@@ -52,6 +52,9 @@ class AttentionDecoder(tf.contrib.seq2seq.Decoder):
         attention_layer: The attention function to use. This function map from
             `(state, inputs)` to `(attention_weights, attention_context)`.
             For an example, see `decoders.attention_layer.AttentionLayer`.
+            If its window_size is set, the decoder state is a tuple of
+            `(cell_state, attention_peak)` to carry the peak of attention
+            weights to the next step.
         time-major:
     """
 
@@ -82,6 +85,7 @@ class AttentionDecoder(tf.contrib.seq2seq.Decoder):
         # Not initialized yet
         self.initial_state = None
         self.helper = None
+        self.attention_keys = None
 
     def __call__(self, *args, **kwargs):
         # TODO: variable_scope
@@ -105,6 +109,10 @@ class AttentionDecoder(tf.contrib.seq2seq.Decoder):
             attention_scores=tf.float32,
             attention_context=tf.float32)
 
+    @property
+    def is_windowed(self):
+        return getattr(self.attention_layer, 'window_size', None) is not None
+
     @property
     def batch_size(self):
         return tf.shape(nest.flatten([self.initial_state])[0])[0]
@@ -169,6 +177,12 @@ class AttentionDecoder(tf.contrib.seq2seq.Decoder):
             first_inputs:
             initial_state:
         """
+        # Project the encoder outputs for attention once per utterance.
+        # NOTE: This is in the same variable scope as the decoding step.
+        with tf.variable_scope("step", reuse=self.reuse):
+            self.attention_keys = self.attention_layer.compute_keys(
+                self.attention_encoder_states)
+
         # Create inputs for the first time step
         finished, first_inputs = self.helper.initialize()
         # NOTE: first_inputs: `[batch_size, embedding_dim]`
@@ -186,12 +200,19 @@ class AttentionDecoder(tf.contrib.seq2seq.Decoder):
         # tf.shape(tf.concat([t3, t4], 0)) ==> [4, 3]
         # tf.shape(tf.concat([t3, t4], 1)) ==> [2, 6]
 
+        if self.is_windowed:
+            # Attention begins at the first frame
+            attention_peak = tf.zeros(shape=[batch_size], dtype=tf.int32)
+            return finished, first_inputs, (self.initial_state,
+                                            attention_peak)
         return finished, first_inputs, self.initial_state
 
-    def compute_output(self, cell_output):
+    def compute_output(self, cell_output, attention_peak=None):
         """Computes the decoder outputs at each time.
         Args:
             cell_output: The previous state of the decoder
+            attention_peak: An int32 tensor of shape `[batch_size]`, the peak
+                of attention weights in the previous step (windowed attention)
         Returns:
             softmax_input:
             logits:
@@ -203,7 +224,9 @@ class AttentionDecoder(tf.contrib.seq2seq.Decoder):
             encoder_states=self.attention_encoder_states,
             current_decoder_state=cell_output,
             values=self.attention_values,
-            values_length=self.attention_values_length)
+            values_length=self.attention_values_length,
+            keys=self.attention_keys,
+            attention_peak=attention_peak)
 
         # TODO: Make this a parameter: We may or may not want this.
         # Transform attention context.
@@ -282,10 +305,14 @@ class AttentionDecoder(tf.contrib.seq2seq.Decoder):
                     complete, for each sequence in the batch.
         """
         with tf.variable_scope("step", reuse=self.reuse):
+            attention_peak = None
+            if self.is_windowed:
+                state, attention_peak = state
+
             # Call LSTMCell
             cell_output_prev, cell_state_prev = self.cell(inputs, state)
             cell_output, logits, attention_weights, attention_context = \
-                self.compute_output(cell_output_prev)
+                self.compute_output(cell_output_prev, attention_peak)
 
             sample_ids = self.helper.sample(time=time,
                                             outputs=logits,
@@ -304,4 +331,8 @@ class AttentionDecoder(tf.contrib.seq2seq.Decoder):
                 state=cell_state_prev,
                 sample_ids=sample_ids)
 
+            if self.is_windowed:
+                next_state = (next_state, tf.to_int32(
+                    tf.argmax(attention_weights, axis=1)))
+
             return (outputs, next_state, next_inputs, finished)
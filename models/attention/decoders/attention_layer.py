@@ -17,24 +17,55 @@ class AttentionLayer(object):
             "Neural machine translation by jointly learning to align and
             translate."
             arXiv preprint arXiv:1409.0473 (2014).
+
+       If window_size is set, only window_size frames around the peak of the
+       attention weights in the previous step are scored, so that the cost of
+       each step does not depend on the input length.
     Args:
         num_unit: Number of units used in the attention layer
         attention_type: bahdanau or layer_dot
+        window_size: int, the number of frames to score in each step. If
+            None, all frames are scored.
+        window_type: centered or monotonic. If centered, the window is
+            centered on the previous peak. If monotonic, the window begins
+            at the previous peak, so that attention only moves forward.
     """
 
     def __init__(self, num_unit, attention_weights_tempareture,
-                 attention_type='bahdanau', name='attention_layer'):
+                 attention_type='bahdanau', window_size=None,
+                 window_type='centered', name='attention_layer'):
+        if window_type not in ['centered', 'monotonic']:
+            raise ValueError('window_type is "centered" or "monotonic".')
         self.num_unit = num_unit
         self.attention_weights_tempareture = attention_weights_tempareture
         self.attention_type = attention_type
+        self.window_size = window_size
+        self.window_type = window_type
         self.name = name
 
     def __call__(self, *args, **kwargs):
         # TODO: variable_scope
         return self._build(*args, **kwargs)
 
+    def compute_keys(self, encoder_states):
+        """Project the encoder outputs for attention scores. This does not
+           depend on the decoder state, so it should be computed once per
+           utterance before decoding and passed to each decoding step.
+        Args:
+            encoder_states: A tensor of shape
+                `[batch_size, max_time, encoder_num_units]`
+        Returns:
+            A tensor of shape `[batch_size, max_time, num_unit]`
+        """
+        # h_j (j: time index of input) => U_a * h_j
+        return tf.contrib.layers.fully_connected(
+            inputs=encoder_states,
+            num_outputs=self.num_unit,
+            activation_fn=None,
+            scope="att_encoder_states")
+
     def _build(self, encoder_states, current_decoder_state, values,
-               values_length):
+               values_length, keys=None, attention_peak=None):
         """Computes attention scores and outputs.
         Args:
             encoder_states: The outputs of the encoder and equivalent to
@@ -49,6 +80,11 @@ class AttentionLayer(object):
                 A tensor of shape `[batch_size, max_time, encoder_num_units]`.
             values_length: An int32 tensor of shape `[batch_size]` defining
                 the sequence length of the attention values.
+            keys: The output of compute_keys(encoder_states). If None, this is
+                computed here (in every decoding step).
+            attention_peak: An int32 tensor of shape `[batch_size]`, the index
+                of the max attention weight in the previous step. Required
+                if window_size is set.
         Returns:
             A tuple `(attention_weights, attention_context)`.
                 `attention_weights` is vector of length `time` where each
@@ -62,12 +98,8 @@ class AttentionLayer(object):
         # Fully connected layers to transform both encoder_states and
         # current_decoder_state into a tensor with `num_unit` units
         # h_j (j: time index of input) => U_a * h_j
-        att_encoder_states = tf.contrib.layers.fully_connected(
-            inputs=encoder_states,
-            num_outputs=self.num_unit,
-            activation_fn=None,
-            # reuse=True,
-            scope="att_encoder_states")
+        if keys is None:
+            keys = self.compute_keys(encoder_states)
 
         # s_{i-1} (i: time index of output) => W_a * s_{i-1}
         att_decoder_state = tf.contrib.layers.fully_connected(
@@ -80,45 +112,108 @@ class AttentionLayer(object):
         # decoder_num_units
         # NOTE: エンコーダがBidirectionalのときユニット数を2倍にすることに注意??
 
+        if self.window_size is not None:
+            return self._build_window(keys, att_decoder_state, values,
+                                      values_length, attention_peak)
+
         # Compute attention scores over encoder outputs (energy: e_ij)
         # v_a = f(U_a * h_j, W_a * s_{i-1})
-        scores = self.attention_score_func(att_encoder_states,
-                                           att_decoder_state)
+        scores = self.attention_score_func(keys, att_decoder_state)
 
         # Replace all scores for padded inputs with tf.float32.min
         num_scores = tf.shape(scores)[1]  # input length
         scores_mask = tf.sequence_mask(
             lengths=tf.to_int32(values_length),
-            maxlen=tf.to_int32(num_scores),
-            dtype=tf.float32)
+            maxlen=tf.to_int32(num_scores))
         # ex.)
         # tf.sequence_mask([1, 3, 2], 5) = [[True, False, False, False, False],
         #                                   [True, True, True, False, False],
         #                                   [True, True, False, False, False]]
-        scores = scores * scores_mask + ((1.0 - scores_mask) * tf.float32.min)
-        # TODO: For underflow?
+        scores = tf.where(scores_mask,
+                          scores / self.attention_weights_tempareture,
+                          tf.fill(tf.shape(scores), tf.float32.min))
 
         # Normalize the scores (attention_weights: α_ij (j=0,1,...))
-        # attention_weights = tf.nn.softmax(
-        #     scores, name="attention_weights")
-        attention_weights = tf.exp(scores / self.attention_weights_tempareture) / \
-            tf.reduce_sum(tf.exp(scores / self.attention_weights_tempareture),
-                          axis=-1,
-                          keep_dims=True)
+        # NOTE: tf.nn.softmax subtracts the max score, so that tf.exp never
+        # overflows
+        attention_weights = tf.nn.softmax(scores, name="attention_weights")
 
         # Calculate the weighted average of the attention inputs
         # according to the scores
         # c_i = sigma_{j}(α_ij * h_j)
-        attention_context = tf.expand_dims(
-            attention_weights, axis=2) * values
-        attention_context = tf.reduce_sum(
-            attention_context, axis=1, name="attention_context")
+        attention_context = tf.squeeze(
+            tf.matmul(tf.expand_dims(attention_weights, axis=1), values),
+            axis=1, name="attention_context")
         values_depth = values.get_shape().as_list()[-1]  # = encoder_num_units
         # `[batch_size, encoder_num_units]`
         attention_context.set_shape([None, values_depth])
 
         return (attention_weights, attention_context)
 
+    def _build_window(self, keys, att_decoder_state, values, values_length,
+                      attention_peak):
+        """Computes attention scores and outputs in the window.
+        Args:
+            keys: A tensor of shape `[batch_size, max_time, num_unit]`
+            att_decoder_state: A tensor of shape `[batch_size, num_unit]`
+            values: A tensor of shape `[batch_size, max_time, encoder_num_units]`
+            values_length: An int32 tensor of shape `[batch_size]`
+            attention_peak: An int32 tensor of shape `[batch_size]`
+        Returns:
+            The same as _build(). Attention weights out of the window are 0.
+        """
+        if attention_peak is None:
+            raise ValueError('Set attention_peak for windowed attention.')
+        batch_size = tf.shape(values)[0]
+        max_time = tf.shape(values)[1]
+
+        # The first frame of the window, `[batch_size]`
+        if self.window_type == 'centered':
+            window_begin = attention_peak - self.window_size // 2
+        else:
+            window_begin = attention_peak
+        window_begin = tf.minimum(
+            tf.maximum(window_begin, 0),
+            tf.maximum(tf.to_int32(values_length) - self.window_size, 0))
+
+        # `[batch_size, window_size]`
+        positions = tf.expand_dims(window_begin, axis=1) + \
+            tf.expand_dims(tf.range(self.window_size), axis=0)
+        # NOTE: positions beyond the input are masked below
+        gather_indices = tf.stack(
+            [tf.tile(tf.expand_dims(tf.range(batch_size), axis=1),
+                     [1, self.window_size]),
+             tf.minimum(positions, max_time - 1)], axis=2)
+        keys_window = tf.gather_nd(keys, gather_indices)
+        values_window = tf.gather_nd(values, gather_indices)
+
+        # Compute attention scores in the window
+        scores = self.attention_score_func(keys_window, att_decoder_state)
+        scores_mask = positions < tf.expand_dims(
+            tf.to_int32(values_length), axis=1)
+        scores = tf.where(scores_mask,
+                          scores / self.attention_weights_tempareture,
+                          tf.fill(tf.shape(scores), tf.float32.min))
+        attention_weights_window = tf.nn.softmax(scores)
+
+        # c_i = sigma_{j in window}(α_ij * h_j)
+        attention_context = tf.squeeze(
+            tf.matmul(tf.expand_dims(attention_weights_window, axis=1),
+                      values_window),
+            axis=1, name="attention_context")
+        values_depth = values.get_shape().as_list()[-1]  # = encoder_num_units
+        attention_context.set_shape([None, values_depth])
+
+        # Put the weights back to the positions in the input
+        # NOTE: masked positions have no weights, so duplicated positions
+        # (when the input is shorter than the window) are not added up
+        attention_weights = tf.scatter_nd(
+            gather_indices,
+            attention_weights_window * tf.to_float(scores_mask),
+            shape=tf.stack([batch_size, max_time]))
+
+        return (attention_weights, attention_context)
+
     def attention_score_func(self, encoder_states, current_decoder_state):
         """An attention layer that calculates attention scores.
         Args:
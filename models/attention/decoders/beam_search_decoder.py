@@ -0,0 +1,403 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Batched beam search decoder wrapping AttentionDecoder.
+   All hypotheses of all utterances are decoded at once as a batch of
+   `batch_size * beam_width`. The encoder outputs (and the keys of the
+   attention layer) are tiled per beam only once before the decoding loop.
+   A finished hypothesis is extended by only <EOS> with no cost, so that
+   its score is kept. An utterance is finished when its top_n hypotheses
+   are finished, and the rest of its hypotheses are pruned.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from collections import namedtuple
+import tensorflow as tf
+from tensorflow.python.util import nest
+from .dynamic_decoder import dynamic_decode
+
+
+class BeamSearchState(namedtuple(
+        "BeamSearchState",
+        [
+            "cell_state",
+            "attention_peak",
+            "log_probs",
+            "finished",
+            "lengths"
+        ])):
+    """
+    Args:
+        cell_state: The state of the RNN cell of each hypothesis
+        attention_peak: An int32 tensor of `[batch_size * beam_width]`
+            (windowed attention), or a dummy tensor
+        log_probs: A float32 tensor of `[batch_size * beam_width]`, the sum of
+            log probabilities of each hypothesis
+        finished: A bool tensor of `[batch_size * beam_width]`
+        lengths: An int32 tensor of `[batch_size * beam_width]`, the length of
+            each hypothesis including <EOS>
+    """
+    pass
+
+
+class BeamSearchStepOutput(namedtuple(
+        "BeamSearchStepOutput",
+        [
+            "scores",
+            "predicted_ids",
+            "parent_ids"
+        ])):
+    """
+    Args:
+        scores: A float32 tensor of `[batch_size, beam_width]`, the length
+            normalized scores of hypotheses
+        predicted_ids: An int32 tensor of `[batch_size, beam_width]`
+        parent_ids: An int32 tensor of `[batch_size, beam_width]`, the beam
+            each hypothesis comes from
+    """
+    pass
+
+
+class BeamSearchDecoderOutput(namedtuple(
+        "BeamSearchDecoderOutput",
+        [
+            "predicted_ids",
+            "scores",
+            "lengths"
+        ])):
+    """
+    Args:
+        predicted_ids: An int32 tensor of `[batch_size, top_n, time]`
+            (batch-major). Labels after <EOS> are <EOS>.
+        scores: A float32 tensor of `[batch_size, top_n]`
+        lengths: An int32 tensor of `[batch_size, top_n]`
+    """
+    pass
+
+
+def tile_beam(tensor, beam_width):
+    """Repeat each utterance beam_width times.
+    Args:
+        tensor: A tensor of `[batch_size, ...]`
+        beam_width: int
+    Returns:
+        A tensor of `[batch_size * beam_width, ...]`
+    """
+    tensor = tf.convert_to_tensor(tensor)
+    ndims = tensor.get_shape().ndims
+    tiled = tf.tile(tf.expand_dims(tensor, axis=1),
+                    [1, beam_width] + [1] * (ndims - 1))
+    tiled = tf.reshape(tiled, tf.concat(
+        [[-1], tf.shape(tensor)[1:]], axis=0))
+    tiled.set_shape([None] + tensor.get_shape().as_list()[1:])
+    return tiled
+
+
+def length_penalty(lengths, length_penalty_weight):
+    """Length penalty of GNMT, ((5 + length) / 6) ^ weight.
+       See https://arxiv.org/abs/1609.08144.
+    Args:
+        lengths: An int32 tensor
+        length_penalty_weight: float. If 0, no penalty.
+    Returns:
+        A float32 tensor of the same shape as lengths
+    """
+    if length_penalty_weight == 0:
+        return tf.ones_like(lengths, dtype=tf.float32)
+    return tf.pow((5. + tf.to_float(lengths)) / 6., length_penalty_weight)
+
+
+class BeamSearchDecoder(tf.contrib.seq2seq.Decoder):
+    """Beam search over an AttentionDecoder. The variables of the wrapped
+       decoder are reused.
+    Args:
+        decoder: An instance of `AttentionDecoder`, which is not called yet
+        embedding: The embedding of target labels,
+            `[num_classes, embedding_dim]`
+        beam_width: int, the number of hypotheses kept in each step. It must
+            not exceed the number of classes of decoder.
+        sos_index: index of the start of sentence tag (<SOS>)
+        eos_index: index of the end of sentence tag (<EOS>)
+        length_penalty_weight: float, the weight of the length penalty.
+            If 0, hypotheses are compared by the sum of log probabilities.
+        top_n: int, the number of hypotheses to output for each utterance
+    """
+
+    def __init__(self,
+                 decoder,
+                 embedding,
+                 beam_width,
+                 sos_index,
+                 eos_index,
+                 length_penalty_weight=0.0,
+                 top_n=1,
+                 name='beam_search_decoder'):
+        if not 0 < top_n <= beam_width:
+            raise ValueError('top_n must be in [1, beam_width].')
+        # NOTE: only the first beam is alive at the first step, so that the
+        # rest of beam_width beyond num_classes would keep dead hypotheses
+        if beam_width > decoder.num_classes:
+            raise ValueError('beam_width must not exceed num_classes.')
+
+        self.decoder = decoder
+        self.embedding = embedding
+        self.beam_width = beam_width
+        self.sos_index = sos_index
+        self.eos_index = eos_index
+        self.length_penalty_weight = length_penalty_weight
+        self.top_n = top_n
+        self.name = name
+
+        self.num_classes = decoder.num_classes
+
+        # Not initialized yet
+        self.initial_state = None
+
+    def __call__(self, *args, **kwargs):
+        return self._build(*args, **kwargs)
+
+    @property
+    def output_size(self):
+        return BeamSearchStepOutput(
+            scores=tf.TensorShape([self.beam_width]),
+            predicted_ids=tf.TensorShape([self.beam_width]),
+            parent_ids=tf.TensorShape([self.beam_width]))
+
+    @property
+    def output_dtype(self):
+        return BeamSearchStepOutput(
+            scores=tf.float32,
+            predicted_ids=tf.int32,
+            parent_ids=tf.int32)
+
+    @property
+    def batch_size(self):
+        return tf.shape(nest.flatten([self.initial_state])[0])[0]
+
+    def _build(self, initial_state):
+        """
+        Args:
+            initial_state: A tensor or tuple of tensors used as the initial
+                cell state of each utterance (not tiled)
+        Returns:
+            A tuple of `(outputs, final_state)`
+                outputs: An instance of BeamSearchDecoderOutput
+                final_state: An instance of BeamSearchState
+        """
+        self.initial_state = initial_state
+
+        scope = tf.get_variable_scope()
+        scope.set_initializer(tf.random_uniform_initializer(
+            -self.decoder.parameter_init,
+            self.decoder.parameter_init))
+
+        outputs, final_state = dynamic_decode(
+            decoder=self,
+            output_time_major=True,
+            impute_finished=False,
+            maximum_iterations=self.decoder.max_decode_length)
+        return self.finalize(outputs, final_state)
+
+    def initialize(self, name=None):
+        """
+        Args:
+            name:
+        Returns:
+            finished: A bool tensor of `[batch_size]`
+            first_inputs: A tensor of `[batch_size * beam_width, ??]`
+            initial_state: An instance of BeamSearchState
+        """
+        decoder = self.decoder
+        batch_size = self.batch_size
+
+        # Project the encoder outputs before tiling
+        with tf.variable_scope("step", reuse=True):
+            attention_keys = decoder.attention_layer.compute_keys(
+                decoder.attention_encoder_states)
+
+        # Tile the encoder outputs per beam
+        decoder.attention_keys = tile_beam(attention_keys, self.beam_width)
+        decoder.attention_encoder_states = tile_beam(
+            decoder.attention_encoder_states, self.beam_width)
+        decoder.attention_values = tile_beam(
+            decoder.attention_values, self.beam_width)
+        decoder.attention_values_length = tile_beam(
+            decoder.attention_values_length, self.beam_width)
+        cell_state = nest.map_structure(
+            lambda state: tile_beam(state, self.beam_width),
+            self.initial_state)
+
+        # Create first inputs
+        flat_batch_size = batch_size * self.beam_width
+        start_tokens = tf.fill([flat_batch_size], self.sos_index)
+        encoder_num_unit = decoder.attention_values.get_shape().as_list()[-1]
+        first_inputs = tf.concat(
+            [tf.nn.embedding_lookup(self.embedding, start_tokens),
+             tf.zeros(shape=[flat_batch_size, encoder_num_unit])], axis=1)
+
+        # Only the first beam is alive at the first step
+        log_probs = tf.tile(
+            tf.concat([[0.], tf.fill([self.beam_width - 1],
+                                     tf.float32.min)], axis=0),
+            [batch_size])
+
+        initial_state = BeamSearchState(
+            cell_state=cell_state,
+            attention_peak=tf.zeros(shape=[flat_batch_size], dtype=tf.int32),
+            log_probs=log_probs,
+            finished=tf.zeros(shape=[flat_batch_size], dtype=tf.bool),
+            lengths=tf.zeros(shape=[flat_batch_size], dtype=tf.int32))
+        finished = tf.zeros(shape=[batch_size], dtype=tf.bool)
+        return finished, first_inputs, initial_state
+
+    def step(self, time, inputs, state, name=None):
+        """Perform a decoding step.
+        Args:
+           time: scalar `int32` tensor.
+           inputs: A tensor of `[batch_size * beam_width, ??]`
+           state: An instance of BeamSearchState
+           name: Name scope for any created operations.
+        Returns:
+            A tuple of `(outputs, naxt_state, next_inputs, finished)`
+                outputs: An instance of BeamSearchStepOutput
+                next_state: An instance of BeamSearchState
+                next_inputs: The tensor that should be used as input for the
+                    next step
+                finished: A bool tensor of `[batch_size]`
+        """
+        decoder = self.decoder
+        batch_size = self.batch_size
+        beam_width = self.beam_width
+        num_classes = self.num_classes
+
+        with tf.variable_scope("step", reuse=True):
+            attention_peak = None
+            if decoder.is_windowed:
+                attention_peak = state.attention_peak
+
+            cell_output_prev, cell_state = decoder.cell(
+                inputs, state.cell_state)
+            _, logits, attention_weights, attention_context = \
+                decoder.compute_output(cell_output_prev, attention_peak)
+
+        # Extend each hypothesis by each class,
+        # `[batch_size * beam_width, num_classes]`.
+        # Finished hypotheses are extended by only <EOS> with no cost.
+        step_log_probs = tf.nn.log_softmax(logits)
+        eos_only = tf.one_hot(tf.fill([batch_size * beam_width],
+                                      self.eos_index),
+                              depth=num_classes,
+                              on_value=0., off_value=tf.float32.min)
+        step_log_probs = tf.where(state.finished, eos_only, step_log_probs)
+        log_probs = tf.expand_dims(state.log_probs, axis=1) + step_log_probs
+        lengths = state.lengths + tf.to_int32(tf.logical_not(state.finished))
+
+        # Choose the best hypotheses of each utterance by normalized scores
+        scores = log_probs / tf.expand_dims(
+            length_penalty(lengths, self.length_penalty_weight), axis=1)
+        next_scores, indices = tf.nn.top_k(
+            tf.reshape(scores, [batch_size, beam_width * num_classes]),
+            k=beam_width)
+        parent_ids = indices // num_classes
+        predicted_ids = indices % num_classes
+
+        # Gather the states of parents, `[batch_size * beam_width]`
+        parent_indices = tf.reshape(
+            parent_ids + tf.expand_dims(tf.range(batch_size) * beam_width,
+                                        axis=1), [-1])
+        flat_indices = parent_indices * num_classes + \
+            tf.reshape(predicted_ids, [-1])
+
+        next_log_probs = tf.gather(tf.reshape(log_probs, [-1]), flat_indices)
+        next_lengths = tf.gather(lengths, parent_indices)
+        next_finished = tf.logical_or(
+            tf.gather(state.finished, parent_indices),
+            tf.equal(tf.reshape(predicted_ids, [-1]), self.eos_index))
+
+        # An utterance is finished when the best top_n hypotheses are
+        # finished. Then the rest of hypotheses are pruned.
+        finished = tf.reduce_all(
+            tf.reshape(next_finished, [batch_size, beam_width])[
+                :, :self.top_n], axis=1)
+        next_finished = tf.logical_or(
+            next_finished, tile_beam(finished, beam_width))
+
+        next_attention_peak = state.attention_peak
+        if decoder.is_windowed:
+            next_attention_peak = tf.gather(
+                tf.to_int32(tf.argmax(attention_weights, axis=1)),
+                parent_indices)
+
+        next_state = BeamSearchState(
+            cell_state=nest.map_structure(
+                lambda s: tf.gather(s, parent_indices), cell_state),
+            attention_peak=next_attention_peak,
+            log_probs=next_log_probs,
+            finished=next_finished,
+            lengths=next_lengths)
+
+        next_inputs = tf.concat(
+            [tf.nn.embedding_lookup(self.embedding,
+                                    tf.reshape(predicted_ids, [-1])),
+             tf.gather(attention_context, parent_indices)], axis=1)
+
+        outputs = BeamSearchStepOutput(scores=next_scores,
+                                       predicted_ids=predicted_ids,
+                                       parent_ids=parent_ids)
+
+        return (outputs, next_state, next_inputs, finished)
+
+    def finalize(self, outputs, final_state):
+        """Trace back the hypotheses from the last step.
+        Args:
+            outputs: An instance of BeamSearchStepOutput (time-major)
+            final_state: An instance of BeamSearchState
+        Returns:
+            A tuple of `(outputs, final_state)`
+                outputs: An instance of BeamSearchDecoderOutput
+                final_state: An instance of BeamSearchState
+        """
+        batch_size = tf.shape(outputs.predicted_ids)[1]
+        max_time = tf.shape(outputs.predicted_ids)[0]
+
+        def _backtrack(beam_indices, step):
+            predicted_ids_t, parent_ids_t = step
+            # `[batch_size, beam_width]`
+            predicted_ids_t = tf.gather_nd(
+                predicted_ids_t, tf.stack([batch_indices, beam_indices],
+                                          axis=2))
+            beam_indices = tf.gather_nd(
+                parent_ids_t, tf.stack([batch_indices, beam_indices], axis=2))
+            return beam_indices, predicted_ids_t
+
+        batch_indices = tf.tile(tf.expand_dims(tf.range(batch_size), 1),
+                                [1, self.beam_width])
+        last_beam_indices = tf.tile(
+            tf.expand_dims(tf.range(self.beam_width), 0), [batch_size, 1])
+
+        # Scan from the last step
+        _, predicted_ids = tf.scan(
+            lambda acc, step: _backtrack(acc[0], step),
+            (tf.reverse(outputs.predicted_ids, axis=[0]),
+             tf.reverse(outputs.parent_ids, axis=[0])),
+            initializer=(last_beam_indices, last_beam_indices))
+        predicted_ids = tf.reverse(predicted_ids, axis=[0])
+
+        # `[batch_size, top_n, time]`
+        predicted_ids = tf.transpose(predicted_ids, [1, 2, 0])[
+            :, :self.top_n]
+        lengths = tf.reshape(final_state.lengths,
+                             [batch_size, self.beam_width])[:, :self.top_n]
+        predicted_ids = tf.where(
+            tf.sequence_mask(lengths, maxlen=max_time),
+            predicted_ids,
+            tf.fill(tf.shape(predicted_ids), self.eos_index))
+        scores = outputs.scores[-1, :, :self.top_n]
+
+        return (BeamSearchDecoderOutput(predicted_ids=predicted_ids,
+                                        scores=scores,
+                                        lengths=lengths),
+                final_state)
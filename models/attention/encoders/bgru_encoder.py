@@ -21,6 +21,8 @@ class BGRUEncoder(EncoderBase):
         parameter_init:
         clip_activation: not used
         num_proj: not used
+        num_stack:
+        num_skip:
     """
 
     def __init__(self,
@@ -31,11 +33,13 @@ class BGRUEncoder(EncoderBase):
                  parameter_init=0.1,
                  clip_activation=50,  # not used
                  num_proj=None,  # not used
+                 num_stack=None,
+                 num_skip=None,
                  name='bgru_encoder'):
 
         EncoderBase.__init__(self, num_unit, num_layer, keep_prob_input,
                              keep_prob_hidden, parameter_init, clip_activation,
-                             num_proj, name)
+                             num_proj, name, num_stack, num_skip)
 
     def _build(self, inputs, inputs_seq_len):
         """Construct Bidirectional GRU encoder.
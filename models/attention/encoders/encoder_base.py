@@ -5,6 +5,7 @@
 
 from collections import namedtuple
 import tensorflow as tf
+from models.frame_stacking import stack_frames
 
 
 class EncoderOutput(
@@ -26,6 +27,10 @@ class EncoderBase(object):
         parameter_init:
         clip_activation:
         num_proj:
+        num_stack: int, the number of frames to stack in the graph. If set
+            with num_skip, stacked & skipped frames are made from raw
+            features before encoding.
+        num_skip: int, the number of frames to skip in the graph
     """
 
     def __init__(self,
@@ -36,7 +41,9 @@ class EncoderBase(object):
                  parameter_init,
                  clip_activation,
                  num_proj,
-                 name=None):
+                 name=None,
+                 num_stack=None,
+                 num_skip=None):
 
         self.num_unit = num_unit
         self.num_layer = num_layer
@@ -47,10 +54,19 @@ class EncoderBase(object):
         self.num_proj = num_proj
         self.name = name
 
-    def __call__(self, *args, **kwargs):
+        if (num_stack is None) != (num_skip is None):
+            raise ValueError('Set both num_stack and num_skip.')
+        if num_stack is not None and num_stack < num_skip:
+            raise ValueError('num_skip must be less than num_stack.')
+        self.num_stack = num_stack
+        self.num_skip = num_skip
+
+    def __call__(self, inputs, inputs_seq_len):
         # TODO: variable_scope
         with tf.name_scope('Encoder'):
-            return self._build(*args, **kwargs)
+            inputs, inputs_seq_len = stack_frames(
+                inputs, inputs_seq_len, self.num_stack, self.num_skip)
+            return self._build(inputs, inputs_seq_len)
 
     def _build(self, inputs, inputs_seq_len):
         raise NotImplementedError
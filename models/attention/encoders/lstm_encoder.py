@@ -21,6 +21,8 @@ class LSTMEncoder(EncoderBase):
         parameter_init:
         clip_activation:
         num_proj:
+        num_stack:
+        num_skip:
     """
 
     def __init__(self,
@@ -31,11 +33,13 @@ class LSTMEncoder(EncoderBase):
                  parameter_init=0.1,
                  clip_activation=50,
                  num_proj=None,
+                 num_stack=None,
+                 num_skip=None,
                  name='lstm_encoder'):
 
         EncoderBase.__init__(self, num_unit, num_layer, keep_prob_input,
                              keep_prob_hidden, parameter_init, clip_activation,
-                             num_proj, name)
+                             num_proj, name, num_stack, num_skip)
 
     def _build(self, inputs, inputs_seq_len):
         """Construct LSTM encoder.
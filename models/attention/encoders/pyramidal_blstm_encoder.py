@@ -21,6 +21,8 @@ class PyramidalBLSTMEncoder(EncoderBase):
         parameter_init:
         clip_activation:
         num_proj:
+        num_stack:
+        num_skip:
     """
 
     def __init__(self,
@@ -31,6 +33,8 @@ class PyramidalBLSTMEncoder(EncoderBase):
                  parameter_init=0.1,
                  clip_activation=50,
                  num_proj=None,
+                 num_stack=None,
+                 num_skip=None,
                  name='pblstm_encoder'):
 
         if num_unit % 2 != 0:
@@ -38,7 +42,7 @@ class PyramidalBLSTMEncoder(EncoderBase):
 
         EncoderBase.__init__(self, num_unit, num_layer, keep_prob_input,
                              keep_prob_hidden, parameter_init, clip_activation,
-                             num_proj, name)
+                             num_proj, name, num_stack, num_skip)
 
     def _build(self, inputs, inputs_seq_len):
         """Construct Pyramidal Bidirectional LSTM encoder.
@@ -31,6 +31,8 @@ class BLSTM_CTC(ctcBase):
         num_proj: int, the number of nodes in recurrent projection layer
         weight_decay: A float value. Regularization parameter for weight decay
         bottleneck_dim: int, the dimensions of the bottleneck layer
+        num_stack: int, the number of frames to stack in the graph
+        num_skip: int, the number of frames to skip in the graph
     """
 
     def __init__(self,
@@ -47,13 +49,15 @@ class BLSTM_CTC(ctcBase):
                  num_proj=None,
                  weight_decay=0.0,
                  bottleneck_dim=None,
+                 num_stack=None,
+                 num_skip=None,
                  name='blstm_ctc'):
 
         ctcBase.__init__(self, batch_size, input_size, num_unit, num_layer,
                          output_size, parameter_init,
                          clip_grad, clip_activation,
                          dropout_ratio_input, dropout_ratio_hidden,
-                         weight_decay, name)
+                         weight_decay, name, num_stack, num_skip)
 
         self.num_proj = None if num_proj == 0 else num_proj
         self.bottleneck_dim = bottleneck_dim
@@ -35,6 +35,8 @@ class BN_BLSTM_CTC(ctcBase):
         weight_decay: A float value. Regularization parameter for weight decay
         bottleneck_dim: int, the dimensions of the bottleneck layer
         is_training: bool, set True when training
+        num_stack: int, the number of frames to stack in the graph
+        num_skip: int, the number of frames to skip in the graph
     """
 
     def __init__(self,
@@ -52,13 +54,15 @@ class BN_BLSTM_CTC(ctcBase):
                  weight_decay=0.0,
                  bottleneck_dim=None,
                  is_training=True,
+                 num_stack=None,
+                 num_skip=None,
                  name='bn_blstm_ctc'):
 
         ctcBase.__init__(self, batch_size, input_size, num_unit, num_layer,
                          output_size, parameter_init,
                          clip_grad, clip_activation,
                          dropout_ratio_input, dropout_ratio_hidden,
-                         weight_decay, name)
+                         weight_decay, name, num_stack, num_skip)
 
         self.bottleneck_dim = bottleneck_dim
         self.num_proj = None if num_proj == 0 else num_proj
@@ -8,6 +8,7 @@ from __future__ import division
 from __future__ import print_function
 
 import tensorflow as tf
+from models.frame_stacking import stack_frames, stacked_seq_len
 
 
 OPTIMIZER_CLS_NAMES = {
@@ -38,6 +39,11 @@ class ctcBase(object):
         dropout_ratio_hidden: A float value. Dropout ratio in hidden-hidden
             layers
         weight_decay: A float value. Regularization parameter for weight decay
+        num_stack: int, the number of frames to stack in the graph. If set
+            with num_skip, raw features of size `input_size` are fed and
+            stacked & skipped frames of size `input_size * num_stack` are
+            made inside the graph.
+        num_skip: int, the number of frames to skip in the graph
     """
 
     def __init__(self,
@@ -52,7 +58,9 @@ class ctcBase(object):
                  dropout_ratio_input,
                  dropout_ratio_hidden,
                  weight_decay,
-                 name=None):
+                 name=None,
+                 num_stack=None,
+                 num_skip=None):
 
         # Network size
         self.batch_size = batch_size
@@ -62,6 +70,14 @@ class ctcBase(object):
         self.num_layer = num_layer
         self.num_classes = output_size + 1  # plus blank label
 
+        # Frame stacking in the graph
+        if (num_stack is None) != (num_skip is None):
+            raise ValueError('Set both num_stack and num_skip.')
+        if num_stack is not None and num_stack < num_skip:
+            raise ValueError('num_skip must be less than num_stack.')
+        self.num_stack = num_stack
+        self.num_skip = num_skip
+
         # Regularization
         self.parameter_init = parameter_init
         self.clip_grad = clip_grad
@@ -91,6 +107,28 @@ class ctcBase(object):
                     tf.shape(inputs), 0.0, stddev) + inputs
         return inputs
 
+    def _stack_frames(self, inputs, inputs_seq_len):
+        """Stack & skip frames inside the graph (see models/frame_stacking.py).
+        Args:
+            inputs: A tensor of size `[batch_size, max_time, input_size]`
+            inputs_seq_len: A tensor of size `[batch_size]`
+        Returns:
+            stacked_inputs: A tensor of size
+                `[batch_size, max_time_stacked, input_size * num_stack]`
+            stacked_inputs_seq_len: A tensor of size `[batch_size]`
+        """
+        return stack_frames(inputs, inputs_seq_len,
+                            self.num_stack, self.num_skip)
+
+    def _stacked_seq_len(self, inputs_seq_len):
+        """Compute the length of inputs after frame stacking in the graph.
+        Args:
+            inputs_seq_len: A tensor of size `[batch_size]`
+        Returns:
+            A tensor of size `[batch_size]`
+        """
+        return stacked_seq_len(inputs_seq_len, self.num_skip)
+
     def _add_noise_to_gradients(grads_and_vars, gradient_noise_scale,
                                 stddev=0.075):
         """Adds scaled noise from a 0-mean normal distribution to gradients."""
@@ -110,6 +148,9 @@ class ctcBase(object):
             loss: operation for computing ctc loss
             logits:
         """
+        # Frame stacking & skipping
+        inputs, inputs_seq_len = self._stack_frames(inputs, inputs_seq_len)
+
         # Build model graph
         logits = self._build(
             inputs, inputs_seq_len, keep_prob_input, keep_prob_hidden)
@@ -243,6 +284,9 @@ class ctcBase(object):
         if decode_type not in ['greedy', 'beam_search']:
             raise ValueError('decode_type is "greedy" or "beam_search".')
 
+        # The length of logits when frames are stacked in the graph
+        inputs_seq_len = self._stacked_seq_len(inputs_seq_len)
+
         if decode_type == 'greedy':
             decoded, _ = tf.nn.ctc_greedy_decoder(
                 logits, tf.cast(inputs_seq_len, tf.int32))
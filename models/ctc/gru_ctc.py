@@ -27,6 +27,8 @@ class GRU_CTC(ctcBase):
         num_proj: not used
         weight_decay: A float value. Regularization parameter for weight decay
         bottleneck_dim: int, the dimensions of the bottleneck layer
+        num_stack: int, the number of frames to stack in the graph
+        num_skip: int, the number of frames to skip in the graph
     """
 
     def __init__(self,
@@ -43,13 +45,15 @@ class GRU_CTC(ctcBase):
                  num_proj=None,  # not used
                  weight_decay=0.0,
                  bottleneck_dim=None,
+                 num_stack=None,
+                 num_skip=None,
                  name='gru_ctc'):
 
         ctcBase.__init__(self, batch_size, input_size, num_unit, num_layer,
                          output_size, parameter_init,
                          clip_grad, clip_activation,
                          dropout_ratio_input, dropout_ratio_hidden,
-                         weight_decay, name)
+                         weight_decay, name, num_stack, num_skip)
 
         self.bottleneck_dim = bottleneck_dim
 
@@ -37,6 +37,8 @@ class Multitask_BLSTM_CTC(ctcBase):
         num_proj: int, the number of nodes in recurrent projection layer
         weight_decay: A float value. Regularization parameter for weight decay
         bottleneck_dim: int, the dimensions of the bottleneck layer
+        num_stack: int, the number of frames to stack in the graph
+        num_skip: int, the number of frames to skip in the graph
     """
 
     def __init__(self,
@@ -56,13 +58,15 @@ class Multitask_BLSTM_CTC(ctcBase):
                  num_proj=None,
                  weight_decay=0.0,
                  bottleneck_dim=None,
+                 num_stack=None,
+                 num_skip=None,
                  name='multitask_blstm_ctc'):
 
         ctcBase.__init__(self, batch_size, input_size, num_unit,
                          num_layer_main, output_size_main, parameter_init,
                          clip_grad, clip_activation,
                          dropout_ratio_input, dropout_ratio_hidden,
-                         weight_decay, name)
+                         weight_decay, name, num_stack, num_skip)
 
         self.num_proj = None if num_proj == 0 else num_proj
         self.bottleneck_dim = bottleneck_dim
@@ -228,6 +232,9 @@ class Multitask_BLSTM_CTC(ctcBase):
             logits_main:
             logits_second:
         """
+        # Frame stacking & skipping
+        inputs, inputs_seq_len = self._stack_frames(inputs, inputs_seq_len)
+
         # Build model graph
         logits_main, logits_second = self._build(
             inputs, inputs_seq_len, keep_prob_input, keep_prob_hidden)
@@ -308,6 +315,9 @@ class Multitask_BLSTM_CTC(ctcBase):
         if decode_type not in ['greedy', 'beam_search']:
             raise ValueError('decode_type is "greedy" or "beam_search".')
 
+        # The length of logits when frames are stacked in the graph
+        inputs_seq_len = self._stacked_seq_len(inputs_seq_len)
+
         if decode_type == 'greedy':
             decoded_main, _ = tf.nn.ctc_greedy_decoder(
                 logits_main, tf.cast(inputs_seq_len, tf.int32))
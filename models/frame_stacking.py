@@ -0,0 +1,75 @@
+#! /usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Frame stacking & skipping inside the graph (shared by the CTC models and
+   the encoders of the attention models)."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import tensorflow as tf
+
+
+def stacked_seq_len(inputs_seq_len, num_skip):
+    """Compute the length of inputs after frame stacking in the graph.
+    Args:
+        inputs_seq_len: A tensor of size `[batch_size]`
+        num_skip: int, the number of frames to skip, or None
+    Returns:
+        A tensor of size `[batch_size]`
+    """
+    if num_skip is None:
+        return inputs_seq_len
+    return (inputs_seq_len + num_skip - 1) // num_skip
+
+
+def stack_frames(inputs, inputs_seq_len, num_stack, num_skip):
+    """Stack & skip frames inside the graph in the same way as
+       utils/frame_stack.py. If num_stack and num_skip are not set,
+       inputs are returned as they are.
+    Args:
+        inputs: A tensor of size `[batch_size, max_time, input_size]`
+        inputs_seq_len: A tensor of size `[batch_size]`
+        num_stack: int, the number of frames to stack, or None
+        num_skip: int, the number of frames to skip, or None
+    Returns:
+        stacked_inputs: A tensor of size
+            `[batch_size, max_time_stacked, input_size * num_stack]`
+        stacked_inputs_seq_len: A tensor of size `[batch_size]`
+    """
+    if num_stack is None:
+        return inputs, inputs_seq_len
+
+    with tf.name_scope('frame_stacking'):
+        batch_size = tf.shape(inputs)[0]
+        max_time = tf.shape(inputs)[1]
+        input_size = inputs.get_shape().as_list()[2]
+        stacked_inputs_seq_len = stacked_seq_len(inputs_seq_len, num_skip)
+        max_time_stacked = (max_time + num_skip - 1) // num_skip
+
+        # Regard frames beyond the length of each utterance as 0
+        mask = tf.sequence_mask(tf.cast(inputs_seq_len, tf.int32),
+                                maxlen=max_time, dtype=inputs.dtype)
+        inputs = inputs * tf.expand_dims(mask, axis=2)
+
+        # Pad with 0 so that the last stacked frame does not exceed the end
+        pad_len = tf.maximum(
+            (max_time_stacked - 1) * num_skip + num_stack - max_time, 0)
+        inputs = tf.pad(inputs, [[0, 0], [0, pad_len], [0, 0]])
+
+        # `[max_time_stacked, num_stack]`
+        frame_indices = (
+            tf.expand_dims(tf.range(max_time_stacked) * num_skip, 1) +
+            tf.expand_dims(tf.range(num_stack), 0))
+
+        # Gather along the time axis
+        # `[max_time_stacked, num_stack, batch_size, input_size]`
+        stacked_inputs = tf.gather(tf.transpose(inputs, [1, 0, 2]),
+                                   frame_indices)
+        stacked_inputs = tf.transpose(stacked_inputs, [2, 0, 1, 3])
+        stacked_inputs = tf.reshape(
+            stacked_inputs,
+            [batch_size, max_time_stacked, input_size * num_stack])
+
+    return stacked_inputs, stacked_inputs_seq_len
@@ -6,35 +6,25 @@ from __future__ import division
 from __future__ import print_function
 
 import numpy as np
-import scipy.io.wavfile
-from python_speech_features import mfcc, fbank, logfbank, hz2mel
 from experiments.utils.sparsetensor import list2sparsetensor
+from experiments.utils.feature_extraction import wav2feature
 
 
-def read_wav(wav_path, feature_type='logmelfbank', batch_size=1):
+def read_wav(wav_path, feature_type='logmelfbank', batch_size=1, cmvn=None):
     """Read wav file & convert to MFCC or log mel filterbank features.
     Args:
         wav_path: path to a wav file
         feature: logmelfbank or mfcc
+        cmvn: An instance of CMVN (experiments/utils/cmvn.py). If set,
+            features are normalized by the global mean & std of the training
+            set instead of the statistics of this utterance
     Returns:
         inputs: `[batch_size, max_time, feature_dim]`
         inputs_seq_len: `[batch_size, frame_num]`
     """
-    # Load wav file
-    fs, audio = scipy.io.wavfile.read(wav_path)
-
-    if feature_type == 'mfcc':
-        features = mfcc(audio, samplerate=fs)  # `[291, 13]`
-    elif feature_type == 'logmelfbank':
-        fbank_features, energy = fbank(audio, nfilt=40)
-        logfbank = np.log(fbank_features)
-        logenergy = np.log(energy)
-        logmelfbank = hz2mel(logfbank)
-        features = np.c_[logmelfbank, logenergy]  # `[291, 41]`
-
-    delta1 = delta(features, N=2)
-    delta2 = delta(delta1, N=2)
-    input_data = np.c_[features, delta1, delta2]  # `[291, 123]`
+    input_data = wav2feature(wav_path, feature_type)  # `[291, 123]`
+    if cmvn is not None:
+        input_data = cmvn.normalize(input_data)
 
     # Transform to 3D array
     # `[1, 291, 39]` or `[1, 291, 123]`
@@ -44,33 +34,12 @@ def read_wav(wav_path, feature_type='logmelfbank', batch_size=1):
     inputs_seq_len = [inputs.shape[1]] * batch_size  # `[291]`
 
     # Normalization
-    inputs = (inputs - np.mean(inputs)) / np.std(inputs)
+    if cmvn is None:
+        inputs = (inputs - np.mean(inputs)) / np.std(inputs)
 
     return inputs, inputs_seq_len
 
 
-def delta(feat, N):
-    """Compute delta features from a feature vector sequence.
-    Args:
-        feat: A numpy array of size (NUMFRAMES by number of features)
-            containing features. Each row holds 1 feature vector.
-        N: For each frame, calculate delta features based on preceding and
-            following N frames.
-    Rreturns:
-        dfeat: A numpy array of size (NUMFRAMES by number of features)
-            containing delta features. Each row holds 1 delta feature vector.
-    """
-    NUMFRAMES = len(feat)
-    feat = np.concatenate(([feat[0] for i in range(N)],
-                           feat, [feat[-1] for i in range(N)]))
-    denom = sum([2 * i * i for i in range(1, N + 1)])
-    dfeat = []
-    for j in range(NUMFRAMES):
-        dfeat.append(np.sum([n * feat[N + j + n]
-                             for n in range(-1 * N, N + 1)], axis=0) / denom)
-    return dfeat
-
-
 def read_text(text_path):
     """Read char-level transcripts.
     Args:
@@ -7,12 +7,17 @@ from __future__ import print_function
 
 import sys
 import time
+import numpy as np
 import tensorflow as tf
 from tensorflow.python import debug as tf_debug
 
 sys.path.append('../')
 sys.path.append('../../')
 from attention.blstm_attention_seq2seq import BLSTMAttetion
+from attention.decoders.attention_layer import AttentionLayer
+from attention.decoders.beam_search_decoder import BeamSearchDecoder
+from attention.decoders.beam_search_decoder import BeamSearchState
+from attention.decoders.beam_search_decoder import BeamSearchStepOutput
 from util import measure_time
 from data import generate_data, num2alpha, num2phone
 from experiments.utils.sparsetensor import list2sparsetensor
@@ -26,8 +31,178 @@ class TestAttention(tf.test.TestCase):
         print("Attention Working check.")
         # self.check_training(model_type='attention', label_type='phone')
         self.check_training(model_type='attention', label_type='character')
+        self.check_training(model_type='attention', label_type='character',
+                            attention_window_size=10)
+        self.check_training(model_type='attention', label_type='character',
+                            beam_width=4)
 
-    def check_training(self, model_type, label_type):
+    def test_windowed_attention(self):
+        batch_size, max_time = 3, 12
+        encoder_states = np.random.randn(
+            batch_size, max_time, 8).astype(np.float32)
+        decoder_state = np.random.randn(batch_size, 6).astype(np.float32)
+        values_length = np.array([12, 7, 2], dtype=np.int32)
+        attention_peak = np.array([5, 6, 0], dtype=np.int32)
+
+        def build(window_size, window_type='centered', reuse=True):
+            attention_layer = AttentionLayer(
+                num_unit=10, attention_weights_tempareture=1,
+                window_size=window_size, window_type=window_type)
+            with tf.variable_scope('attention', reuse=reuse):
+                return attention_layer(
+                    encoder_states=encoder_states,
+                    current_decoder_state=decoder_state,
+                    values=encoder_states,
+                    values_length=values_length,
+                    attention_peak=attention_peak)
+
+        with tf.Graph().as_default():
+            full = build(None, reuse=False)
+            # Windows covering the whole input (even when longer than it)
+            wide = [build(max_time), build(max_time + 3),
+                    build(max_time, 'monotonic')]
+            window_size = 3
+            narrow = {window_type: build(window_size, window_type)
+                      for window_type in ['centered', 'monotonic']}
+
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+                weights_full, context_full = sess.run(full)
+                for weights, context in sess.run(wide):
+                    self.assertAllClose(weights, weights_full, atol=1e-6)
+                    self.assertAllClose(context, context_full, atol=1e-6)
+
+                for window_type, (weights, context) in \
+                        sess.run(narrow).items():
+                    self.assertAllClose(weights.sum(axis=1),
+                                        np.ones(batch_size), atol=1e-6)
+                    for i in range(batch_size):
+                        if window_type == 'centered':
+                            begin = attention_peak[i] - window_size // 2
+                        else:
+                            begin = attention_peak[i]
+                        begin = min(max(begin, 0),
+                                    max(values_length[i] - window_size, 0))
+                        end = min(begin + window_size, values_length[i])
+                        is_window = np.zeros(max_time, dtype=bool)
+                        is_window[begin:end] = True
+                        self.assertTrue(np.all(weights[i, ~is_window] == 0))
+                        self.assertAllClose(
+                            context[i],
+                            weights[i].dot(encoder_states[i]), atol=1e-5)
+
+    def test_beam_search_width_1(self):
+        tf.reset_default_graph()
+        with tf.Graph().as_default():
+            batch_size = 2
+            inputs, labels, inputs_seq_len, labels_seq_len = generate_data(
+                label_type='character',
+                model='attention',
+                batch_size=batch_size)
+            output_size = 26 + 2
+            network = BLSTMAttetion(
+                batch_size=batch_size,
+                input_size=inputs[0].shape[1],
+                encoder_num_unit=64,
+                encoder_num_layer=1,
+                attention_dim=32,
+                decoder_num_unit=64,
+                decoder_num_layer=1,
+                embedding_dim=20,
+                output_size=output_size,
+                sos_index=output_size - 2,
+                eos_index=output_size - 1,
+                max_decode_length=20,
+                attention_weights_tempareture=1,
+                logits_tempareture=1,
+                parameter_init=0.1,
+                clip_grad=5.0,
+                clip_activation_encoder=50,
+                clip_activation_decoder=50,
+                dropout_ratio_input=1.0,
+                dropout_ratio_hidden=1.0,
+                weight_decay=0,
+                beam_width=1,
+                time_major=False)
+            _, _, decoder_outputs_train, decoder_outputs_infer = \
+                network.compute_loss(
+                    tf.constant(inputs, dtype=tf.float32),
+                    tf.constant(labels, dtype=tf.int32),
+                    tf.constant(inputs_seq_len, dtype=tf.int32),
+                    tf.constant(labels_seq_len, dtype=tf.int32),
+                    1.0, 1.0)
+            _, decode_op_greedy = network.decoder(
+                decoder_outputs_train, decoder_outputs_infer,
+                decode_type='greedy')
+            _, decode_op_beam = network.decoder(
+                decoder_outputs_train, decoder_outputs_infer,
+                decode_type='beam_search', beam_width=1)
+
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer())
+                ids_greedy, ids_beam = sess.run(
+                    [decode_op_greedy, decode_op_beam])
+
+            # Compare labels until <EOS>
+            eos_index = output_size - 1
+            for ids_greedy_i, ids_beam_i in zip(ids_greedy, ids_beam):
+                ids_greedy_i = list(ids_greedy_i)
+                if eos_index in ids_greedy_i:
+                    ids_greedy_i = ids_greedy_i[
+                        :ids_greedy_i.index(eos_index) + 1]
+                self.assertEqual(list(ids_beam_i[:len(ids_greedy_i)]),
+                                 ids_greedy_i)
+
+    def test_beam_search_finalize(self):
+        class DummyDecoder(object):
+            num_classes = 10
+
+        with tf.Graph().as_default():
+            eos_index = 9
+            beam_search_decoder = BeamSearchDecoder(
+                decoder=DummyDecoder(), embedding=None, beam_width=2,
+                sos_index=8, eos_index=eos_index, top_n=2)
+
+            # Time-major, `[time, batch_size, beam_width]`
+            outputs = BeamSearchStepOutput(
+                scores=tf.constant([[[-1., -2.], [-1., -2.]],
+                                    [[-3., -4.], [-5., -6.]]]),
+                predicted_ids=tf.constant([[[3, 5], [1, 2]],
+                                           [[7, 8], [4, 6]]]),
+                parent_ids=tf.constant([[[0, 0], [0, 0]],
+                                        [[1, 0], [0, 1]]]))
+            final_state = BeamSearchState(
+                cell_state=None, attention_peak=None, log_probs=None,
+                finished=None, lengths=tf.constant([2, 1, 2, 2]))
+            decoder_outputs, _ = beam_search_decoder.finalize(
+                outputs, final_state)
+
+            with tf.Session() as sess:
+                predicted_ids, scores, lengths = sess.run(
+                    [decoder_outputs.predicted_ids, decoder_outputs.scores,
+                     decoder_outputs.lengths])
+
+            # Labels after the length of each hypothesis are <EOS>
+            self.assertAllEqual(predicted_ids,
+                                [[[5, 7], [3, eos_index]],
+                                 [[1, 4], [2, 6]]])
+            self.assertAllEqual(scores, [[-3., -4.], [-5., -6.]])
+            self.assertAllEqual(lengths, [[2, 1], [2, 2]])
+
+    def test_beam_search_width_check(self):
+        class DummyDecoder(object):
+            num_classes = 10
+
+        with self.assertRaises(ValueError):
+            BeamSearchDecoder(decoder=DummyDecoder(), embedding=None,
+                              beam_width=11, sos_index=8, eos_index=9)
+        with self.assertRaises(ValueError):
+            BeamSearchDecoder(decoder=DummyDecoder(), embedding=None,
+                              beam_width=2, sos_index=8, eos_index=9,
+                              top_n=3)
+
+    def check_training(self, model_type, label_type,
+                       attention_window_size=None, beam_width=0):
         print('----- ' + model_type + ', ' + label_type + ' -----')
         tf.reset_default_graph()
         with tf.Graph().as_default():
@@ -98,8 +273,9 @@ class TestAttention(tf.test.TestCase):
                 dropout_ratio_input=1.0,
                 dropout_ratio_hidden=1.0,
                 weight_decay=0,
-                beam_width=0,
-                time_major=False)
+                beam_width=beam_width,
+                time_major=False,
+                attention_window_size=attention_window_size)
 
             # Add to the graph each operation
             loss_op, logits, decoder_outputs_train, decoder_outputs_infer = network.compute_loss(
@@ -117,8 +293,8 @@ class TestAttention(tf.test.TestCase):
             decode_op_train, decode_op_infer = network.decoder(
                 decoder_outputs_train,
                 decoder_outputs_infer,
-                decode_type='greedy',
-                beam_width=1)
+                decode_type='beam_search' if beam_width > 0 else 'greedy',
+                beam_width=beam_width)
             ler_op = network.compute_ler(labels_st_true_pl,
                                          labels_st_pred_pl)
             attention_weights = decoder_outputs_infer.attention_scores
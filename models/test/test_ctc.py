@@ -32,11 +32,17 @@ class TestCTC(tf.test.TestCase):
         self.check_training(model_type='bgru_ctc', label_type='phone')
         self.check_training(model_type='gru_ctc', label_type='character')
         self.check_training(model_type='gru_ctc', label_type='phone')
+
+        # Frame stacking in the graph
+        self.check_training(model_type='blstm_ctc', label_type='phone',
+                            num_stack=3, num_skip=2)
         # self.check_training(model_type='cnn_ctc', label_type='phone')
         # self.check_training(model_type='cnn_ctc', label_type='phone')
 
-    def check_training(self, model_type, label_type):
-        print('----- ' + model_type + ', ' + label_type + ' -----')
+    def check_training(self, model_type, label_type, num_stack=None,
+                       num_skip=None):
+        print('----- ' + model_type + ', ' + label_type + ', num_stack: ' +
+              str(num_stack) + ', num_skip: ' + str(num_skip) + ' -----')
         tf.reset_default_graph()
         with tf.Graph().as_default():
             # Load batch data
@@ -77,7 +83,9 @@ class TestCTC(tf.test.TestCase):
                             dropout_ratio_input=1.0,
                             dropout_ratio_hidden=1.0,
                             num_proj=None,
-                            weight_decay=1e-6)
+                            weight_decay=1e-6,
+                            num_stack=num_stack,
+                            num_skip=num_skip)
 
             # Add to the graph each operation
             loss_op, logits = network.compute_loss(inputs_pl,